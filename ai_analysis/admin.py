@@ -1,28 +1,39 @@
 from django.contrib import admin
-from .models import ImageAnalysis, GeminiUsageStats
+from .models import (
+    ImageAnalysis,
+    GeminiUsageStats,
+    GeminiUsageMonthlyStats,
+    GeminiGlobalDailyStats,
+    GeminiGlobalMonthlyStats,
+)
 
 
 @admin.register(ImageAnalysis)
 class ImageAnalysisAdmin(admin.ModelAdmin):
     """Admin para ImageAnalysis"""
     list_display = ('user', 'status', 'image_format', 'image_size', 
-                   'gemini_cost_usd', 'processing_time_seconds', 'created_at')
-    list_filter = ('status', 'image_format', 'created_at')
+                   'gemini_cost_usd', 'processing_time_seconds', 'cache_hit', 'created_at')
+    list_filter = ('status', 'analysis_mode', 'image_format', 'cache_hit', 'tokens_estimated',
+                   'parse_failed', 'escalated', 'created_at')
     search_fields = ('user__email', 'error_message')
-    readonly_fields = ('created_at', 'updated_at', 'processing_time_seconds')
+    readonly_fields = ('created_at', 'updated_at', 'processing_time_seconds',
+                       'preprocessing_time_seconds')
     
     fieldsets = (
         ('Usuario', {
             'fields': ('user',)
         }),
         ('Imagen', {
-            'fields': ('image_size', 'image_format')
+            'fields': ('image_size', 'processed_image_size', 'image_format')
         }),
         ('Estado', {
-            'fields': ('status', 'error_message')
+            'fields': ('analysis_mode', 'status', 'error_message')
         }),
         ('Gemini API', {
-            'fields': ('gemini_request_tokens', 'gemini_response_tokens', 'gemini_cost_usd'),
+            'fields': ('gemini_model', 'model_route', 'escalated',
+                      'gemini_request_tokens', 'gemini_response_tokens',
+                      'gemini_cached_tokens', 'tokens_estimated', 'parse_failed', 'gemini_cost_usd',
+                      'gemini_retries', 'admission_queue_depth', 'admission_wait_seconds'),
             'classes': ('collapse',)
         }),
         ('Respuesta IA', {
@@ -30,7 +41,8 @@ class ImageAnalysisAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Tiempos', {
-            'fields': ('processing_time_seconds', 'created_at', 'updated_at'),
+            'fields': ('processing_time_seconds', 'preprocessing_time_seconds', 'cache_hit',
+                      'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -40,10 +52,12 @@ class ImageAnalysisAdmin(admin.ModelAdmin):
 class GeminiUsageStatsAdmin(admin.ModelAdmin):
     """Admin para GeminiUsageStats"""
     list_display = ('user', 'date', 'total_requests', 'successful_analyses', 
-                   'failed_analyses', 'success_rate', 'total_cost_usd', 'average_cost_per_request')
+                   'failed_analyses', 'success_rate', 'parse_failures', 'total_cost_usd',
+                   'average_cost_per_request')
     list_filter = ('date', 'created_at')
     search_fields = ('user__email',)
-    readonly_fields = ('success_rate', 'average_cost_per_request', 'created_at', 'updated_at')
+    readonly_fields = ('success_rate', 'average_cost_per_request', 'parse_failure_rate',
+                       'last_analysis_at', 'created_at', 'updated_at')
     date_hierarchy = 'date'
     
     fieldsets = (
@@ -51,16 +65,57 @@ class GeminiUsageStatsAdmin(admin.ModelAdmin):
             'fields': ('user', 'date')
         }),
         ('Estadísticas de Requests', {
-            'fields': ('total_requests', 'successful_analyses', 'failed_analyses', 'success_rate')
+            'fields': ('total_requests', 'successful_analyses', 'failed_analyses', 'success_rate',
+                      'parse_failures', 'parse_failure_rate')
         }),
         ('Tokens y Costos', {
             'fields': ('total_input_tokens', 'total_output_tokens', 'total_cost_usd', 'average_cost_per_request')
         }),
         ('Fechas', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('last_analysis_at', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
\ No newline at end of file
+        return super().get_queryset(request).select_related('user')
+
+# Rollups: se mantienen solos (y con rebuild_usage_rollups), sólo lectura en el admin
+ROLLUP_FIELDS = ('total_requests', 'successful_analyses', 'failed_analyses', 'success_rate',
+                 'parse_failures', 'total_input_tokens', 'total_output_tokens',
+                 'total_cost_usd', 'average_cost_per_request', 'last_analysis_at')
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Admin de sólo lectura para los rollups de uso"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(GeminiUsageMonthlyStats)
+class GeminiUsageMonthlyStatsAdmin(RollupAdmin):
+    """Admin para GeminiUsageMonthlyStats"""
+    list_display = ('user', 'month') + ROLLUP_FIELDS
+    search_fields = ('user__email',)
+    date_hierarchy = 'month'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+
+@admin.register(GeminiGlobalDailyStats)
+class GeminiGlobalDailyStatsAdmin(RollupAdmin):
+    """Admin para GeminiGlobalDailyStats"""
+    list_display = ('date',) + ROLLUP_FIELDS
+    date_hierarchy = 'date'
+
+
+@admin.register(GeminiGlobalMonthlyStats)
+class GeminiGlobalMonthlyStatsAdmin(RollupAdmin):
+    """Admin para GeminiGlobalMonthlyStats"""
+    list_display = ('month',) + ROLLUP_FIELDS
+    date_hierarchy = 'month'
@@ -0,0 +1,243 @@
+# ai_analysis/admission.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from django.conf import settings
+
+
+class AdmissionRejected(Exception):
+    """La cola de espera para Gemini está llena o se venció el plazo de espera"""
+
+
+class AdmissionController:
+    """
+    Limita las llamadas a Gemini en curso entre todos los procesos del servidor.
+
+    El estado vive en un archivo SQLite local compartido por los workers de
+    gunicorn: una tabla de leases (llamadas en curso) y otra de waiters (cola).
+    Cuando se libera un cupo pasa primero el waiter cuyo usuario tiene menos
+    llamadas en curso y, a igualdad, el que llegó antes; así un usuario que
+    sube muchas fotos no deja sin cupo a los demás.
+
+    Los leases vencen solos después de `lease_ttl` segundos por si un proceso
+    muere sin liberarlos.
+    """
+
+    POLL_INTERVAL = 0.05
+    STALE_WAITER_SECONDS = 5
+
+    def __init__(self, db_path, max_in_flight=8, queue_size=50, timeout=20, lease_ttl=120):
+        self.db_path = str(db_path)
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.lease_ttl = lease_ttl
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, user_id):
+        """
+        Espera un cupo para llamar a Gemini.
+
+        Devuelve un dict con 'queue_depth' (waiters delante al llegar) y
+        'wait_seconds'. Lanza AdmissionRejected si la cola está llena o no se
+        obtuvo cupo dentro de `timeout` segundos.
+        """
+        lease_id, info = self.acquire(user_id)
+        try:
+            yield info
+        finally:
+            self.release(lease_id)
+
+    def acquire(self, user_id):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waiter_id, queue_depth = self._enqueue(user_id)
+
+        while True:
+            lease_id = self._try_acquire(waiter_id, user_id)
+            if lease_id is not None:
+                return lease_id, {
+                    'queue_depth': queue_depth,
+                    'wait_seconds': time.monotonic() - start,
+                }
+            if time.monotonic() >= deadline:
+                self._execute('DELETE FROM waiters WHERE id = ?', (waiter_id,))
+                raise AdmissionRejected('Tiempo de espera agotado en la cola de Gemini')
+            time.sleep(self.POLL_INTERVAL)
+
+    @asynccontextmanager
+    async def aslot(self, user_id):
+        """Igual que slot() para vistas async: espera el cupo sin bloquear el event loop"""
+        lease_id, info = await self.aacquire(user_id)
+        try:
+            yield info
+        finally:
+            await asyncio.to_thread(self.release, lease_id)
+
+    async def aacquire(self, user_id):
+        # Las transacciones BEGIN IMMEDIATE pueden esperar el lock hasta 10 s
+        # con contención: corren en un hilo y en el event loop sólo queda la
+        # espera entre intentos
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waiter_id, queue_depth = await asyncio.to_thread(self._enqueue, user_id)
+
+        while True:
+            lease_id = await asyncio.to_thread(self._try_acquire, waiter_id, user_id)
+            if lease_id is not None:
+                return lease_id, {
+                    'queue_depth': queue_depth,
+                    'wait_seconds': time.monotonic() - start,
+                }
+            if time.monotonic() >= deadline:
+                await asyncio.to_thread(self._execute, 'DELETE FROM waiters WHERE id = ?', (waiter_id,))
+                raise AdmissionRejected('Tiempo de espera agotado en la cola de Gemini')
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def release(self, lease_id):
+        self._execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+
+    def stats(self):
+        """Llamadas en curso y en cola en todo el servidor"""
+        conn = self._connection()
+        in_flight = conn.execute('SELECT COUNT(*) FROM leases').fetchone()[0]
+        waiting = conn.execute('SELECT COUNT(*) FROM waiters').fetchone()[0]
+        return {'in_flight': in_flight, 'waiting': waiting, 'max_in_flight': self.max_in_flight}
+
+    def _enqueue(self, user_id):
+        now = time.time()
+        with self._transaction() as conn:
+            self._purge(conn, now)
+            waiting = conn.execute('SELECT COUNT(*) FROM waiters').fetchone()[0]
+            if waiting >= self.queue_size:
+                raise AdmissionRejected('Cola de Gemini llena')
+            cursor = conn.execute(
+                'INSERT INTO waiters (user_id, enqueued_at, heartbeat) VALUES (?, ?, ?)',
+                (user_id, now, now)
+            )
+            return cursor.lastrowid, waiting
+
+    def _try_acquire(self, waiter_id, user_id):
+        now = time.time()
+        with self._transaction() as conn:
+            self._purge(conn, now)
+            in_flight = conn.execute('SELECT COUNT(*) FROM leases').fetchone()[0]
+            free = self.max_in_flight - in_flight
+
+            if free > 0:
+                # Orden justo: primero quien tiene menos llamadas en curso
+                queue = conn.execute(
+                    'SELECT w.id FROM waiters w '
+                    'ORDER BY (SELECT COUNT(*) FROM leases l WHERE l.user_id = w.user_id), '
+                    'w.enqueued_at, w.id LIMIT ?',
+                    (free,)
+                ).fetchall()
+                if any(row[0] == waiter_id for row in queue):
+                    conn.execute('DELETE FROM waiters WHERE id = ?', (waiter_id,))
+                    cursor = conn.execute(
+                        'INSERT INTO leases (user_id, pid, acquired_at, expires_at) VALUES (?, ?, ?, ?)',
+                        (user_id, os.getpid(), now, now + self.lease_ttl)
+                    )
+                    return cursor.lastrowid
+
+            conn.execute('UPDATE waiters SET heartbeat = ? WHERE id = ?', (now, waiter_id))
+            return None
+
+    def _purge(self, conn, now):
+        conn.execute('DELETE FROM leases WHERE expires_at < ?', (now,))
+        conn.execute('DELETE FROM waiters WHERE heartbeat < ?', (now - self.STALE_WAITER_SECONDS,))
+
+    def _execute(self, sql, params):
+        with self._transaction() as conn:
+            conn.execute(sql, params)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        # IMMEDIATE toma el lock de escritura al empezar: las lecturas y
+        # escrituras de la transacción son atómicas entre procesos
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            self._setup(conn)
+            self._local.conn = conn
+        return conn
+
+    def _setup(self, conn):
+        with self._init_lock:
+            if self._initialized:
+                return
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS leases ('
+                'id INTEGER PRIMARY KEY, user_id INTEGER, pid INTEGER, '
+                'acquired_at REAL, expires_at REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS waiters ('
+                'id INTEGER PRIMARY KEY, user_id INTEGER, enqueued_at REAL, heartbeat REAL)'
+            )
+            self._initialized = True
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Controlador de admisión del proceso, o None si está deshabilitado"""
+    global _controller
+    if not getattr(settings, 'GEMINI_ADMISSION_ENABLED', True):
+        return None
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    db_path=getattr(settings, 'GEMINI_ADMISSION_DB_PATH',
+                                    settings.BASE_DIR / 'gemini_admission.sqlite3'),
+                    max_in_flight=getattr(settings, 'GEMINI_MAX_IN_FLIGHT', 8),
+                    queue_size=getattr(settings, 'GEMINI_ADMISSION_QUEUE_SIZE', 50),
+                    timeout=getattr(settings, 'GEMINI_ADMISSION_TIMEOUT_SECONDS', 20),
+                    # Un lease cubre el análisis completo: puede escalar por
+                    # todos los modelos, cada uno con sus reintentos
+                    lease_ttl=getattr(settings, 'GEMINI_ANALYSIS_MAX_SECONDS', 204) + 30
+                )
+    return _controller
+
+
+@contextmanager
+def gemini_slot(user_id):
+    """Atajo: cupo de Gemini para `user_id`, o sin límite si la admisión está deshabilitada"""
+    controller = get_admission_controller()
+    if controller is None:
+        yield {'queue_depth': None, 'wait_seconds': None}
+        return
+    with controller.slot(user_id) as info:
+        yield info
+
+
+@asynccontextmanager
+async def async_gemini_slot(user_id):
+    """Versión async de gemini_slot"""
+    controller = get_admission_controller()
+    if controller is None:
+        yield {'queue_depth': None, 'wait_seconds': None}
+        return
+    async with controller.aslot(user_id) as info:
+        yield info
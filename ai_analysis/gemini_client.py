@@ -1,78 +1,496 @@
 # ai_analysis/gemini_client.py
+import asyncio
+import copy
 import os
-import base64
 import json
+import threading
 import time
+from contextlib import nullcontext
 from decimal import Decimal
 import google.generativeai as genai
+from google.generativeai import client as genai_client
 from django.conf import settings
+from .prompt_cache import PromptCache
+from .resilience import CircuitBreaker, CircuitOpenError, backoff_delay, is_transient_error
+from .schemas import RESPONSE_SCHEMAS, VALIDATORS, SchemaValidationError
+
+_configure_lock = threading.Lock()
+_configured_api_key = None
+
+
+def _configure_genai(api_key, transport):
+    """Configura el SDK una sola vez por proceso (reutiliza el canal de transporte)"""
+    global _configured_api_key
+    with _configure_lock:
+        if _configured_api_key != api_key:
+            # Con 'grpc' no se fija el transporte: el cliente síncrono usa grpc
+            # por defecto y el asíncrono (generate_content_async) grpc_asyncio
+            genai.configure(api_key=api_key, transport=None if transport == 'grpc' else transport)
+            _configured_api_key = api_key
+
+
+_async_clients = {}
+_async_clients_lock = threading.Lock()
+
+
+def _get_async_client():
+    """
+    Cliente gRPC asíncrono del event loop en curso.
+
+    El canal grpc.aio queda ligado al loop donde se crea, pero el SDK guarda
+    un único cliente asíncrono en cada GenerativeModel (compartidos por todo
+    el proceso). Bajo ASGI hay un loop por worker y se crea un cliente; bajo
+    WSGI Django corre cada vista async en un loop nuevo y cada request crea
+    el suyo.
+    """
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        # El canal referencia a su loop, así que los de loops ya cerrados se
+        # descartan acá (un WeakKeyDictionary nunca los soltaría)
+        for closed in [other for other in _async_clients if other.is_closed()]:
+            del _async_clients[closed]
+        async_client = _async_clients.get(loop)
+        if async_client is None:
+            async_client = genai_client._client_manager.make_client('generative_async')
+            _async_clients[loop] = async_client
+    return async_client
+
+
+ANALYSIS_MODES = ('single', 'plate')
+
+# Precios por defecto en USD por 1M tokens (actualizar según documentación de Google)
+DEFAULT_PRICING = {
+    'gemini-1.5-flash': {'input': '0.15', 'output': '0.60', 'cached_input': '0.0375'},
+}
+
+
+def get_model_pricing(model_name):
+    """
+    Precio por token (Decimal) de input, output e input cacheado para un modelo.
+
+    Lee settings.GEMINI_PRICING (USD por 1M tokens); los modelos que no están
+    en la tabla usan el precio de gemini-1.5-flash.
+    """
+    table = getattr(settings, 'GEMINI_PRICING', DEFAULT_PRICING)
+    prices = table.get(model_name) or table.get('gemini-1.5-flash') or DEFAULT_PRICING['gemini-1.5-flash']
+    per_million = Decimal('1000000')
+    return {
+        'input': Decimal(str(prices['input'])) / per_million,
+        'output': Decimal(str(prices['output'])) / per_million,
+        'cached_input': Decimal(str(prices.get('cached_input', prices['input']))) / per_million,
+    }
+
 
 class GeminiClient:
-    def __init__(self):
+    def __init__(self, api_key=None, model_name=None, timeout=None, pool_size=None):
         # Configurar Gemini API
-        api_key = getattr(settings, 'GEMINI_API_KEY', os.getenv('GEMINI_API_KEY'))
+        api_key = api_key or getattr(settings, 'GEMINI_API_KEY', os.getenv('GEMINI_API_KEY'))
         if not api_key:
             raise ValueError("GEMINI_API_KEY no configurada")
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        _configure_genai(api_key, getattr(settings, 'GEMINI_TRANSPORT', 'grpc'))
+        # Modelos en orden de costo: se prueba el primero y se escala al
+        # siguiente sólo si la respuesta viene con confianza 'bajo' o no se
+        # pudo parsear. Con model_name se usa un solo modelo.
+        if model_name:
+            tier_names = [model_name]
+        else:
+            tier_names = list(getattr(settings, 'GEMINI_MODEL_TIERS', None) or
+                              [getattr(settings, 'GEMINI_MODEL_NAME', 'gemini-1.5-flash')])
+        # El prompt fijo de cada modo va como system_instruction (o en un
+        # CachedContent, ver PromptCache): cada request sólo envía la imagen
+        self.tiers = [
+            {
+                'name': name,
+                'models': {
+                    mode: genai.GenerativeModel(name, system_instruction=self._get_prompt(mode))
+                    for mode in ANALYSIS_MODES
+                },
+                'pricing': get_model_pricing(name),
+            }
+            for name in tier_names
+        ]
+        self.model_name = self.tiers[0]['name']
+        self.prompt_cache = None
+        if getattr(settings, 'GEMINI_CONTEXT_CACHE_ENABLED', False):
+            self.prompt_cache = PromptCache(ttl=getattr(settings, 'GEMINI_CONTEXT_CACHE_TTL_SECONDS', 3600))
+        self.structured_output = getattr(settings, 'GEMINI_STRUCTURED_OUTPUT', True)
+        self.timeout = timeout or getattr(settings, 'GEMINI_TIMEOUT_SECONDS', 30)
+        
+        # Máximo de llamadas simultáneas que este cliente deja pasar al canal
+        self._slots = threading.BoundedSemaphore(pool_size or getattr(settings, 'GEMINI_POOL_SIZE', 10))
+        
+        # Reintentos para errores transitorios y circuit breaker
+        self.max_retries = getattr(settings, 'GEMINI_MAX_RETRIES', 2)
+        self.retry_base_delay = getattr(settings, 'GEMINI_RETRY_BASE_DELAY', 0.5)
+        self.retry_max_delay = getattr(settings, 'GEMINI_RETRY_MAX_DELAY', 4)
+        self.breaker = CircuitBreaker(
+            failure_threshold=getattr(settings, 'GEMINI_BREAKER_FAILURE_THRESHOLD', 5),
+            recovery_timeout=getattr(settings, 'GEMINI_BREAKER_RECOVERY_SECONDS', 30)
+        )
+
+    
+    def analyze_food_image(self, image_bytes: bytes, image_format: str = 'jpeg',
+                           mode: str = 'single') -> dict:
+        """
+        Analiza una imagen de alimento (bytes ya decodificados) usando Gemini
+
+        En mode='plate' se piden todos los alimentos del plato en una sola
+        llamada y food_data trae una lista 'items'. Si hay varios modelos
+        configurados se escala de uno al siguiente según _should_escalate;
+        'route' trae latencia, tokens y costo de cada intento.
+        """
+        results = []
+        for index, tier in enumerate(self.tiers):
+            results.append(self._analyze_with_tier(tier, image_bytes, image_format, mode))
+            if index == len(self.tiers) - 1 or not self._should_escalate(results[-1], mode):
+                break
+        return self._combine_results(results)
+    
+    def analyze_food_image_stream(self, image_bytes: bytes, image_format: str = 'jpeg',
+                                  mode: str = 'single'):
+        """
+        Igual que analyze_food_image pero con la generación en streaming.
         
-        # Precios por token (actualizar según documentación de Google)
-        self.input_price_per_token = Decimal('0.00000015')  # $0.15 por 1M tokens
-        self.output_price_per_token = Decimal('0.0000006')  # $0.60 por 1M tokens
+        Es un generador de eventos (tipo, datos): ('model_started', modelo)
+        cuando Gemini acepta el request, ('partial', texto_acumulado) por cada
+        fragmento y al final ('result', dict) con la misma forma que
+        analyze_food_image. Si se escala de modelo se repiten model_started y
+        partial con el modelo siguiente. Los reintentos sólo cubren el inicio
+        de cada llamada; un error a mitad del stream termina en un resultado
+        con error.
+        """
+        results = []
+        for index, tier in enumerate(self.tiers):
+            for event, data in self._stream_with_tier(tier, image_bytes, image_format, mode):
+                if event == 'result':
+                    results.append(data)
+                else:
+                    yield event, data
+            if index == len(self.tiers) - 1 or not self._should_escalate(results[-1], mode):
+                break
+        yield 'result', self._combine_results(results)
     
-    def analyze_food_image(self, image_data: str, image_format: str = 'jpeg') -> dict:
+    async def analyze_food_image_async(self, image_bytes: bytes, image_format: str = 'jpeg',
+                                       mode: str = 'single') -> dict:
         """
-        Analiza una imagen de alimento usando Gemini
+        Versión asíncrona de analyze_food_image para el endpoint ASGI.
+        
+        Usa generate_content_async, así que mientras espera a Gemini no ocupa
+        un hilo. Requiere GEMINI_TRANSPORT=grpc; cada event loop usa su propio
+        canal asíncrono (ver _get_async_client).
         """
+        results = []
+        for index, tier in enumerate(self.tiers):
+            results.append(await self._analyze_with_tier_async(tier, image_bytes, image_format, mode))
+            if index == len(self.tiers) - 1 or not self._should_escalate(results[-1], mode):
+                break
+        return self._combine_results(results)
+    
+    def _analyze_with_tier(self, tier, image_bytes, image_format, mode):
+        """Una llamada a Gemini con el modelo de `tier`"""
+        call_info = {'retries': 0}
+        start_time = time.time()
         try:
-            # Decodificar imagen base64
-            image_bytes = base64.b64decode(image_data)
-            
-            # Preparar prompt estructurado
-            prompt = self._get_food_analysis_prompt()
+            # El prompt ya está en el modelo; sólo se usa para estimar tokens
+            prompt = self._get_prompt(mode)
             
-            # Crear objeto de imagen para Gemini
-            image_part = {
-                "mime_type": f"image/{image_format}",
-                "data": image_bytes
+            # Hacer request a Gemini
+            response = self._generate_content(
+                [self._image_part(image_bytes, image_format)], call_info,
+                generation_config=self._get_generation_config(mode),
+                model=self._get_model(tier, mode)
+            )
+            return self._build_result(
+                response, prompt, len(image_bytes), time.time() - start_time, call_info, mode, tier
+            )
+        
+        except CircuitOpenError as e:
+            return self._unavailable_result(e, call_info)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'processing_time': time.time() - start_time,
+                'retries': call_info['retries']
             }
+    
+    async def _analyze_with_tier_async(self, tier, image_bytes, image_format, mode):
+        """Igual que _analyze_with_tier pero sin bloquear el event loop"""
+        call_info = {'retries': 0}
+        start_time = time.time()
+        try:
+            prompt = self._get_prompt(mode)
+            if self.prompt_cache is not None:
+                # Crear o refrescar el CachedContent es una llamada síncrona
+                model = await asyncio.to_thread(self._get_model, tier, mode)
+            else:
+                model = tier['models'][mode]
             
-            # Hacer request a Gemini
-            start_time = time.time()
-            response = self.model.generate_content([prompt, image_part])
-            processing_time = time.time() - start_time
+            response = await self._generate_content_async(
+                [self._image_part(image_bytes, image_format)], call_info,
+                generation_config=self._get_generation_config(mode),
+                model=model
+            )
+            return self._build_result(
+                response, prompt, len(image_bytes), time.time() - start_time, call_info, mode, tier
+            )
+        
+        except CircuitOpenError as e:
+            return self._unavailable_result(e, call_info)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'processing_time': time.time() - start_time,
+                'retries': call_info['retries']
+            }
+    
+    def _stream_with_tier(self, tier, image_bytes, image_format, mode):
+        """Una llamada en streaming con el modelo de `tier` (ver analyze_food_image_stream)"""
+        call_info = {'retries': 0}
+        start_time = time.time()
+        try:
+            prompt = self._get_prompt(mode)
             
-            # Procesar respuesta
-            if response.text:
-                parsed_data = self._parse_gemini_response(response.text)
-                
-                # Calcular costos (estimados)
-                input_tokens = self._estimate_input_tokens(prompt, len(image_bytes))
-                output_tokens = self._estimate_output_tokens(response.text)
-                
-                return {
-                    'success': True,
-                    'food_data': parsed_data,
-                    'processing_time': processing_time,
-                    'input_tokens': input_tokens,
-                    'output_tokens': output_tokens,
-                    'cost_usd': float(self._calculate_cost(input_tokens, output_tokens)),
-                    'raw_response': response.text
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': 'No response from Gemini',
-                    'processing_time': processing_time
-                }
+            # El cupo del cliente se mantiene mientras se consumen los fragmentos
+            with self._slots:
+                response = self._generate_content(
+                    [self._image_part(image_bytes, image_format)], call_info,
+                    generation_config=self._get_generation_config(mode),
+                    stream=True,
+                    model=self._get_model(tier, mode)
+                )
+                yield 'model_started', tier['name']
                 
+                text = ''
+                for chunk in response:
+                    if chunk.parts:
+                        text += chunk.text
+                        yield 'partial', text
+            
+            result = self._build_result(
+                response, prompt, len(image_bytes), time.time() - start_time, call_info, mode, tier
+            )
+        
+        except CircuitOpenError as e:
+            result = self._unavailable_result(e, call_info)
         except Exception as e:
-            return {
+            result = {
                 'success': False,
                 'error': str(e),
-                'processing_time': time.time() - start_time if 'start_time' in locals() else 0
+                'processing_time': time.time() - start_time,
+                'retries': call_info['retries']
+            }
+        
+        yield 'result', result
+    
+    def _get_model(self, tier, mode):
+        """Modelo del nivel con el prompt del modo: el de context caching si está activo"""
+        if self.prompt_cache is not None:
+            model = self.prompt_cache.get_model(tier['name'], mode, self._get_prompt(mode))
+            if model is not None:
+                return model
+        return tier['models'][mode]
+    
+    def _should_escalate(self, result, mode):
+        """
+        Hay que probar con el modelo siguiente si la respuesta no se pudo
+        parsear o viene con confianza 'bajo'. Los errores de llamada no escalan
+        (si Gemini está caído, el modelo siguiente también).
+        """
+        if not result['success']:
+            return False
+        if result.get('parse_error'):
+            return True
+        food_data = result['food_data']
+        if mode == 'plate':
+            items = food_data.get('items') or []
+            return not items or any(item.get('confidence') == 'bajo' for item in items)
+        return food_data.get('confidence') == 'bajo'
+    
+    def _combine_results(self, results):
+        """
+        Resultado final de una o más llamadas: el del último intento exitoso,
+        con tokens, costo, tiempo y reintentos sumados de todos los intentos.
+        """
+        successful = [result for result in results if result['success']]
+        final = dict(successful[-1] if successful else results[-1])
+        
+        final['route'] = [
+            {
+                'model': result.get('model'),
+                'success': result['success'],
+                'latency': round(result.get('processing_time', 0), 3),
+                'input_tokens': result.get('input_tokens', 0),
+                'output_tokens': result.get('output_tokens', 0),
+                'cost_usd': result.get('cost_usd', 0),
+                'confidence': (result.get('food_data') or {}).get('confidence'),
+                'parse_error': result.get('parse_error', False),
             }
+            for result in results
+        ]
+        final['escalated'] = len(results) > 1
+        if len(results) > 1:
+            for key in ('input_tokens', 'output_tokens', 'cached_tokens', 'retries'):
+                final[key] = sum(result.get(key, 0) for result in results)
+            final['cost_usd'] = sum(result.get('cost_usd', 0) for result in results)
+            final['processing_time'] = sum(result.get('processing_time', 0) for result in results)
+            final['tokens_estimated'] = any(result.get('tokens_estimated') for result in results)
+        return final
+    
+    def _build_result(self, response, prompt, image_size_bytes, processing_time, call_info, mode, tier):
+        """Arma el dict de resultado a partir de la respuesta completa de Gemini"""
+        if not response.text:
+            return {
+                'success': False,
+                'error': 'No response from Gemini',
+                'model': tier['name'],
+                'processing_time': processing_time,
+                'retries': call_info['retries']
+            }
+        
+        parsed_data = self._parse_gemini_response(response.text, mode=mode)
+        
+        # Calcular costos con el uso real informado por Gemini
+        usage = self._get_usage(response, prompt, image_size_bytes)
+        cost = self._calculate_cost(
+            usage['input_tokens'], usage['output_tokens'], usage['cached_tokens'], tier['pricing']
+        )
+        
+        return {
+            'success': True,
+            'food_data': parsed_data,
+            'processing_time': processing_time,
+            'model': tier['name'],
+            'input_tokens': usage['input_tokens'],
+            'output_tokens': usage['output_tokens'],
+            'cached_tokens': usage['cached_tokens'],
+            'tokens_estimated': usage['estimated'],
+            'cost_usd': float(cost),
+            'raw_response': response.text,
+            'parse_error': 'parse_error' in parsed_data,
+            'retries': call_info['retries']
+        }
+    
+    def _unavailable_result(self, error, call_info):
+        return {
+            'success': False,
+            'error': str(error),
+            'unavailable': True,
+            'processing_time': 0,
+            'retries': call_info['retries']
+        }
+    
+    def _image_part(self, image_bytes, image_format):
+        """Objeto de imagen para Gemini"""
+        return {
+            "mime_type": f"image/{image_format}",
+            "data": image_bytes
+        }
+    
+    def _get_generation_config(self, mode):
+        """
+        Pide a Gemini JSON que cumpla el esquema del modo (single/plate).
+        
+        Con GEMINI_STRUCTURED_OUTPUT=False se vuelve al texto libre del prompt.
+        """
+        if not self.structured_output:
+            return None
+        return {
+            'response_mime_type': 'application/json',
+            'response_schema': RESPONSE_SCHEMAS[mode],
+        }
+    
+    def _generate_content(self, contents, call_info, generation_config=None, stream=False, model=None):
+        """
+        Llama a generate_content con reintentos y circuit breaker.
+        
+        Los errores transitorios (503, 429, timeouts...) se reintentan hasta
+        max_retries veces con backoff exponencial y jitter. Si el breaker está
+        abierto se lanza CircuitOpenError sin llamar a Gemini. La cantidad de
+        reintentos queda en call_info['retries'].
+        
+        Con stream=True devuelve la respuesta iterable; el cupo del cliente lo
+        toma quien la consume. `model` es el GenerativeModel a usar (por
+        defecto, el del primer nivel en modo single).
+        """
+        model = model or self.tiers[0]['models']['single']
+        attempt = 0
+        while True:
+            if not self.breaker.allow_request():
+                raise CircuitOpenError('Gemini no disponible temporalmente (circuit breaker abierto)')
+            
+            try:
+                with nullcontext() if stream else self._slots:
+                    response = model.generate_content(
+                        contents,
+                        generation_config=generation_config,
+                        stream=stream,
+                        request_options={'timeout': self.timeout}
+                    )
+            except Exception as e:
+                if not is_transient_error(e):
+                    # Errores del request (imagen inválida, API key...) no indican
+                    # que Gemini esté caído: no cuentan para el breaker
+                    self.breaker.record_success()
+                    raise
+                
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                
+                time.sleep(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay))
+                attempt += 1
+                call_info['retries'] = attempt
+                self.breaker.record_retry()
+                continue
+            
+            self.breaker.record_success()
+            return response
+    
+    async def _generate_content_async(self, contents, call_info, generation_config=None, model=None):
+        """
+        Igual que _generate_content con generate_content_async y asyncio.sleep
+        entre reintentos. No usa el semáforo del cliente: en el camino ASGI el
+        límite de llamadas en curso lo pone el control de admisión.
+        """
+        # Copia del modelo compartido con el cliente asíncrono de este loop
+        model = copy.copy(model or self.tiers[0]['models']['single'])
+        model._async_client = _get_async_client()
+        attempt = 0
+        while True:
+            if not self.breaker.allow_request():
+                raise CircuitOpenError('Gemini no disponible temporalmente (circuit breaker abierto)')
+            
+            try:
+                response = await model.generate_content_async(
+                    contents,
+                    generation_config=generation_config,
+                    request_options={'timeout': self.timeout}
+                )
+            except Exception as e:
+                if not is_transient_error(e):
+                    self.breaker.record_success()
+                    raise
+                
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                
+                await asyncio.sleep(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay))
+                attempt += 1
+                call_info['retries'] = attempt
+                self.breaker.record_retry()
+                continue
+            
+            self.breaker.record_success()
+            return response
+    
+    def _get_prompt(self, mode):
+        if mode == 'plate':
+            return self._get_plate_analysis_prompt()
+        return self._get_food_analysis_prompt()
     
     def _get_food_analysis_prompt(self) -> str:
         """Prompt estructurado para análisis de alimentos"""
@@ -108,41 +526,104 @@ Si no puedes identificar el alimento, responde:
 
 Analiza la imagen ahora:"""
     
-    def _parse_gemini_response(self, response_text: str) -> dict:
-        """Parsea la respuesta JSON de Gemini"""
+    def _get_plate_analysis_prompt(self) -> str:
+        """Prompt estructurado para un plato con varios alimentos"""
+        return """Analiza esta imagen de un plato o comida que puede contener VARIOS alimentos distintos.
+Identifica cada alimento por separado, estima su porción visible en gramos y proporciona la información nutricional en formato JSON.
+
+IMPORTANTE: Responde SOLO con JSON válido, sin texto adicional.
+
+Formato requerido:
+{
+    "items": [
+        {
+            "food_name": "Nombre del alimento identificado",
+            "serving_size": "Porción visible (ej: '1 taza de arroz', '1 pechuga mediana')",
+            "portion_g": número,
+            "confidence": "alto|medio|bajo",
+            "nutrition_per_serving": {
+                "calories": número,
+                "protein_g": número,
+                "carbs_g": número,
+                "fat_g": número
+            },
+            "nutrition_per_100g": {
+                "calories": número,
+                "protein_g": número,
+                "carbs_g": número,
+                "fat_g": número
+            }
+        }
+    ]
+}
+
+"nutrition_per_serving" corresponde a la porción estimada en "portion_g".
+Si no puedes identificar ningún alimento, responde:
+{
+    "items": [],
+    "error": "No se pudo identificar alimentos en la imagen"
+}
+
+Analiza la imagen ahora:"""
+    
+    def _parse_gemini_response(self, response_text: str, mode: str = 'single') -> dict:
+        """
+        Parsea y valida la respuesta JSON de Gemini contra el esquema del modo.
+        
+        Si falla devuelve un resultado 'bajo' con 'parse_error' para que no se
+        use como alimento y quede contado como llamada desperdiciada.
+        """
         try:
-            # Limpiar la respuesta (remover markdown, etc.)
             cleaned_text = response_text.strip()
-            if cleaned_text.startswith('```json'):
-                cleaned_text = cleaned_text[7:]
-            if cleaned_text.endswith('```'):
-                cleaned_text = cleaned_text[:-3]
+            if not self.structured_output:
+                # Texto libre: remover markdown alrededor del JSON
+                if cleaned_text.startswith('```json'):
+                    cleaned_text = cleaned_text[7:]
+                if cleaned_text.endswith('```'):
+                    cleaned_text = cleaned_text[:-3]
             
-            # Parsear JSON
             data = json.loads(cleaned_text)
-            
-            # Validar estructura
-            if 'food_name' not in data:
-                raise ValueError("Respuesta inválida: falta food_name")
-            
+            VALIDATORS[mode](data)
             return data
             
         except json.JSONDecodeError as e:
+            error = f'Error parsing JSON: {str(e)}'
+        except SchemaValidationError as e:
+            error = f'Respuesta inválida: {str(e)}'
+        
+        return {
+            'food_name': 'Error de parsing',
+            'confidence': 'bajo',
+            'error': error,
+            'parse_error': True,
+            'raw_text': response_text
+        }
+    
+    def _get_usage(self, response, prompt: str, image_size_bytes: int) -> dict:
+        """
+        Tokens usados según usage_metadata de la respuesta.
+        
+        Si la respuesta no trae usage_metadata se usan los estimadores y se
+        marca 'estimated' para poder filtrar esos registros.
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None and usage.prompt_token_count:
             return {
-                'food_name': 'Error de parsing',
-                'confidence': 'bajo',
-                'error': f'Error parsing JSON: {str(e)}',
-                'raw_text': response_text
-            }
-        except Exception as e:
-            return {
-                'food_name': 'Error desconocido',
-                'confidence': 'bajo',
-                'error': str(e)
+                'input_tokens': usage.prompt_token_count,
+                'output_tokens': usage.candidates_token_count or 0,
+                'cached_tokens': getattr(usage, 'cached_content_token_count', 0) or 0,
+                'estimated': False,
             }
+        
+        return {
+            'input_tokens': self._estimate_input_tokens(prompt, image_size_bytes),
+            'output_tokens': self._estimate_output_tokens(response.text),
+            'cached_tokens': 0,
+            'estimated': True,
+        }
     
     def _estimate_input_tokens(self, prompt: str, image_size_bytes: int) -> int:
-        """Estima tokens de input (prompt + imagen)"""
+        """Estima tokens de input (prompt + imagen). Sólo como respaldo"""
         # Estimación aproximada
         text_tokens = len(prompt.split()) * 1.3  # ~1.3 tokens por palabra
         image_tokens = image_size_bytes / 1000  # Aproximado para imágenes
@@ -152,8 +633,43 @@ Analiza la imagen ahora:"""
         """Estima tokens de output"""
         return int(len(response_text.split()) * 1.3)
     
-    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> Decimal:
-        """Calcula costo en USD"""
-        input_cost = Decimal(input_tokens) * self.input_price_per_token
-        output_cost = Decimal(output_tokens) * self.output_price_per_token
-        return input_cost + output_cost
\ No newline at end of file
+    def _calculate_cost(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0,
+                        pricing: dict = None) -> Decimal:
+        """Calcula costo en USD (input_tokens incluye los cacheados, que se cobran aparte)"""
+        pricing = pricing or self.tiers[0]['pricing']
+        input_cost = Decimal(input_tokens - cached_tokens) * pricing['input']
+        cached_cost = Decimal(cached_tokens) * pricing['cached_input']
+        output_cost = Decimal(output_tokens) * pricing['output']
+        return input_cost + cached_cost + output_cost
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gemini_client():
+    """
+    Cliente compartido por todo el proceso, creado la primera vez que se usa.
+
+    GeminiClient es seguro para usar desde varios hilos: el SDK mantiene un
+    único canal gRPC/HTTP y el modelo no guarda estado entre llamadas.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
+
+
+def set_gemini_client(client):
+    """
+    Reemplaza el cliente compartido (por ejemplo por un fake en tests).
+
+    Pasar None hace que el próximo get_gemini_client() cree uno nuevo con la
+    configuración actual. Devuelve el cliente anterior.
+    """
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
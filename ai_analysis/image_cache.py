@@ -0,0 +1,162 @@
+# ai_analysis/image_cache.py
+import copy
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from PIL import Image
+
+
+# Huella de una imagen preprocesada: dHash, sha256 de los bytes, nivel de
+# detalle (diferencia media entre píxeles vecinos de la miniatura de 9x8) y
+# color medio de cada cuadrante (RGB de una miniatura de 2x2)
+ImageFingerprint = namedtuple('ImageFingerprint', 'dhash digest detail colors')
+
+
+def perceptual_hash(image_bytes) -> int:
+    """Hash perceptual (dHash de 64 bits) de una imagen codificada"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return dhash(image)
+
+
+def dhash(image) -> int:
+    """
+    Calcula un dHash de 64 bits de una imagen de Pillow ya abierta.
+
+    Imágenes casi idénticas (misma foto re-comprimida, leve cambio de brillo o
+    tamaño) producen hashes a muy poca distancia de Hamming.
+    """
+    return _dhash_pixels(_gray_pixels(image))
+
+
+def image_fingerprint(image, data) -> ImageFingerprint:
+    """
+    Huella de la imagen `image` ya abierta, cuyos bytes codificados son `data`.
+
+    En fotos con poca textura (un plato liso, un cuadro oscuro o
+    sobreexpuesto) los bits del dHash dependen casi sólo del ruido, así que
+    dos fotos distintas quedan a poca distancia; `detail` permite detectar
+    esos casos y `colors` sirve de segunda señal para las demás.
+    """
+    pixels = _gray_pixels(image)
+    detail = sum(
+        abs(pixels[row * 9 + col] - pixels[row * 9 + col + 1])
+        for row in range(8) for col in range(8)
+    ) / 64
+    colors = tuple(image.convert('RGB').resize((2, 2), Image.BOX).tobytes())
+    return ImageFingerprint(_dhash_pixels(pixels), hashlib.sha256(data).hexdigest(), detail, colors)
+
+
+def _gray_pixels(image):
+    return list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+
+
+def _dhash_pixels(pixels) -> int:
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class ImageResultCache:
+    """
+    Cache LRU en memoria de resultados de Gemini indexada por huella de imagen.
+
+    Una imagen con los mismos bytes preprocesados siempre coincide. Una
+    parecida (dHash a `max_distance` bits o menos) sólo coincide si las dos
+    tienen al menos `min_detail` de textura y sus colores por cuadrante no
+    difieren en más de `max_color_distance`; así una foto lisa u oscura no
+    recibe el resultado de otra.
+
+    Cada proceso tiene su propia instancia. Las entradas expiran después de
+    `ttl_seconds` y se descartan las menos usadas al superar `max_entries`.
+    """
+
+    def __init__(self, max_distance=4, min_detail=6, max_color_distance=24, ttl_seconds=86400, max_entries=1024):
+        self.max_distance = max_distance
+        self.min_detail = min_detail
+        self.max_color_distance = max_color_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> (guardado_en, huella, food_data, raw_response)
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint):
+        """Devuelve (food_data, raw_response) de la entrada que coincide o None"""
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+
+            if fingerprint.digest in self._entries:
+                best_digest = fingerprint.digest
+            elif fingerprint.detail < self.min_detail:
+                return None
+            else:
+                best_digest, best_distance = None, self.max_distance + 1
+                for digest, (_, cached, _, _) in self._entries.items():
+                    distance = hamming_distance(fingerprint.dhash, cached.dhash)
+                    if distance < best_distance and self._similar(fingerprint, cached):
+                        best_digest, best_distance = digest, distance
+                if best_digest is None:
+                    return None
+
+            self._entries.move_to_end(best_digest)
+            _, _, food_data, raw_response = self._entries[best_digest]
+            return copy.deepcopy(food_data), raw_response
+
+    def set(self, fingerprint, food_data, raw_response):
+        with self._lock:
+            self._entries[fingerprint.digest] = (time.time(), fingerprint, copy.deepcopy(food_data), raw_response)
+            self._entries.move_to_end(fingerprint.digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _similar(self, fingerprint, cached):
+        if cached.detail < self.min_detail:
+            return False
+        return max(abs(a - b) for a, b in zip(fingerprint.colors, cached.colors)) <= self.max_color_distance
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self, now):
+        # Las entradas se insertan en orden de uso, pero una entrada leída hace
+        # poco puede haber sido guardada hace mucho, así que se revisan todas
+        expired = [
+            digest for digest, (stored_at, _, _, _) in self._entries.items()
+            if now - stored_at > self.ttl_seconds
+        ]
+        for digest in expired:
+            del self._entries[digest]
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Cache del proceso, o None si está deshabilitada en settings"""
+    global _image_cache
+    if not getattr(settings, 'AI_IMAGE_CACHE_ENABLED', True):
+        return None
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                _image_cache = ImageResultCache(
+                    max_distance=getattr(settings, 'AI_IMAGE_CACHE_MAX_DISTANCE', 4),
+                    min_detail=getattr(settings, 'AI_IMAGE_CACHE_MIN_DETAIL', 6),
+                    max_color_distance=getattr(settings, 'AI_IMAGE_CACHE_MAX_COLOR_DISTANCE', 24),
+                    ttl_seconds=getattr(settings, 'AI_IMAGE_CACHE_TTL_SECONDS', 86400),
+                    max_entries=getattr(settings, 'AI_IMAGE_CACHE_MAX_ENTRIES', 1024),
+                )
+    return _image_cache
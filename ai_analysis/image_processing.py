@@ -0,0 +1,145 @@
+# ai_analysis/image_processing.py
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from PIL import Image, ImageOps
+from .image_cache import image_fingerprint
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Errores de Pillow con una imagen que no puede decodificar (UnidentifiedImageError
+# y los archivos truncados son OSError)
+DECODE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+
+# Firmas (magic bytes) de los formatos que aceptamos
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+_HEIF_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'mif1', b'msf1'}
+
+
+def detect_image_format(data):
+    """
+    Detecta el formato de la imagen a partir de sus primeros bytes.
+
+    Acepta bytes o memoryview (sólo se leen los primeros 12 bytes, sin
+    copiar el resto). Devuelve 'jpeg', 'png', 'gif', 'webp', 'heic' o None.
+    """
+    header = bytes(memoryview(data)[:12])
+    for signature, image_format in _IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    if header[4:8] == b'ftyp' and header[8:12] in _HEIF_BRANDS:
+        return 'heic'
+    return None
+
+
+def preprocess_image(image_bytes, max_edge=1024, quality=85):
+    """
+    Normaliza una foto antes de enviarla a Gemini.
+
+    Aplica la orientación EXIF, elimina los metadatos, reduce el lado mayor a
+    `max_edge` píxeles y re-codifica en JPEG con la calidad indicada. También
+    calcula la huella para la cache de resultados sin decodificar la imagen
+    dos veces.
+
+    Se ejecuta en un proceso aparte, por lo que no debe usar Django.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        output = io.BytesIO()
+        # Sin exif= ni icc_profile= Pillow no copia los metadatos originales
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+        width, height = image.size
+        fingerprint = image_fingerprint(image, output.getvalue())
+
+    return {
+        'data': output.getvalue(),
+        'format': 'jpeg',
+        'width': width,
+        'height': height,
+        'image_fingerprint': fingerprint,
+    }
+
+
+def get_process_pool():
+    """Pool de procesos para decodificar/redimensionar, o None si está deshabilitado"""
+    global _pool
+    workers = getattr(settings, 'AI_IMAGE_PROCESS_WORKERS', 2)
+    if workers <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: hacer fork de un proceso con hilos (workers, gRPC) no es seguro
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+
+def reset_process_pool(pool):
+    """Descarta `pool` si sigue siendo el del proceso (un worker murió y quedó roto)"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def prepare_image(image_bytes, image_format):
+    """
+    Preprocesa la imagen fuera del hilo del request.
+
+    Devuelve un dict con 'data', 'format', 'image_fingerprint' (o None) y
+    'preprocessing_time'. Si el pool de procesos está roto se reemplaza y,
+    igual que si no responde a tiempo, la imagen se procesa en este hilo.
+    Sólo si Pillow no puede decodificar la imagen se devuelven los bytes
+    originales sin cambios.
+    """
+    start_time = time.time()
+    max_edge = getattr(settings, 'AI_IMAGE_MAX_EDGE', 1024)
+    quality = getattr(settings, 'AI_IMAGE_JPEG_QUALITY', 85)
+
+    try:
+        pool = get_process_pool()
+        result = None
+        if pool is not None:
+            try:
+                result = pool.submit(preprocess_image, image_bytes, max_edge, quality).result(
+                    timeout=getattr(settings, 'AI_IMAGE_PROCESS_TIMEOUT_SECONDS', 10)
+                )
+            except FutureTimeoutError:
+                logger.warning('El pool de imágenes no respondió a tiempo; se procesa en el hilo del request')
+            except BrokenProcessPool:
+                logger.error('Pool de imágenes roto (murió un worker); se recrea y se procesa en el hilo del request')
+                reset_process_pool(pool)
+        if result is None:
+            result = preprocess_image(image_bytes, max_edge, quality)
+    except DECODE_ERRORS as e:
+        logger.info('No se pudo decodificar la imagen (%s); se envía sin preprocesar', e)
+        result = {'data': image_bytes, 'format': image_format, 'image_fingerprint': None}
+
+    result['preprocessing_time'] = time.time() - start_time
+    return result
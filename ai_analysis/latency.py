@@ -0,0 +1,159 @@
+# ai_analysis/latency.py
+"""
+Histograma de latencias de análisis y percentiles calculados a partir de él.
+
+Los buckets tienen límites fijos (en segundos), así que los histogramas de
+distintas horas se pueden sumar y el percentil se estima interpolando dentro
+del bucket que lo contiene.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Trunc
+from .models import AnalysisLatencyHistogram
+
+# Límite superior de cada bucket; el último bucket (sin límite) es el desborde
+LATENCY_BUCKETS = (
+    0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10, 12.5, 15, 20, 30, 45, 60, 90, 120,
+)
+OVERFLOW_BUCKET = len(LATENCY_BUCKETS)
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+
+def bucket_for(seconds):
+    """Índice del bucket para una latencia en segundos"""
+    return bisect_left(LATENCY_BUCKETS, seconds or 0)
+
+
+def bucket_expression(field='processing_time_seconds'):
+    """Mismo cálculo que bucket_for como expresión SQL (para reconstruir desde la base)"""
+    return Case(
+        *[When(**{f'{field}__lte': bound}, then=Value(index))
+          for index, bound in enumerate(LATENCY_BUCKETS)],
+        default=Value(OVERFLOW_BUCKET),
+        output_field=IntegerField()
+    )
+
+
+def bucket_bounds(bucket):
+    """(límite inferior, límite superior) del bucket; el desborde no tiene superior"""
+    lower = LATENCY_BUCKETS[bucket - 1] if bucket > 0 else 0
+    upper = LATENCY_BUCKETS[bucket] if bucket < OVERFLOW_BUCKET else None
+    return lower, upper
+
+
+def percentile(counts, p):
+    """
+    Estima el percentil `p` (0-100) de un histograma {bucket: cantidad}.
+
+    Interpola linealmente dentro del bucket; si cae en el desborde devuelve
+    su límite inferior (la latencia real es mayor).
+    """
+    total = sum(counts.values())
+    if total == 0:
+        return None
+
+    rank = p / 100 * total
+    seen = 0
+    for bucket in sorted(counts):
+        count = counts[bucket]
+        if count and seen + count >= rank:
+            lower, upper = bucket_bounds(bucket)
+            if upper is None:
+                return lower
+            return round(lower + (upper - lower) * (rank - seen) / count, 3)
+        seen += count
+    return bucket_bounds(max(counts))[0]
+
+
+def summarize(counts, percentiles=DEFAULT_PERCENTILES):
+    """Cantidad total y percentiles de un histograma {bucket: cantidad}"""
+    summary = {'count': sum(counts.values())}
+    for p in percentiles:
+        summary[f'p{p}'] = percentile(counts, p)
+    return summary
+
+
+def histogram_rows(counts):
+    """Histograma {bucket: cantidad} como lista de {'le': límite, 'count': n} para la API"""
+    return [
+        {'le': bucket_bounds(bucket)[1], 'count': counts.get(bucket, 0)}
+        for bucket in range(OVERFLOW_BUCKET + 1)
+    ]
+
+
+def latency_analytics(since, until, granularity='hour'):
+    """
+    Resumen de latencias, fallos y costo entre `since` y `until`.
+
+    Hace una sola consulta agrupada sobre AnalysisLatencyHistogram (filas por
+    hora, no por análisis) y arma en memoria: el total con su histograma, los
+    percentiles por estado y por formato de imagen, y una serie por hora o
+    por día (`granularity`).
+    """
+    since = since.replace(minute=0, second=0, microsecond=0)
+    period = F('hour') if granularity == 'hour' else Trunc('hour', 'day', tzinfo=dt_timezone.utc)
+    rows = AnalysisLatencyHistogram.objects.filter(
+        hour__gte=since, hour__lt=until
+    ).annotate(period=period).values(
+        'period', 'status', 'image_format', 'bucket'
+    ).annotate(
+        bucket_count=Sum('count'), cost=Sum('total_cost_usd')
+    ).order_by()
+
+    overall = defaultdict(int)
+    by_status = defaultdict(lambda: defaultdict(int))
+    by_format = defaultdict(lambda: defaultdict(int))
+    series = defaultdict(lambda: defaultdict(int))
+    failed_by_format = defaultdict(int)
+    failed_by_period = defaultdict(int)
+    cost_by_format = defaultdict(Decimal)
+    cost_by_period = defaultdict(Decimal)
+
+    for row in rows:
+        bucket, count = row['bucket'], row['bucket_count']
+        image_format = row['image_format'] or 'desconocido'
+        overall[bucket] += count
+        by_status[row['status']][bucket] += count
+        by_format[image_format][bucket] += count
+        series[row['period']][bucket] += count
+        cost_by_format[image_format] += row['cost'] or 0
+        cost_by_period[row['period']] += row['cost'] or 0
+        if row['status'] != 'completed':
+            failed_by_format[image_format] += count
+            failed_by_period[row['period']] += count
+
+    def with_failures(summary, failed, cost):
+        summary['failed'] = failed
+        summary['failure_rate'] = round(failed / summary['count'] * 100, 2) if summary['count'] else 0
+        summary['cost_usd'] = cost
+        return summary
+
+    return {
+        'since': since,
+        'until': until,
+        'granularity': granularity,
+        'overall': {
+            **with_failures(
+                summarize(overall), sum(failed_by_format.values()), sum(cost_by_format.values(), Decimal('0'))
+            ),
+            'histogram': histogram_rows(overall),
+        },
+        'by_status': {status: summarize(counts) for status, counts in sorted(by_status.items())},
+        'by_image_format': {
+            image_format: with_failures(
+                summarize(counts), failed_by_format[image_format], cost_by_format[image_format]
+            )
+            for image_format, counts in sorted(by_format.items())
+        },
+        'series': [
+            {
+                'period': key,
+                **with_failures(summarize(series[key]), failed_by_period[key], cost_by_period[key])
+            }
+            for key in sorted(series)
+        ],
+    }
@@ -0,0 +1,96 @@
+# ai_analysis/management/commands/benchmark_analysis.py
+import base64
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el análisis servido por WSGI (gunicorn, analyze/) con el servido por ASGI '
+        '(uvicorn, analyze/async/) enviando requests concurrentes a los dos servidores. '
+        'Levantarlos antes con la misma cantidad de workers, por ejemplo: '
+        '"gunicorn core.wsgi:application --workers 2 --threads 8 --bind 127.0.0.1:8000" y '
+        '"uvicorn core.asgi:application --workers 2 --port 8001"'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('image', help='Imagen a enviar en cada request')
+        parser.add_argument('--token', required=True, help='Access token JWT de un usuario')
+        parser.add_argument(
+            '--wsgi-url', default='http://127.0.0.1:8000/api/ai/analyze/',
+            help='analyze/ en el servidor WSGI (gunicorn)'
+        )
+        parser.add_argument(
+            '--asgi-url', default='http://127.0.0.1:8001/api/ai/analyze/async/',
+            help='analyze/async/ en el servidor ASGI (uvicorn)'
+        )
+        parser.add_argument('--requests', type=int, default=100, help='Requests por endpoint')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests en curso a la vez')
+        parser.add_argument('--timeout', type=float, default=120)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['image'], 'rb') as image_file:
+                image_data = base64.b64encode(image_file.read()).decode()
+        except OSError as e:
+            raise CommandError(f'No se pudo leer la imagen: {e}')
+
+        body = json.dumps({'image_data': image_data}).encode()
+        self.stdout.write(
+            f"{options['requests']} requests por servidor, {options['concurrency']} concurrentes. "
+            'Para medir Gemini y no la cache de imágenes, los servidores deben correr con '
+            'AI_IMAGE_CACHE_ENABLED=False.'
+        )
+
+        for label, url in (('WSGI', options['wsgi_url']), ('ASGI', options['asgi_url'])):
+            stats = self.run_endpoint(url, body, options)
+            self.stdout.write(
+                f"{label} {url}: {stats['throughput']:.2f} req/s en {stats['elapsed']:.1f}s | "
+                f"latencia p50 {stats['p50']:.2f}s p95 {stats['p95']:.2f}s p99 {stats['p99']:.2f}s | "
+                f"status {dict(stats['statuses'])}"
+            )
+
+    def run_endpoint(self, url, body, options):
+        def send(_):
+            request = urllib.request.Request(url, data=body, method='POST', headers={
+                'Content-Type': 'application/json',
+                'Authorization': f"Bearer {options['token']}",
+            })
+            start = time.monotonic()
+            try:
+                with urllib.request.urlopen(request, timeout=options['timeout']) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                status = 'conexión'
+            return status, time.monotonic() - start
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(send, range(options['requests'])))
+        elapsed = time.monotonic() - start
+
+        latencies = sorted(latency for _, latency in results)
+        return {
+            'elapsed': elapsed,
+            'throughput': len(results) / elapsed if elapsed else 0,
+            'p50': self.percentile(latencies, 50),
+            'p95': self.percentile(latencies, 95),
+            'p99': self.percentile(latencies, 99),
+            'statuses': Counter(status for status, _ in results),
+        }
+
+    @staticmethod
+    def percentile(values, p):
+        """Percentil por rango más cercano de una lista ordenada"""
+        if not values:
+            return 0
+        index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+        return values[index]
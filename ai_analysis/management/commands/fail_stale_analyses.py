@@ -0,0 +1,32 @@
+# ai_analysis/management/commands/fail_stale_analyses.py
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ai_analysis.models import ImageAnalysis
+
+
+class Command(BaseCommand):
+    help = (
+        'Marca como error los análisis que quedaron en pending/processing: la cola de '
+        'workers vive en memoria y se pierde al reiniciar o desplegar (correr al iniciar '
+        'el servidor y desde cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int,
+            default=getattr(settings, 'AI_ANALYSIS_STALE_SECONDS', 1800),
+            help='Segundos sin cambios para considerar un análisis abandonado'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+        updated = ImageAnalysis.objects.filter(
+            status__in=['pending', 'processing'], updated_at__lt=cutoff
+        ).update(
+            status='error',
+            error_message='El análisis se interrumpió (reinicio del servidor)',
+            updated_at=timezone.now()
+        )
+        self.stdout.write(self.style.SUCCESS(f'{updated} análisis marcados como error'))
@@ -0,0 +1,113 @@
+# ai_analysis/management/commands/rebuild_usage_rollups.py
+from datetime import timezone as dt_timezone
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncHour, TruncMonth
+from ai_analysis.latency import bucket_expression
+from ai_analysis.models import (
+    AnalysisLatencyHistogram,
+    GeminiGlobalDailyStats,
+    GeminiGlobalMonthlyStats,
+    GeminiUsageMonthlyStats,
+    GeminiUsageStats,
+    ImageAnalysis,
+)
+from ai_analysis.usage_stats import COUNTER_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye los rollups de uso de Gemini (mensual por usuario, diario y '
+        'mensual global) a partir de GeminiUsageStats'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-analyses',
+            action='store_true',
+            help='Reconstruir antes GeminiUsageStats a partir de los ImageAnalysis'
+        )
+        parser.add_argument(
+            '--latency',
+            action='store_true',
+            help='Reconstruir también el histograma de latencias a partir de los ImageAnalysis'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['from_analyses']:
+                count = self.rebuild_daily_stats()
+                self.stdout.write(f'GeminiUsageStats: {count} filas')
+
+            daily = GeminiUsageStats.objects.all()
+            rollups = (
+                (GeminiUsageMonthlyStats, daily.annotate(month=TruncMonth('date')), ('user_id', 'month')),
+                (GeminiGlobalDailyStats, daily, ('date',)),
+                (GeminiGlobalMonthlyStats, daily.annotate(month=TruncMonth('date')), ('month',)),
+            )
+            for model, queryset, keys in rollups:
+                rows = queryset.values(*keys).annotate(
+                    **{field: Sum(field) for field in COUNTER_FIELDS},
+                    last_analysis_at=Max('last_analysis_at'),
+                ).order_by()
+                model.objects.all().delete()
+                model.objects.bulk_create(
+                    [model(**row) for row in rows],
+                    batch_size=1000
+                )
+                self.stdout.write(f'{model.__name__}: {model.objects.count()} filas')
+
+            if options['latency']:
+                count = self.rebuild_latency_histogram()
+                self.stdout.write(f'AnalysisLatencyHistogram: {count} filas')
+
+        self.stdout.write(self.style.SUCCESS('Rollups reconstruidos'))
+
+    def rebuild_daily_stats(self):
+        """
+        Recalcula las estadísticas diarias desde los análisis terminados.
+
+        Igual que update_usage_stats, un análisis cuenta como fallido si no
+        terminó en 'completed' y el día es la fecha UTC.
+        """
+        finished = ~Q(status__in=['pending', 'processing'])
+        rows = ImageAnalysis.objects.filter(finished).annotate(
+            date=TruncDate('created_at', tzinfo=dt_timezone.utc)
+        ).values('user_id', 'date').annotate(
+            total_requests=Count('id'),
+            total_input_tokens=Sum('gemini_request_tokens', default=0),
+            total_output_tokens=Sum('gemini_response_tokens', default=0),
+            total_cost_usd=Sum('gemini_cost_usd', default=0),
+            successful_analyses=Count('id', filter=Q(status='completed')),
+            failed_analyses=Count('id', filter=~Q(status='completed')),
+            parse_failures=Count('id', filter=Q(parse_failed=True)),
+            last_analysis_at=Max('created_at'),
+        ).order_by()
+
+        GeminiUsageStats.objects.all().delete()
+        GeminiUsageStats.objects.bulk_create(
+            [GeminiUsageStats(**row) for row in rows],
+            batch_size=1000
+        )
+        return GeminiUsageStats.objects.count()
+
+    def rebuild_latency_histogram(self):
+        """Recalcula el histograma por hora (de creación) desde los análisis terminados"""
+        rows = ImageAnalysis.objects.exclude(
+            status__in=['pending', 'processing']
+        ).annotate(
+            hour=TruncHour('created_at', tzinfo=dt_timezone.utc),
+            bucket=bucket_expression(),
+            format=Coalesce('image_format', Value('')),
+        ).values('hour', 'status', 'format', 'bucket').annotate(
+            count=Count('id'),
+            total_cost_usd=Sum('gemini_cost_usd', default=0),
+        ).order_by()
+
+        AnalysisLatencyHistogram.objects.all().delete()
+        AnalysisLatencyHistogram.objects.bulk_create(
+            [AnalysisLatencyHistogram(image_format=row.pop('format'), **row) for row in rows],
+            batch_size=1000
+        )
+        return AnalysisLatencyHistogram.objects.count()
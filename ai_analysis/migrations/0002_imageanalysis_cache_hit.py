@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='cache_hit',
+            field=models.BooleanField(default=False, verbose_name='Servido desde cache'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0002_imageanalysis_cache_hit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='preprocessing_time_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='Tiempo de preprocesamiento (s)'),
+        ),
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='processed_image_size',
+            field=models.IntegerField(blank=True, help_text='Tamaño después de orientar, reducir y re-codificar la imagen', null=True, verbose_name='Tamaño enviado a Gemini (bytes)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0003_imageanalysis_preprocessing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='analysis_mode',
+            field=models.CharField(choices=[('single', 'Un alimento'), ('plate', 'Plato con varios alimentos')], default='single', max_length=10, verbose_name='Modo de análisis'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0004_imageanalysis_analysis_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='gemini_retries',
+            field=models.IntegerField(default=0, verbose_name='Reintentos a Gemini'),
+        ),
+    ]
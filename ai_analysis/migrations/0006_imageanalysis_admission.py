@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0005_imageanalysis_gemini_retries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='admission_queue_depth',
+            field=models.IntegerField(blank=True, help_text='Requests esperando delante al momento de encolarse', null=True, verbose_name='Posición en cola de Gemini'),
+        ),
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='admission_wait_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='Espera en cola de Gemini (s)'),
+        ),
+    ]
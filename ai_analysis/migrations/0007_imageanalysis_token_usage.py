@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0006_imageanalysis_admission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='gemini_cached_tokens',
+            field=models.IntegerField(default=0, help_text='Parte de los tokens de request servida desde context caching', verbose_name='Tokens cacheados'),
+        ),
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='gemini_model',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Modelo de Gemini'),
+        ),
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='tokens_estimated',
+            field=models.BooleanField(default=False, help_text='La respuesta no traía usage_metadata y se usaron los estimadores', verbose_name='Tokens estimados'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0007_imageanalysis_token_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geminiusagestats',
+            name='parse_failures',
+            field=models.IntegerField(default=0, verbose_name='Respuestas no parseables'),
+        ),
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='parse_failed',
+            field=models.BooleanField(default=False, help_text='La respuesta de Gemini no era JSON válido según el esquema', verbose_name='Respuesta no parseable'),
+        ),
+    ]
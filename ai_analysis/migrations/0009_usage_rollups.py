@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0008_response_parse_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeminiGlobalDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_requests', models.IntegerField(default=0, verbose_name='Total de requests')),
+                ('total_input_tokens', models.IntegerField(default=0, verbose_name='Total tokens de entrada')),
+                ('total_output_tokens', models.IntegerField(default=0, verbose_name='Total tokens de salida')),
+                ('total_cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=10, verbose_name='Costo total USD')),
+                ('successful_analyses', models.IntegerField(default=0, verbose_name='Análisis exitosos')),
+                ('failed_analyses', models.IntegerField(default=0, verbose_name='Análisis fallidos')),
+                ('parse_failures', models.IntegerField(default=0, verbose_name='Respuestas no parseables')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField(unique=True, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas Globales Diarias de Gemini',
+                'verbose_name_plural': 'Estadísticas Globales Diarias de Gemini',
+            },
+        ),
+        migrations.CreateModel(
+            name='GeminiGlobalMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_requests', models.IntegerField(default=0, verbose_name='Total de requests')),
+                ('total_input_tokens', models.IntegerField(default=0, verbose_name='Total tokens de entrada')),
+                ('total_output_tokens', models.IntegerField(default=0, verbose_name='Total tokens de salida')),
+                ('total_cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=10, verbose_name='Costo total USD')),
+                ('successful_analyses', models.IntegerField(default=0, verbose_name='Análisis exitosos')),
+                ('failed_analyses', models.IntegerField(default=0, verbose_name='Análisis fallidos')),
+                ('parse_failures', models.IntegerField(default=0, verbose_name='Respuestas no parseables')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.DateField(help_text='Primer día del mes', unique=True, verbose_name='Mes')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas Globales Mensuales de Gemini',
+                'verbose_name_plural': 'Estadísticas Globales Mensuales de Gemini',
+            },
+        ),
+        migrations.CreateModel(
+            name='GeminiUsageMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_requests', models.IntegerField(default=0, verbose_name='Total de requests')),
+                ('total_input_tokens', models.IntegerField(default=0, verbose_name='Total tokens de entrada')),
+                ('total_output_tokens', models.IntegerField(default=0, verbose_name='Total tokens de salida')),
+                ('total_cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=10, verbose_name='Costo total USD')),
+                ('successful_analyses', models.IntegerField(default=0, verbose_name='Análisis exitosos')),
+                ('failed_analyses', models.IntegerField(default=0, verbose_name='Análisis fallidos')),
+                ('parse_failures', models.IntegerField(default=0, verbose_name='Respuestas no parseables')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.DateField(help_text='Primer día del mes', verbose_name='Mes')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas Mensuales de Gemini',
+                'verbose_name_plural': 'Estadísticas Mensuales de Gemini',
+                'indexes': [models.Index(fields=['month'], name='ai_analysis_month_419f10_idx')],
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0009_usage_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisLatencyHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Inicio de la hora (UTC)', verbose_name='Hora')),
+                ('status', models.CharField(max_length=20, verbose_name='Estado')),
+                ('image_format', models.CharField(blank=True, max_length=10, verbose_name='Formato de imagen')),
+                ('bucket', models.PositiveSmallIntegerField(verbose_name='Bucket de latencia')),
+                ('count', models.IntegerField(default=0, verbose_name='Cantidad')),
+                ('total_cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=10, verbose_name='Costo total USD')),
+            ],
+            options={
+                'verbose_name': 'Histograma de Latencia',
+                'verbose_name_plural': 'Histogramas de Latencia',
+                'unique_together': {('hour', 'status', 'image_format', 'bucket')},
+            },
+        ),
+    ]
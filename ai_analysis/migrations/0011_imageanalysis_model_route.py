@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0010_analysis_latency_histogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='escalated',
+            field=models.BooleanField(default=False, help_text='Se repitió el análisis con un modelo más capaz', verbose_name='Escalado'),
+        ),
+        migrations.AddField(
+            model_name='imageanalysis',
+            name='model_route',
+            field=models.JSONField(blank=True, default=list, help_text='Modelo, latencia, tokens y costo de cada intento (de más barato a más capaz)', verbose_name='Ruta de modelos'),
+        ),
+    ]
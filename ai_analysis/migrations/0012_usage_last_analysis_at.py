@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:52
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import TruncDate, TruncMonth
+
+
+def fill_last_analysis_at(apps, schema_editor):
+    """Último análisis de cada fila diaria (por fecha UTC) y luego de los rollups"""
+    ImageAnalysis = apps.get_model('ai_analysis', 'ImageAnalysis')
+    GeminiUsageStats = apps.get_model('ai_analysis', 'GeminiUsageStats')
+
+    rows = ImageAnalysis.objects.exclude(status__in=['pending', 'processing']).annotate(
+        date=TruncDate('created_at', tzinfo=dt_timezone.utc)
+    ).values('user_id', 'date').annotate(last=Max('created_at')).order_by()
+    for row in rows.iterator():
+        GeminiUsageStats.objects.filter(user_id=row['user_id'], date=row['date']).update(
+            last_analysis_at=row['last']
+        )
+
+    daily = GeminiUsageStats.objects.annotate(month=TruncMonth('date')).order_by()
+    rollups = (
+        ('GeminiUsageMonthlyStats', {'user_id': OuterRef('user_id'), 'month': OuterRef('month')}),
+        ('GeminiGlobalDailyStats', {'date': OuterRef('date')}),
+        ('GeminiGlobalMonthlyStats', {'month': OuterRef('month')}),
+    )
+    for model_name, keys in rollups:
+        latest = daily.filter(**keys).values(*keys).annotate(last=Max('last_analysis_at')).values('last')
+        apps.get_model('ai_analysis', model_name).objects.update(last_analysis_at=Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0011_imageanalysis_model_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geminiglobaldailystats',
+            name='last_analysis_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último análisis'),
+        ),
+        migrations.AddField(
+            model_name='geminiglobalmonthlystats',
+            name='last_analysis_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último análisis'),
+        ),
+        migrations.AddField(
+            model_name='geminiusagemonthlystats',
+            name='last_analysis_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último análisis'),
+        ),
+        migrations.AddField(
+            model_name='geminiusagestats',
+            name='last_analysis_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último análisis'),
+        ),
+        migrations.RunPython(fill_last_analysis_at, migrations.RunPython.noop),
+    ]
@@ -13,6 +13,11 @@ class ImageAnalysis(models.Model):
         ('error', 'Error'),
     ]
     
+    ANALYSIS_MODE_CHOICES = [
+        ('single', 'Un alimento'),
+        ('plate', 'Plato con varios alimentos'),
+    ]
+    
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -22,10 +27,43 @@ class ImageAnalysis(models.Model):
     # Metadatos de la imagen (NO almacenamos la imagen)
     image_size = models.IntegerField('Tamaño de imagen (bytes)', null=True, blank=True)
     image_format = models.CharField('Formato de imagen', max_length=10, null=True, blank=True)
+    processed_image_size = models.IntegerField(
+        'Tamaño enviado a Gemini (bytes)',
+        null=True,
+        blank=True,
+        help_text='Tamaño después de orientar, reducir y re-codificar la imagen'
+    )
     
     # Request/Response de Gemini
+    gemini_model = models.CharField('Modelo de Gemini', max_length=50, blank=True)
+    model_route = models.JSONField(
+        'Ruta de modelos',
+        default=list,
+        blank=True,
+        help_text='Modelo, latencia, tokens y costo de cada intento (de más barato a más capaz)'
+    )
+    escalated = models.BooleanField(
+        'Escalado',
+        default=False,
+        help_text='Se repitió el análisis con un modelo más capaz'
+    )
     gemini_request_tokens = models.IntegerField('Tokens de request', null=True, blank=True)
     gemini_response_tokens = models.IntegerField('Tokens de response', null=True, blank=True)
+    gemini_cached_tokens = models.IntegerField(
+        'Tokens cacheados',
+        default=0,
+        help_text='Parte de los tokens de request servida desde context caching'
+    )
+    parse_failed = models.BooleanField(
+        'Respuesta no parseable',
+        default=False,
+        help_text='La respuesta de Gemini no era JSON válido según el esquema'
+    )
+    tokens_estimated = models.BooleanField(
+        'Tokens estimados',
+        default=False,
+        help_text='La respuesta no traía usage_metadata y se usaron los estimadores'
+    )
     gemini_cost_usd = models.DecimalField(
         'Costo en USD',
         max_digits=8,
@@ -33,6 +71,23 @@ class ImageAnalysis(models.Model):
         null=True,
         blank=True
     )
+    gemini_retries = models.IntegerField('Reintentos a Gemini', default=0)
+    
+    # Control de admisión global (cola compartida entre procesos)
+    admission_queue_depth = models.IntegerField(
+        'Posición en cola de Gemini',
+        null=True,
+        blank=True,
+        help_text='Requests esperando delante al momento de encolarse'
+    )
+    admission_wait_seconds = models.FloatField('Espera en cola de Gemini (s)', null=True, blank=True)
+    
+    analysis_mode = models.CharField(
+        'Modo de análisis',
+        max_length=10,
+        choices=ANALYSIS_MODE_CHOICES,
+        default='single'
+    )
     
     # Status del análisis
     status = models.CharField(
@@ -48,6 +103,10 @@ class ImageAnalysis(models.Model):
     
     # Tiempo de procesamiento
     processing_time_seconds = models.FloatField('Tiempo de procesamiento (s)', null=True, blank=True)
+    preprocessing_time_seconds = models.FloatField('Tiempo de preprocesamiento (s)', null=True, blank=True)
+    
+    # Resultado servido desde la cache de imágenes repetidas (sin llamar a Gemini)
+    cache_hit = models.BooleanField('Servido desde cache', default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -66,16 +125,8 @@ class ImageAnalysis(models.Model):
         ]
 
 
-class GeminiUsageStats(models.Model):
-    """Estadísticas de uso de Gemini por usuario"""
-    user = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        verbose_name='Usuario'
-    )
-    date = models.DateField('Fecha')
-    
-    # Estadísticas del día
+class UsageCounters(models.Model):
+    """Contadores de uso de Gemini compartidos por las estadísticas diarias y los rollups"""
     total_requests = models.IntegerField('Total de requests', default=0)
     total_input_tokens = models.IntegerField('Total tokens de entrada', default=0)
     total_output_tokens = models.IntegerField('Total tokens de salida', default=0)
@@ -89,13 +140,13 @@ class GeminiUsageStats(models.Model):
     # Análisis exitosos vs fallidos
     successful_analyses = models.IntegerField('Análisis exitosos', default=0)
     failed_analyses = models.IntegerField('Análisis fallidos', default=0)
+    parse_failures = models.IntegerField('Respuestas no parseables', default=0)
+    # No sale de updated_at: los rollups se reescriben con bulk_create y flushes
+    last_analysis_at = models.DateTimeField('Último análisis', null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    def __str__(self):
-        return f"Stats de {self.user.email} - {self.date}"
-    
     @property
     def success_rate(self):
         """Calcular tasa de éxito"""
@@ -111,6 +162,29 @@ class GeminiUsageStats(models.Model):
             return 0
         return round(float(self.total_cost_usd) / self.total_requests, 6)
     
+    @property
+    def parse_failure_rate(self):
+        """Porcentaje de requests cuya respuesta no se pudo parsear"""
+        if self.total_requests == 0:
+            return 0
+        return round((self.parse_failures / self.total_requests) * 100, 2)
+    
+    class Meta:
+        abstract = True
+
+
+class GeminiUsageStats(UsageCounters):
+    """Estadísticas de uso de Gemini por usuario"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Usuario'
+    )
+    date = models.DateField('Fecha')
+    
+    def __str__(self):
+        return f"Stats de {self.user.email} - {self.date}"
+    
     class Meta:
         db_table = 'ai_analysis_geminiusagestats'
         verbose_name = 'Estadísticas de Uso de Gemini'
@@ -119,4 +193,78 @@ class GeminiUsageStats(models.Model):
         indexes = [
             models.Index(fields=['user', 'date']),
             models.Index(fields=['date']),
-        ]
\ No newline at end of file
+        ]
+
+
+class GeminiUsageMonthlyStats(UsageCounters):
+    """Rollup mensual de GeminiUsageStats por usuario"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Usuario'
+    )
+    month = models.DateField('Mes', help_text='Primer día del mes')
+    
+    def __str__(self):
+        return f"Stats de {self.user.email} - {self.month:%Y-%m}"
+    
+    class Meta:
+        verbose_name = 'Estadísticas Mensuales de Gemini'
+        verbose_name_plural = 'Estadísticas Mensuales de Gemini'
+        unique_together = ['user', 'month']
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+
+
+class GeminiGlobalDailyStats(UsageCounters):
+    """Rollup diario de GeminiUsageStats de todos los usuarios"""
+    date = models.DateField('Fecha', unique=True)
+    
+    def __str__(self):
+        return f"Stats globales - {self.date}"
+    
+    class Meta:
+        verbose_name = 'Estadísticas Globales Diarias de Gemini'
+        verbose_name_plural = 'Estadísticas Globales Diarias de Gemini'
+
+
+class GeminiGlobalMonthlyStats(UsageCounters):
+    """Rollup mensual de GeminiUsageStats de todos los usuarios"""
+    month = models.DateField('Mes', unique=True, help_text='Primer día del mes')
+    
+    def __str__(self):
+        return f"Stats globales - {self.month:%Y-%m}"
+    
+    class Meta:
+        verbose_name = 'Estadísticas Globales Mensuales de Gemini'
+        verbose_name_plural = 'Estadísticas Globales Mensuales de Gemini'
+
+
+class AnalysisLatencyHistogram(models.Model):
+    """
+    Histograma de processing_time_seconds de los análisis terminados.
+
+    Una fila por hora, estado, formato de imagen y bucket de latencia (ver
+    latency.LATENCY_BUCKETS). Los percentiles se calculan sumando unas pocas
+    filas en vez de recorrer los ImageAnalysis.
+    """
+    hour = models.DateTimeField('Hora', help_text='Inicio de la hora (UTC)')
+    status = models.CharField('Estado', max_length=20)
+    image_format = models.CharField('Formato de imagen', max_length=10, blank=True)
+    bucket = models.PositiveSmallIntegerField('Bucket de latencia')
+    count = models.IntegerField('Cantidad', default=0)
+    total_cost_usd = models.DecimalField(
+        'Costo total USD',
+        max_digits=10,
+        decimal_places=6,
+        default=0
+    )
+    
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}h {self.status} {self.image_format} #{self.bucket}: {self.count}"
+    
+    class Meta:
+        verbose_name = 'Histograma de Latencia'
+        verbose_name_plural = 'Histogramas de Latencia'
+        unique_together = ['hour', 'status', 'image_format', 'bucket']
@@ -0,0 +1,26 @@
+# ai_analysis/parsers.py
+from rest_framework.parsers import DataAndFiles, FileUploadParser
+
+
+class RawImageUploadParser(FileUploadParser):
+    """
+    Parser para imágenes enviadas como cuerpo binario (application/octet-stream
+    o image/*).
+
+    Igual que FileUploadParser, pasa el cuerpo por los upload handlers de
+    Django (memoria o archivo temporal según el tamaño) sin cargarlo entero en
+    request.body, pero no exige Content-Disposition y deja el archivo en 'image'.
+    """
+    media_type = 'application/octet-stream'
+
+    def get_filename(self, stream, media_type, parser_context):
+        return super().get_filename(stream, media_type, parser_context) or 'upload'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        return DataAndFiles({}, {'image': result.files['file']})
+
+
+class ImageBodyUploadParser(RawImageUploadParser):
+    """Mismo parser para clientes que envían Content-Type: image/jpeg, image/png, etc."""
+    media_type = 'image/*'
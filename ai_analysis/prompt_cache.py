@@ -0,0 +1,88 @@
+# ai_analysis/prompt_cache.py
+import logging
+import threading
+import time
+from datetime import timedelta
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import caching
+
+logger = logging.getLogger(__name__)
+
+
+class PromptCache:
+    """
+    Handles de CachedContent de Gemini para los prompts fijos de análisis.
+
+    Hay un cache por (modelo, modo). Se crea la primera vez que se usa, se le
+    extiende el TTL cuando le quedan menos de `refresh_margin` segundos y se
+    vuelve a crear si Gemini ya lo borró. Si no se puede crear (por ejemplo,
+    el prompt no llega al mínimo de tokens que exige el modelo, o el modelo
+    no admite caching) get_model devuelve None durante `retry_after` segundos
+    y el cliente usa el prompt como system_instruction.
+    """
+
+    def __init__(self, ttl=3600, refresh_margin=300, retry_after=600):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self._entries = {}
+        self._failed_until = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name, mode, prompt):
+        """GenerativeModel ligado al cache del prompt, o None si no hay cache"""
+        key = (model_name, mode)
+        with self._lock:
+            now = time.monotonic()
+            if self._failed_until.get(key, 0) > now:
+                return None
+
+            entry = self._entries.get(key)
+            try:
+                if entry is None:
+                    entry = self._entries[key] = self._create(model_name, prompt)
+                elif entry['expires_at'] - now < self.refresh_margin:
+                    self._refresh(key, entry, model_name, prompt)
+                    entry = self._entries[key]
+            except Exception:
+                logger.warning(
+                    'No se pudo usar context caching para %s (%s); se usa system_instruction',
+                    model_name, mode, exc_info=True
+                )
+                self._entries.pop(key, None)
+                self._failed_until[key] = now + self.retry_after
+                return None
+
+            return entry['model']
+
+    def stats(self):
+        """Caches activos y segundos que les quedan"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {'model': model_name, 'mode': mode, 'name': entry['cached'].name,
+                 'expires_in': round(entry['expires_at'] - now)}
+                for (model_name, mode), entry in self._entries.items()
+            ]
+
+    def _create(self, model_name, prompt):
+        cached = caching.CachedContent.create(
+            model=model_name,
+            display_name=f'nutritrack-{model_name}',
+            system_instruction=prompt,
+            ttl=timedelta(seconds=self.ttl)
+        )
+        return {
+            'cached': cached,
+            'model': genai.GenerativeModel.from_cached_content(cached),
+            'expires_at': time.monotonic() + self.ttl,
+        }
+
+    def _refresh(self, key, entry, model_name, prompt):
+        try:
+            entry['cached'].update(ttl=timedelta(seconds=self.ttl))
+            entry['expires_at'] = time.monotonic() + self.ttl
+        except google_exceptions.NotFound:
+            # Gemini ya lo borró: crear uno nuevo
+            self._entries[key] = self._create(model_name, prompt)
@@ -0,0 +1,27 @@
+# ai_analysis/renderers.py
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event, data):
+    """Formatea un evento de Server-Sent Events con datos JSON"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite que los clientes SSE (Accept: text/event-stream) pasen la
+    negociación de contenido de DRF.
+
+    El stream en sí lo arma la vista; este renderer sólo se usa para las
+    respuestas normales (errores de validación, 401...), que se envían como
+    un único evento 'error'.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data).encode(self.charset)
@@ -0,0 +1,130 @@
+# ai_analysis/resilience.py
+import random
+import threading
+import time
+from google.api_core import exceptions as google_exceptions
+
+# Errores de Gemini que suelen resolverse solos al reintentar
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.Aborted,
+    google_exceptions.Unknown,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Se rechazó la llamada porque el circuit breaker está abierto"""
+
+
+def is_transient_error(error) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def backoff_delay(attempt, base_delay, max_delay) -> float:
+    """Backoff exponencial con jitter completo: uniforme entre 0 y base * 2^attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simple para las llamadas a Gemini.
+
+    - closed: las llamadas pasan; tras `failure_threshold` fallos transitorios
+      seguidos se abre.
+    - open: las llamadas se rechazan de inmediato durante `recovery_timeout`
+      segundos.
+    - half_open: se deja pasar una llamada de prueba; si funciona se cierra,
+      si falla vuelve a abrirse.
+
+    El estado es por proceso (cada worker de gunicorn tiene el suyo).
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+        # Contadores para monitoreo
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_retries = 0
+        self.total_rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.total_rejected += 1
+            return False
+
+    def seconds_until_retry(self) -> float:
+        """Segundos hasta que el breaker deje pasar una llamada de prueba"""
+        with self._lock:
+            if self._current_state() != 'open':
+                return 0
+            return max(0, self._opened_at + self.recovery_timeout - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.total_calls += 1
+            self._state = 'closed'
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.total_calls += 1
+            self.total_failures += 1
+            self._consecutive_failures += 1
+            if self._state == 'half_open' or self._consecutive_failures >= self.failure_threshold:
+                if self._state != 'open':
+                    self.times_opened += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_retry(self):
+        with self._lock:
+            self.total_retries += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'total_calls': self.total_calls,
+                'total_failures': self.total_failures,
+                'total_retries': self.total_retries,
+                'total_rejected': self.total_rejected,
+                'times_opened': self.times_opened,
+            }
+
+    def _current_state(self):
+        if self._state == 'open' and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = 'half_open'
+            self._trial_in_flight = False
+        return self._state
@@ -0,0 +1,124 @@
+# ai_analysis/schemas.py
+"""
+Esquemas de respuesta de Gemini.
+
+Los mismos dicts se envían como response_schema (Gemini sólo puede responder
+JSON con esa forma) y se compilan una vez en validadores para revisar la
+respuesta en una sola pasada.
+"""
+
+
+class SchemaValidationError(ValueError):
+    """La respuesta de Gemini no coincide con el esquema esperado"""
+
+
+NUTRITION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'calories': {'type': 'number'},
+        'protein_g': {'type': 'number'},
+        'carbs_g': {'type': 'number'},
+        'fat_g': {'type': 'number'},
+    },
+    'required': ['calories', 'protein_g', 'carbs_g', 'fat_g'],
+}
+
+CONFIDENCE_SCHEMA = {'type': 'string', 'enum': ['alto', 'medio', 'bajo']}
+
+FOOD_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'food_name': {'type': 'string'},
+        'serving_size': {'type': 'string'},
+        'confidence': CONFIDENCE_SCHEMA,
+        'nutrition_per_serving': NUTRITION_SCHEMA,
+        'nutrition_per_100g': NUTRITION_SCHEMA,
+        'error': {'type': 'string'},
+    },
+    'required': ['food_name', 'confidence'],
+}
+
+PLATE_ITEM_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'food_name': {'type': 'string'},
+        'serving_size': {'type': 'string'},
+        'portion_g': {'type': 'number'},
+        'confidence': CONFIDENCE_SCHEMA,
+        'nutrition_per_serving': NUTRITION_SCHEMA,
+        'nutrition_per_100g': NUTRITION_SCHEMA,
+    },
+    'required': ['food_name', 'confidence', 'nutrition_per_serving', 'nutrition_per_100g'],
+}
+
+PLATE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'items': {'type': 'array', 'items': PLATE_ITEM_SCHEMA},
+        'error': {'type': 'string'},
+    },
+    'required': ['items'],
+}
+
+RESPONSE_SCHEMAS = {
+    'single': FOOD_SCHEMA,
+    'plate': PLATE_SCHEMA,
+}
+
+_TYPE_CHECKS = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'boolean': lambda value: isinstance(value, bool),
+}
+
+
+def compile_schema(schema, path='$'):
+    """
+    Convierte un esquema en una función validate(value) que lanza
+    SchemaValidationError con la ruta del primer error.
+
+    Soporta el subconjunto de OpenAPI que acepta Gemini: type, properties,
+    required, items, enum y nullable. Las claves extra del objeto se ignoran.
+    """
+    type_check = _TYPE_CHECKS[schema['type']]
+    type_name = schema['type']
+    nullable = schema.get('nullable', False)
+    enum = frozenset(schema['enum']) if 'enum' in schema else None
+
+    children = {}
+    required = ()
+    item_validator = None
+    if type_name == 'object':
+        children = {
+            name: compile_schema(child, f'{path}.{name}')
+            for name, child in schema.get('properties', {}).items()
+        }
+        required = tuple(schema.get('required', ()))
+    elif type_name == 'array' and 'items' in schema:
+        item_validator = compile_schema(schema['items'], f'{path}[]')
+
+    def validate(value):
+        if value is None and nullable:
+            return
+        if not type_check(value):
+            raise SchemaValidationError(f'{path}: se esperaba {type_name}')
+        if enum is not None and value not in enum:
+            raise SchemaValidationError(f'{path}: valor no permitido {value!r}')
+        if children:
+            for name in required:
+                if name not in value:
+                    raise SchemaValidationError(f'{path}: falta {name}')
+            for name, child in children.items():
+                if name in value:
+                    child(value[name])
+        if item_validator is not None:
+            for item in value:
+                item_validator(item)
+
+    return validate
+
+
+VALIDATORS = {mode: compile_schema(schema) for mode, schema in RESPONSE_SCHEMAS.items()}
@@ -1,17 +1,38 @@
+import base64
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import ImageAnalysis, GeminiUsageStats
+from foods.serializers import ScannedFoodSerializer
+from tracking.models import LoggedFoodItem
+from .models import (
+    ImageAnalysis,
+    GeminiUsageStats,
+    GeminiUsageMonthlyStats,
+    GeminiGlobalDailyStats,
+    GeminiGlobalMonthlyStats,
+)
+from .image_processing import detect_image_format
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
 
 
 class ImageAnalysisSerializer(serializers.ModelSerializer):
     """Serializer para ImageAnalysis"""
     user_email = serializers.CharField(source='user.email', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
+    scanned_foods = ScannedFoodSerializer(many=True, read_only=True)
     
     class Meta:
         model = ImageAnalysis
-        fields = ('id', 'user_email', 'image_size', 'image_format', 'status', 'status_display',
-                 'gemini_request_tokens', 'gemini_response_tokens', 'gemini_cost_usd',
-                 'error_message', 'processing_time_seconds', 'created_at', 'updated_at')
+        fields = ('id', 'user_email', 'image_size', 'processed_image_size', 'image_format',
+                 'analysis_mode', 'status', 'status_display',
+                 'gemini_model', 'model_route', 'escalated',
+                 'gemini_request_tokens', 'gemini_response_tokens',
+                 'gemini_cached_tokens', 'tokens_estimated', 'parse_failed', 'gemini_cost_usd',
+                 'gemini_retries', 'admission_queue_depth', 'admission_wait_seconds',
+                 'error_message', 'processing_time_seconds', 'preprocessing_time_seconds',
+                 'cache_hit', 'scanned_foods',
+                 'created_at', 'updated_at')
         read_only_fields = ('id', 'user_email', 'created_at', 'updated_at')
 
 
@@ -25,18 +46,75 @@ class ImageAnalysisCreateSerializer(serializers.Serializer):
         default='jpeg',
         help_text="Formato de la imagen: jpeg, png, etc."
     )
+    async_mode = serializers.BooleanField(
+        default=False,
+        help_text="Si es true, responde 202 de inmediato y el análisis se procesa en segundo plano"
+    )
     
     def validate_image_data(self, value):
-        """Validar que la imagen base64 sea válida"""
+        """Validar que la imagen base64 sea válida y devolverla ya decodificada"""
         try:
-            import base64
             decoded = base64.b64decode(value)
-            if len(decoded) == 0:
-                raise serializers.ValidationError("Imagen base64 vacía")
-            if len(decoded) > 10 * 1024 * 1024:  # 10MB máximo
-                raise serializers.ValidationError("Imagen demasiado grande (máximo 10MB)")
         except Exception as e:
             raise serializers.ValidationError(f"Imagen base64 inválida: {str(e)}")
+        if len(decoded) == 0:
+            raise serializers.ValidationError("Imagen base64 vacía")
+        if len(decoded) > MAX_IMAGE_SIZE:
+            raise serializers.ValidationError("Imagen demasiado grande (máximo 10MB)")
+        return decoded
+    
+    def validate(self, data):
+        # El formato real de los bytes manda sobre el declarado por el cliente
+        data['image_format'] = detect_image_format(data['image_data']) or data['image_format']
+        return data
+
+
+class ImageUploadSerializer(serializers.Serializer):
+    """Serializer para analizar una imagen subida como archivo (multipart o binario)"""
+    image = serializers.FileField(
+        allow_empty_file=False,
+        help_text="Archivo de imagen (campo multipart 'image' o cuerpo binario)"
+    )
+    async_mode = serializers.BooleanField(default=False)
+    
+    def validate_image(self, value):
+        """Validar tamaño y formato sin leer más que la cabecera"""
+        if value.size > MAX_IMAGE_SIZE:
+            raise serializers.ValidationError("Imagen demasiado grande (máximo 10MB)")
+        
+        value.seek(0)
+        header = value.read(12)
+        value.seek(0)
+        if detect_image_format(header) is None:
+            raise serializers.ValidationError("Formato de imagen no soportado")
+        return value
+    
+    def validate(self, data):
+        # Única lectura completa del archivo; estos bytes llegan tal cual a Gemini
+        data['image_data'] = data['image'].read()
+        data['image_format'] = detect_image_format(data['image_data'])
+        return data
+
+
+class PlateAnalysisSerializer(ImageAnalysisCreateSerializer):
+    """Serializer para analizar un plato con varios alimentos"""
+    async_mode = None
+    log_meal = serializers.BooleanField(
+        default=False,
+        help_text="Si es true, registra cada alimento del plato en el DailyLog de 'date'"
+    )
+    date = serializers.DateField(default=timezone.localdate)
+    meal_type = serializers.ChoiceField(choices=LoggedFoodItem.MEAL_CHOICES, default='other')
+
+
+class ImageAnalysisBatchSerializer(serializers.Serializer):
+    """Serializer para analizar varias imágenes en un solo request"""
+    images = ImageAnalysisCreateSerializer(many=True, allow_empty=False)
+    
+    def validate_images(self, value):
+        max_images = getattr(settings, 'AI_BATCH_MAX_IMAGES', 10)
+        if len(value) > max_images:
+            raise serializers.ValidationError(f"Máximo {max_images} imágenes por request")
         return value
 
 
@@ -45,15 +123,53 @@ class GeminiUsageStatsSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     success_rate = serializers.ReadOnlyField()
     average_cost_per_request = serializers.ReadOnlyField()
+    parse_failure_rate = serializers.ReadOnlyField()
     
     class Meta:
         model = GeminiUsageStats
         fields = ('id', 'user_email', 'date', 'total_requests', 'total_input_tokens',
                  'total_output_tokens', 'total_cost_usd', 'successful_analyses',
                  'failed_analyses', 'success_rate', 'average_cost_per_request',
+                 'parse_failures', 'parse_failure_rate', 'last_analysis_at',
                  'created_at', 'updated_at')
         read_only_fields = ('id', 'user_email', 'success_rate', 'average_cost_per_request',
-                          'created_at', 'updated_at')
+                          'parse_failure_rate', 'last_analysis_at', 'created_at', 'updated_at')
+
+
+USAGE_COUNTER_FIELDS = ('total_requests', 'total_input_tokens', 'total_output_tokens',
+                        'total_cost_usd', 'successful_analyses', 'failed_analyses',
+                        'success_rate', 'average_cost_per_request', 'parse_failures',
+                        'parse_failure_rate', 'last_analysis_at')
+
+
+class GeminiUsageMonthlyStatsSerializer(serializers.ModelSerializer):
+    """Serializer para el rollup mensual por usuario"""
+    success_rate = serializers.ReadOnlyField()
+    average_cost_per_request = serializers.ReadOnlyField()
+    parse_failure_rate = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = GeminiUsageMonthlyStats
+        fields = ('month',) + USAGE_COUNTER_FIELDS
+        read_only_fields = fields
+
+
+class GeminiGlobalDailyStatsSerializer(GeminiUsageMonthlyStatsSerializer):
+    """Serializer para el rollup diario global"""
+    
+    class Meta:
+        model = GeminiGlobalDailyStats
+        fields = ('date',) + USAGE_COUNTER_FIELDS
+        read_only_fields = fields
+
+
+class GeminiGlobalMonthlyStatsSerializer(GeminiUsageMonthlyStatsSerializer):
+    """Serializer para el rollup mensual global"""
+    
+    class Meta:
+        model = GeminiGlobalMonthlyStats
+        fields = ('month',) + USAGE_COUNTER_FIELDS
+        read_only_fields = fields
 
 
 class UserStatsSerializer(serializers.Serializer):
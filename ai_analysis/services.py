@@ -0,0 +1,707 @@
+# ai_analysis/services.py
+import json
+import queue
+import re
+import threading
+import time
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+from foods.models import ScannedFood
+from foods.serializers import ScannedFoodCreateSerializer
+from tracking.models import DailyLog, LoggedFoodItem
+from .models import GeminiUsageMonthlyStats, ImageAnalysis
+from .admission import AdmissionRejected, async_gemini_slot, gemini_slot
+from .gemini_client import get_gemini_client
+from .image_cache import get_image_cache
+from .image_processing import prepare_image
+from .usage_stats import record_latency, record_usage
+
+# "food_name" completo dentro del JSON parcial que va llegando de Gemini
+PARTIAL_FOOD_NAME_RE = re.compile(r'"food_name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def run_analysis(analysis, image_bytes):
+    """
+    Ejecuta el análisis de Gemini sobre un ImageAnalysis ya creado.
+
+    `image_bytes` es la imagen ya decodificada; se decodifica una sola vez en
+    el serializer y el mismo buffer recorre todo el pipeline.
+
+    Actualiza el registro (status, tokens, costo, tiempos), crea el ScannedFood
+    si corresponde y actualiza las estadísticas de uso. Se usa tanto desde la
+    vista síncrona como desde los workers en segundo plano.
+
+    Devuelve un dict con 'outcome' ('created', 'invalid_nutrition',
+    'not_identified', 'unavailable' o 'error') y los datos necesarios para
+    armar la respuesta.
+    """
+    try:
+        ai_result = get_ai_result(image_bytes, analysis.image_format, analysis.user_id)
+        return save_analysis_result(analysis, ai_result)
+    except Exception as e:
+        return save_analysis_error(analysis, e)
+
+
+async def arun_analysis(analysis, image_bytes):
+    """
+    Versión async de run_analysis para el endpoint ASGI.
+
+    La espera de cupo y la llamada a Gemini no ocupan un hilo; el
+    preprocesado corre en un hilo aparte y las escrituras en la base de datos
+    pasan por sync_to_async, igual que el ORM async de Django.
+    """
+    try:
+        ai_result = await aget_ai_result(image_bytes, analysis.image_format, analysis.user_id)
+        return await sync_to_async(save_analysis_result)(analysis, ai_result)
+    except Exception as e:
+        return await sync_to_async(save_analysis_error)(analysis, e)
+
+
+def save_analysis_result(analysis, ai_result):
+    """Guarda el resultado de IA en el análisis, crea el ScannedFood y suma estadísticas"""
+    user = analysis.user
+    result, scanned_serializer = apply_ai_result(analysis, ai_result)
+
+    # El ScannedFood y el status 'completed' se hacen visibles juntos para
+    # que quien consulta el análisis nunca vea uno sin el otro
+    with transaction.atomic():
+        analysis.save()
+        if scanned_serializer is not None:
+            result['scanned_food'] = scanned_serializer.save(user=user, image_analysis=analysis)
+            result['scanned_food_data'] = scanned_serializer.data
+
+    update_usage_stats(user, analysis, success=analysis.status == 'completed')
+    return result
+
+
+def save_analysis_error(analysis, error):
+    """Marca el análisis con error inesperado y lo cuenta como fallido"""
+    analysis.status = 'error'
+    analysis.error_message = str(error)
+    analysis.save()
+
+    update_usage_stats(analysis.user, analysis, success=False)
+
+    return {
+        'outcome': 'error',
+        'error': f'Error inesperado: {str(error)}'
+    }
+
+
+def run_batch_analysis(user, images):
+    """
+    Analiza varias imágenes en paralelo y guarda todos los registros en bloque.
+
+    Las llamadas a Gemini corren en hilos (máximo AI_BATCH_MAX_CONCURRENCY a la
+    vez); la base de datos sólo se toca al final, con un bulk_create para los
+    ImageAnalysis, otro para los ScannedFood y una sola actualización de
+    estadísticas. Devuelve una lista de (analysis, result) en el orden recibido.
+    """
+    concurrency = min(getattr(settings, 'AI_BATCH_MAX_CONCURRENCY', 4), len(images))
+
+    def analyze(image):
+        try:
+            return get_ai_result(image['image_data'], image['image_format'], user.id)
+        except Exception as e:
+            return {'success': False, 'error': f'Error inesperado: {str(e)}'}
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-batch') as pool:
+        ai_results = list(pool.map(analyze, images))
+
+    items = []
+    for image, ai_result in zip(images, ai_results):
+        analysis = ImageAnalysis(
+            user=user,
+            image_size=len(image['image_data']),
+            image_format=image['image_format']
+        )
+        result, scanned_serializer = apply_ai_result(analysis, ai_result)
+        items.append((analysis, result, scanned_serializer))
+
+    with transaction.atomic():
+        ImageAnalysis.objects.bulk_create([analysis for analysis, _, _ in items])
+
+        scanned_foods = []
+        for analysis, result, scanned_serializer in items:
+            if scanned_serializer is not None:
+                scanned_food = ScannedFood(
+                    user=user,
+                    image_analysis=analysis,
+                    **scanned_serializer.validated_data
+                )
+                scanned_food.set_search_key()
+                result['scanned_food'] = scanned_food
+                scanned_foods.append(scanned_food)
+        ScannedFood.objects.bulk_create(scanned_foods)
+
+    analyses = [analysis for analysis, _, _ in items]
+    successful = sum(1 for analysis in analyses if analysis.status == 'completed')
+    increment_usage_stats(
+        user,
+        requests=len(analyses),
+        input_tokens=sum(analysis.gemini_request_tokens or 0 for analysis in analyses),
+        output_tokens=sum(analysis.gemini_response_tokens or 0 for analysis in analyses),
+        cost_usd=sum((analysis.gemini_cost_usd or Decimal('0') for analysis in analyses), Decimal('0')),
+        successful=successful,
+        failed=len(analyses) - successful,
+        parse_failures=sum(1 for analysis in analyses if analysis.parse_failed),
+        analyzed_at=max(analysis.created_at for analysis in analyses)
+    )
+    record_latency(analyses)
+
+    return [(analysis, result) for analysis, result, _ in items]
+
+
+def run_plate_analysis(analysis, image_bytes, log_date=None, meal_type='other'):
+    """
+    Analiza un plato con varios alimentos en una sola llamada a Gemini.
+
+    Crea un ScannedFood por cada alimento identificado y, si se indica
+    `log_date`, también los LoggedFoodItem de ese día. Todo se guarda en una
+    sola transacción y los totales del DailyLog se recalculan una vez.
+
+    Devuelve un dict con 'outcome' ('created', 'not_identified' o 'error'),
+    'scanned_foods', 'logged_items' y 'daily_log'.
+    """
+    user = analysis.user
+
+    try:
+        start_time = time.time()
+        prepared = prepare_image(image_bytes, analysis.image_format)
+        ai_result, admission = call_gemini(user.id, prepared, mode='plate')
+
+        analysis.processing_time_seconds = time.time() - start_time
+        analysis.processed_image_size = len(prepared['data'])
+        analysis.preprocessing_time_seconds = prepared['preprocessing_time']
+        analysis.gemini_retries = ai_result.get('retries', 0)
+        analysis.admission_queue_depth = admission.get('queue_depth')
+        analysis.admission_wait_seconds = admission.get('wait_seconds')
+
+        if not ai_result['success']:
+            analysis.status = 'error'
+            analysis.error_message = ai_result.get('error', 'Error en el análisis de IA')
+            analysis.save()
+            update_usage_stats(user, analysis, success=False)
+            if ai_result.get('unavailable'):
+                return {
+                    'outcome': 'unavailable',
+                    'error': 'Servicio de IA no disponible temporalmente, intenta nuevamente en unos segundos'
+                }
+            return {'outcome': 'error', 'error': 'Error en el análisis de la imagen'}
+
+        analysis.raw_ai_response = ai_result.get('raw_response')
+        apply_usage(analysis, ai_result)
+
+        food_data = ai_result['food_data']
+        scanned_serializers = []
+        for item in food_data.get('items') or []:
+            if not is_food_identified(item):
+                continue
+            scanned_serializer = ScannedFoodCreateSerializer(
+                data=build_scanned_food_data(item, ai_result)
+            )
+            if scanned_serializer.is_valid():
+                scanned_serializers.append((item, scanned_serializer))
+
+        if not scanned_serializers:
+            analysis.status = 'failed'
+            analysis.error_message = food_data.get('error', 'No se pudo identificar alimentos en el plato')
+            analysis.save()
+            update_usage_stats(user, analysis, success=False)
+            return {'outcome': 'not_identified', 'food_data': food_data}
+
+        analysis.status = 'completed'
+        daily_log = None
+        logged_items = []
+
+        with transaction.atomic():
+            analysis.save()
+            scanned_foods = [
+                ScannedFood(user=user, image_analysis=analysis, **scanned_serializer.validated_data)
+                for _, scanned_serializer in scanned_serializers
+            ]
+            for scanned_food in scanned_foods:
+                scanned_food.set_search_key()
+            ScannedFood.objects.bulk_create(scanned_foods)
+
+            if log_date is not None:
+                daily_log, _ = DailyLog.objects.get_or_create(user=user, date=log_date)
+                # bulk_create no llama a LoggedFoodItem.save(), así que los
+                # totales del día se recalculan una sola vez al final
+                logged_items = LoggedFoodItem.objects.bulk_create([
+                    build_logged_food_item(daily_log, scanned_food, item, meal_type)
+                    for (item, _), scanned_food in zip(scanned_serializers, scanned_foods)
+                ])
+                daily_log.calculate_totals()
+
+        update_usage_stats(user, analysis, success=True)
+
+        return {
+            'outcome': 'created',
+            'food_data': food_data,
+            'scanned_foods': scanned_foods,
+            'logged_items': logged_items,
+            'daily_log': daily_log
+        }
+
+    except Exception as e:
+        analysis.status = 'error'
+        analysis.error_message = str(e)
+        analysis.save()
+
+        update_usage_stats(user, analysis, success=False)
+
+        return {
+            'outcome': 'error',
+            'error': f'Error inesperado: {str(e)}'
+        }
+
+
+def build_logged_food_item(daily_log, scanned_food, item, meal_type):
+    """LoggedFoodItem (sin guardar) para la porción estimada de un alimento del plato"""
+    portion_g = item.get('portion_g')
+    if scanned_food.calories_per_serving is not None:
+        # nutrition_per_serving ya corresponde a la porción visible
+        factor = 1
+        calories = scanned_food.calories_per_serving
+        protein = scanned_food.protein_per_serving
+        carbs = scanned_food.carbs_per_serving
+        fat = scanned_food.fat_per_serving
+    else:
+        factor = (portion_g or 100) / 100
+        calories = scanned_food.calories_per_100g
+        protein = scanned_food.protein_per_100g
+        carbs = scanned_food.carbs_per_100g
+        fat = scanned_food.fat_per_100g
+
+    if portion_g:
+        quantity, unit = portion_g, 'g'
+    else:
+        quantity, unit = 1, 'porción'
+
+    return LoggedFoodItem(
+        daily_log=daily_log,
+        scanned_food=scanned_food,
+        name=scanned_food.ai_identified_name,
+        quantity=quantity,
+        unit=unit,
+        calories=(calories or 0) * factor,
+        protein=(protein or 0) * factor,
+        carbs=(carbs or 0) * factor,
+        fat=(fat or 0) * factor,
+        meal_type=meal_type
+    )
+
+
+def get_ai_result(image_bytes, image_format, user_id=None):
+    """
+    Obtiene el resultado de IA para una imagen sin tocar la base de datos.
+
+    Preprocesa la imagen, consulta la cache de imágenes repetidas y, si no hay
+    hit, espera un cupo de admisión y llama a Gemini. Además de las claves de
+    GeminiClient.analyze_food_image el resultado incluye 'cache_hit',
+    'processed_image_size', 'preprocessing_time' y los datos de la cola
+    ('admission_queue_depth', 'admission_wait').
+    """
+    start_time = time.time()
+
+    # Orientar, reducir y re-codificar la imagen antes de enviarla
+    prepared = prepare_image(image_bytes, image_format)
+
+    # Buscar primero en la cache de imágenes repetidas
+    image_cache = get_image_cache()
+    fingerprint = prepared['image_fingerprint'] if image_cache else None
+    cached = image_cache.get(fingerprint) if fingerprint is not None else None
+
+    admission = {}
+    if cached:
+        ai_result = cached_ai_result(cached)
+    else:
+        # Usar Gemini real
+        ai_result, admission = call_gemini(user_id, prepared)
+        cache_ai_result(fingerprint, ai_result)
+
+    return finish_ai_result(ai_result, prepared, bool(cached), admission, start_time)
+
+
+async def aget_ai_result(image_bytes, image_format, user_id=None):
+    """Versión async de get_ai_result (mismo resultado)"""
+    start_time = time.time()
+
+    # prepare_image espera al pool de procesos: que espere un hilo, no el loop
+    prepared = await sync_to_async(prepare_image, thread_sensitive=False)(image_bytes, image_format)
+
+    image_cache = get_image_cache()
+    fingerprint = prepared['image_fingerprint'] if image_cache else None
+    cached = image_cache.get(fingerprint) if fingerprint is not None else None
+
+    admission = {}
+    if cached:
+        ai_result = cached_ai_result(cached)
+    else:
+        ai_result, admission = await acall_gemini(user_id, prepared)
+        cache_ai_result(fingerprint, ai_result)
+
+    return finish_ai_result(ai_result, prepared, bool(cached), admission, start_time)
+
+
+def cached_ai_result(cached):
+    """Resultado de IA equivalente a una entrada de la cache de imágenes"""
+    food_data, raw_response = cached
+    return {
+        'success': True,
+        'food_data': food_data,
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cost_usd': 0,
+        'raw_response': raw_response
+    }
+
+
+def cache_ai_result(fingerprint, ai_result):
+    """Guarda en la cache de imágenes un resultado de Gemini con alimento identificado"""
+    image_cache = get_image_cache()
+    if (image_cache and fingerprint is not None and ai_result['success'] and
+            is_food_identified(ai_result['food_data'])):
+        image_cache.set(fingerprint, ai_result['food_data'], ai_result.get('raw_response'))
+
+
+def finish_ai_result(ai_result, prepared, cache_hit, admission, start_time):
+    """Agrega al resultado de IA los datos de preprocesado, cache y cola"""
+    ai_result['processing_time'] = time.time() - start_time
+    ai_result['cache_hit'] = cache_hit
+    ai_result['processed_image_size'] = len(prepared['data'])
+    ai_result['preprocessing_time'] = prepared['preprocessing_time']
+    ai_result['admission_queue_depth'] = admission.get('queue_depth')
+    ai_result['admission_wait'] = admission.get('wait_seconds')
+    return ai_result
+
+
+def stream_analysis(analysis, image_bytes):
+    """
+    Variante de run_analysis que informa el avance mientras trabaja.
+
+    Es un generador de eventos (tipo, datos) pensado para Server-Sent Events:
+    'received', 'preprocessed', 'model_started', 'food_name' (nombre parcial
+    apenas aparece en el texto de Gemini), 'food_data', 'scanned_food' y al
+    final 'done' con el mismo dict que devuelve run_analysis. Los datos son
+    dicts simples salvo 'scanned_food' (el modelo) y 'done'.
+    """
+    user = analysis.user
+    start_time = time.time()
+    finished = False
+
+    try:
+        # El análisis se crea 'pending' y pasa a 'processing' recién acá: si el
+        # cliente se va antes de que el generador arranque, el finally no corre
+        # y un 'processing' quedaría colgado (fail_stale_analyses limpia los pending)
+        ImageAnalysis.objects.filter(pk=analysis.pk).update(status='processing')
+        analysis.status = 'processing'
+        yield 'received', {'analysis_id': analysis.id, 'image_size': analysis.image_size}
+
+        prepared = prepare_image(image_bytes, analysis.image_format)
+        image_cache = get_image_cache()
+        fingerprint = prepared['image_fingerprint'] if image_cache else None
+        cached = image_cache.get(fingerprint) if fingerprint is not None else None
+
+        yield 'preprocessed', {
+            'processed_image_size': len(prepared['data']),
+            'preprocessing_time': prepared['preprocessing_time'],
+            'cache_hit': bool(cached)
+        }
+
+        admission = {}
+        if cached:
+            ai_result = cached_ai_result(cached)
+        else:
+            ai_result = None
+            food_name = None
+            for event, data in gemini_stream_events(user.id, prepared):
+                if event == 'model_started':
+                    # Si se escala de modelo, el nombre parcial se vuelve a enviar
+                    food_name = None
+                    yield 'model_started', {'model': data}
+                elif event == 'partial' and food_name is None:
+                    match = PARTIAL_FOOD_NAME_RE.search(data)
+                    if match:
+                        food_name = json.loads(f'"{match.group(1)}"')
+                        yield 'food_name', {'food_name': food_name}
+                elif event == 'result':
+                    ai_result = data
+                elif event == 'admission':
+                    admission = data
+            cache_ai_result(fingerprint, ai_result)
+
+        ai_result = finish_ai_result(ai_result, prepared, bool(cached), admission, start_time)
+        if ai_result['success']:
+            yield 'food_data', {'food_data': ai_result['food_data']}
+
+        result, scanned_serializer = apply_ai_result(analysis, ai_result)
+        with transaction.atomic():
+            analysis.save()
+            if scanned_serializer is not None:
+                result['scanned_food'] = scanned_serializer.save(user=user, image_analysis=analysis)
+                result['scanned_food_data'] = scanned_serializer.data
+        finished = True
+        update_usage_stats(user, analysis, success=analysis.status == 'completed')
+
+        if result.get('scanned_food') is not None:
+            yield 'scanned_food', result['scanned_food']
+        yield 'done', result
+
+    except Exception as e:
+        analysis.status = 'error'
+        analysis.error_message = str(e)
+        analysis.save()
+        finished = True
+        update_usage_stats(user, analysis, success=False)
+
+        yield 'done', {
+            'outcome': 'error',
+            'error': f'Error inesperado: {str(e)}'
+        }
+
+    finally:
+        if not finished:
+            # El cliente cerró la conexión antes de terminar
+            ImageAnalysis.objects.filter(pk=analysis.pk, status='processing').update(
+                status='error', error_message='Conexión cerrada por el cliente'
+            )
+
+
+def gemini_stream_events(user_id, prepared):
+    """
+    Eventos de analyze_food_image_stream, con la llamada corriendo en un hilo.
+
+    El hilo toma el cupo de admisión y lo libera apenas Gemini termina; los
+    eventos pasan por una cola, así un cliente lento (o que se desconecta)
+    no retiene el cupo mientras se le escribe. Al final emite ('admission',
+    datos del cupo); si la cola de admisión rechaza, un 'result' no disponible.
+    """
+    events = queue.Queue()
+
+    def consume():
+        try:
+            with gemini_slot(user_id) as admission:
+                stream = get_gemini_client().analyze_food_image_stream(prepared['data'], prepared['format'])
+                for event in stream:
+                    events.put(event)
+            events.put(('admission', admission))
+        except AdmissionRejected as e:
+            events.put(('result', {'success': False, 'error': str(e), 'unavailable': True}))
+        except Exception as e:
+            events.put(('error', e))
+        finally:
+            events.put((None, None))
+
+    threading.Thread(target=consume, name='gemini-stream', daemon=True).start()
+    while True:
+        event, data = events.get()
+        if event is None:
+            return
+        if event == 'error':
+            raise data
+        yield event, data
+
+
+def call_gemini(user_id, prepared, mode='single'):
+    """
+    Llama a Gemini dentro de un cupo del control de admisión global.
+
+    Devuelve (ai_result, admission). Si no se consigue cupo, ai_result viene
+    con success=False y 'unavailable'=True sin haber llamado a Gemini.
+    """
+    try:
+        with gemini_slot(user_id) as admission:
+            ai_result = get_gemini_client().analyze_food_image(
+                prepared['data'], prepared['format'], mode=mode
+            )
+    except AdmissionRejected as e:
+        return {'success': False, 'error': str(e), 'unavailable': True}, {}
+    return ai_result, admission
+
+
+async def acall_gemini(user_id, prepared, mode='single'):
+    """Versión async de call_gemini"""
+    try:
+        async with async_gemini_slot(user_id) as admission:
+            ai_result = await get_gemini_client().analyze_food_image_async(
+                prepared['data'], prepared['format'], mode=mode
+            )
+    except AdmissionRejected as e:
+        return {'success': False, 'error': str(e), 'unavailable': True}, {}
+    return ai_result, admission
+
+
+def apply_ai_result(analysis, ai_result):
+    """
+    Copia el resultado de IA al ImageAnalysis (sin guardarlo) y decide el estado.
+
+    Devuelve (result, scanned_serializer): `result` tiene la misma forma que el
+    de run_analysis y `scanned_serializer` es un ScannedFoodCreateSerializer
+    ya validado, o None si no hay alimento que guardar.
+    """
+    analysis.processing_time_seconds = ai_result.get('processing_time', 0)
+    analysis.processed_image_size = ai_result.get('processed_image_size')
+    analysis.preprocessing_time_seconds = ai_result.get('preprocessing_time')
+    analysis.cache_hit = ai_result.get('cache_hit', False)
+    analysis.gemini_retries = ai_result.get('retries', 0)
+    analysis.admission_queue_depth = ai_result.get('admission_queue_depth')
+    analysis.admission_wait_seconds = ai_result.get('admission_wait')
+
+    if not ai_result['success']:
+        # Error en el análisis de Gemini
+        analysis.status = 'error'
+        analysis.error_message = ai_result.get('error', 'Error en el análisis de IA')
+        if ai_result.get('unavailable'):
+            return {
+                'outcome': 'unavailable',
+                'error': 'Servicio de IA no disponible temporalmente, intenta nuevamente en unos segundos'
+            }, None
+        return {
+            'outcome': 'error',
+            'error': 'Error en el análisis de la imagen'
+        }, None
+
+    # Actualizar análisis con resultados exitosos
+    analysis.status = 'completed'
+    analysis.raw_ai_response = ai_result.get('raw_response')
+    apply_usage(analysis, ai_result)
+
+    food_data = ai_result['food_data']
+
+    if not is_food_identified(food_data):
+        # No se pudo identificar el alimento
+        analysis.status = 'failed'
+        analysis.error_message = food_data.get('error', 'No se pudo identificar el alimento')
+        return {'outcome': 'not_identified', 'food_data': food_data}, None
+
+    scanned_serializer = ScannedFoodCreateSerializer(
+        data=build_scanned_food_data(food_data, ai_result)
+    )
+    if not scanned_serializer.is_valid():
+        # Aunque los datos nutricionales sean inválidos, el análisis fue exitoso
+        return {'outcome': 'invalid_nutrition', 'food_data': food_data}, None
+
+    return {'outcome': 'created', 'food_data': food_data}, scanned_serializer
+
+
+def apply_usage(analysis, ai_result):
+    """Copia modelo, ruta, tokens, costo y estado del parseo del resultado de IA al ImageAnalysis"""
+    analysis.gemini_model = ai_result.get('model', '')
+    analysis.model_route = ai_result.get('route', [])
+    analysis.escalated = ai_result.get('escalated', False)
+    analysis.parse_failed = ai_result.get('parse_error', False)
+    analysis.gemini_request_tokens = ai_result.get('input_tokens', 0)
+    analysis.gemini_response_tokens = ai_result.get('output_tokens', 0)
+    analysis.gemini_cached_tokens = ai_result.get('cached_tokens', 0)
+    analysis.tokens_estimated = ai_result.get('tokens_estimated', False)
+    analysis.gemini_cost_usd = Decimal(str(ai_result.get('cost_usd', 0)))
+
+
+def is_food_identified(food_data):
+    """Indica si la respuesta de la IA identificó un alimento utilizable"""
+    return bool(
+        food_data.get('food_name') and
+        food_data['food_name'] != 'No identificado' and
+        food_data.get('confidence') != 'bajo'
+    )
+
+
+def build_scanned_food_data(food_data, ai_result):
+    """Prepara los datos de ScannedFood a partir de la respuesta de la IA"""
+    nutrition_serving = food_data.get('nutrition_per_serving', {})
+    nutrition_100g = food_data.get('nutrition_per_100g', {})
+
+    return {
+        'ai_identified_name': food_data['food_name'],
+        'serving_size': food_data.get('serving_size', ''),
+        'calories_per_serving': nutrition_serving.get('calories'),
+        'protein_per_serving': nutrition_serving.get('protein_g'),
+        'carbs_per_serving': nutrition_serving.get('carbs_g'),
+        'fat_per_serving': nutrition_serving.get('fat_g'),
+        'calories_per_100g': nutrition_100g.get('calories'),
+        'protein_per_100g': nutrition_100g.get('protein_g'),
+        'carbs_per_100g': nutrition_100g.get('carbs_g'),
+        'fat_per_100g': nutrition_100g.get('fat_g'),
+        'raw_ai_response': ai_result
+    }
+
+
+def update_usage_stats(user, analysis, success=True):
+    """Actualizar estadísticas de uso diarias"""
+    increment_usage_stats(
+        user,
+        requests=1,
+        input_tokens=analysis.gemini_request_tokens or 0,
+        output_tokens=analysis.gemini_response_tokens or 0,
+        cost_usd=analysis.gemini_cost_usd or 0,
+        successful=1 if success else 0,
+        failed=0 if success else 1,
+        parse_failures=1 if analysis.parse_failed else 0,
+        analyzed_at=analysis.created_at
+    )
+    record_latency([analysis])
+
+
+def compute_user_stats(user):
+    """
+    Estadísticas generales y del mes del usuario a partir de los rollups.
+
+    Los totales y la fecha del último análisis salen de
+    GeminiUsageMonthlyStats (una fila por mes), así el costo no crece con la
+    cantidad de análisis del usuario.
+    """
+    current_month = timezone.now().date().replace(day=1)
+    this_month = Q(month=current_month)
+
+    stats = GeminiUsageMonthlyStats.objects.filter(user=user).aggregate(
+        total_analyses=Sum('total_requests'),
+        successful_analyses=Sum('successful_analyses'),
+        failed_analyses=Sum('failed_analyses'),
+        total_cost=Sum('total_cost_usd'),
+        analyses_this_month=Sum('total_requests', filter=this_month),
+        cost_this_month=Sum('total_cost_usd', filter=this_month),
+        last_analysis_date=Max('last_analysis_at'),
+    )
+    last_analysis_date = stats.pop('last_analysis_date')
+    stats = {name: value or 0 for name, value in stats.items()}
+    stats['last_analysis_date'] = last_analysis_date
+
+    total_analyses = stats['total_analyses']
+    total_cost = stats['total_cost']
+    success_rate = (stats['successful_analyses'] / total_analyses * 100) if total_analyses > 0 else 0
+    avg_cost = total_cost / total_analyses if total_analyses > 0 else 0
+
+    return {
+        **stats,
+        'success_rate': round(success_rate, 2),
+        'average_cost_per_analysis': round(avg_cost, 6),
+    }
+
+
+def user_stats_cache_key(user_id):
+    return f'ai_analysis:user_stats:{user_id}'
+
+
+def increment_usage_stats(user, requests=0, input_tokens=0, output_tokens=0,
+                          cost_usd=0, successful=0, failed=0, parse_failures=0,
+                          analyzed_at=None):
+    """Sumar contadores a las estadísticas de uso del día (upsert atómico)"""
+    record_usage(user.id, {
+        'total_requests': requests,
+        'total_input_tokens': input_tokens,
+        'total_output_tokens': output_tokens,
+        'total_cost_usd': Decimal(str(cost_usd)),
+        'successful_analyses': successful,
+        'failed_analyses': failed,
+        'parse_failures': parse_failures,
+    }, analyzed_at=analyzed_at)
+    # Hay análisis nuevos: las estadísticas en cache del usuario ya no sirven
+    cache.delete(user_stats_cache_key(user.id))
@@ -1,3 +1,633 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from foods.models import ScannedFood
+from users.models import User
+from . import admission, image_processing, services, workers
+from .admission import AdmissionController, AdmissionRejected
+from .gemini_client import set_gemini_client
+from .image_cache import ImageFingerprint, ImageResultCache
+from .image_processing import detect_image_format, prepare_image
+from .models import (
+    GeminiGlobalDailyStats,
+    GeminiGlobalMonthlyStats,
+    GeminiUsageMonthlyStats,
+    GeminiUsageStats,
+    ImageAnalysis,
+)
+from .resilience import CircuitBreaker, backoff_delay
+from .schemas import VALIDATORS, SchemaValidationError, compile_schema
+from .services import run_analysis, stream_analysis
+from .usage_stats import upsert_usage_stats
 
-# Create your tests here.
+
+def jpeg_bytes(color=(200, 30, 30), size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+FOOD_DATA = {
+    'food_name': 'Manzana',
+    'serving_size': '1 unidad',
+    'confidence': 'alto',
+    'nutrition_per_serving': {'calories': 95, 'protein_g': 0.5, 'carbs_g': 25, 'fat_g': 0.3},
+    'nutrition_per_100g': {'calories': 52, 'protein_g': 0.3, 'carbs_g': 14, 'fat_g': 0.2},
+}
+
+
+def gemini_result(food_data=None, **extra):
+    """Resultado con la forma de GeminiClient.analyze_food_image"""
+    return {
+        'success': True,
+        'food_data': dict(food_data or FOOD_DATA),
+        'processing_time': 0.01,
+        'input_tokens': 100,
+        'output_tokens': 50,
+        'cost_usd': 0.0001,
+        'raw_response': '{}',
+        **extra,
+    }
+
+
+class FakeGeminiClient:
+    """Cliente de Gemini falso: devuelve `result` (o lanza `error`) y cuenta las llamadas"""
+
+    def __init__(self, result=None, error=None):
+        self.result = result if result is not None else gemini_result()
+        self.error = error
+        self.calls = 0
+
+    def analyze_food_image(self, image_data, image_format='jpeg', mode='single', **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return dict(self.result)
+
+    def analyze_food_image_stream(self, image_data, image_format='jpeg', mode='single'):
+        self.calls += 1
+        yield 'model_started', 'gemini-test'
+        yield 'partial', '{"food_name": "Manz'
+        yield 'partial', '{"food_name": "Manzana", "serving_size"'
+        yield 'result', dict(self.result)
+
+
+# Sin pool de procesos, cache de imágenes, cola de admisión ni buffer de estadísticas:
+# cada test ve sólo lo que hace su propio cliente falso
+ISOLATED = override_settings(
+    AI_IMAGE_PROCESS_WORKERS=0,
+    AI_IMAGE_CACHE_ENABLED=False,
+    GEMINI_ADMISSION_ENABLED=False,
+    AI_USAGE_STATS_BUFFER_ENABLED=False,
+)
+
+
+class FakeGeminiMixin:
+    """Instala un FakeGeminiClient con set_gemini_client y restaura el anterior"""
+
+    def use_client(self, client):
+        previous = set_gemini_client(client)
+        self.addCleanup(set_gemini_client, previous)
+        return client
+
+    def create_analysis(self, **fields):
+        return ImageAnalysis.objects.create(
+            user=self.user, image_size=1000, image_format='jpeg', **fields
+        )
+
+
+@ISOLATED
+class RunAnalysisTests(FakeGeminiMixin, TestCase):
+    """run_analysis con un cliente falso: estado, ScannedFood y estadísticas"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='analisis@example.com', password='x')
+
+    def test_identified_food_creates_scanned_food(self):
+        self.use_client(FakeGeminiClient())
+        analysis = self.create_analysis(status='processing')
+
+        result = run_analysis(analysis, jpeg_bytes())
+
+        self.assertEqual(result['outcome'], 'created')
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'completed')
+        self.assertEqual(analysis.gemini_request_tokens, 100)
+        scanned = ScannedFood.objects.get(image_analysis=analysis)
+        self.assertEqual(scanned.ai_identified_name, 'Manzana')
+        stats = GeminiUsageStats.objects.get(user=self.user)
+        self.assertEqual((stats.total_requests, stats.successful_analyses), (1, 1))
+
+    def test_unidentified_food_is_failed_without_scanned_food(self):
+        food_data = {'food_name': 'No identificado', 'confidence': 'bajo', 'error': 'No es comida'}
+        self.use_client(FakeGeminiClient(gemini_result(food_data)))
+        analysis = self.create_analysis(status='processing')
+
+        result = run_analysis(analysis, jpeg_bytes())
+
+        self.assertEqual(result['outcome'], 'not_identified')
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'failed')
+        self.assertFalse(ScannedFood.objects.filter(image_analysis=analysis).exists())
+
+    def test_unavailable_result(self):
+        self.use_client(FakeGeminiClient({'success': False, 'error': 'abierto', 'unavailable': True}))
+        analysis = self.create_analysis(status='processing')
+
+        result = run_analysis(analysis, jpeg_bytes())
+
+        self.assertEqual(result['outcome'], 'unavailable')
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'error')
+        self.assertEqual(GeminiUsageStats.objects.get(user=self.user).failed_analyses, 1)
+
+    def test_client_exception_marks_error(self):
+        self.use_client(FakeGeminiClient(error=RuntimeError('sin red')))
+        analysis = self.create_analysis(status='processing')
+
+        result = run_analysis(analysis, jpeg_bytes())
+
+        self.assertEqual(result['outcome'], 'error')
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'error')
+        self.assertEqual(analysis.error_message, 'sin red')
+
+
+@ISOLATED
+class StreamAnalysisTests(FakeGeminiMixin, TestCase):
+    """stream_analysis: orden de eventos, desconexión del cliente y cupo de admisión"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='stream@example.com', password='x')
+
+    def test_events_until_done(self):
+        self.use_client(FakeGeminiClient())
+        analysis = self.create_analysis(status='pending')
+
+        events = list(stream_analysis(analysis, jpeg_bytes()))
+
+        self.assertEqual([event for event, _ in events], [
+            'received', 'preprocessed', 'model_started', 'food_name',
+            'food_data', 'scanned_food', 'done',
+        ])
+        self.assertEqual(dict(events)['food_name'], {'food_name': 'Manzana'})
+        self.assertEqual(dict(events)['done']['outcome'], 'created')
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'completed')
+
+    def test_closed_before_start_keeps_pending(self):
+        self.use_client(FakeGeminiClient())
+        analysis = self.create_analysis(status='pending')
+
+        stream_analysis(analysis, jpeg_bytes()).close()
+
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'pending')
+
+    def test_client_disconnect_marks_error(self):
+        self.use_client(FakeGeminiClient())
+        analysis = self.create_analysis(status='pending')
+
+        events = stream_analysis(analysis, jpeg_bytes())
+        self.assertEqual(next(events)[0], 'received')
+        events.close()
+
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'error')
+        self.assertEqual(analysis.error_message, 'Conexión cerrada por el cliente')
+
+    def test_slot_released_without_waiting_for_the_client(self):
+        self.use_client(FakeGeminiClient())
+        released = threading.Event()
+
+        @contextmanager
+        def slot(user_id):
+            try:
+                yield {}
+            finally:
+                released.set()
+
+        analysis = self.create_analysis(status='pending')
+        with mock.patch.object(services, 'gemini_slot', slot):
+            events = stream_analysis(analysis, jpeg_bytes())
+            while next(events)[0] != 'model_started':
+                pass
+            # El cliente no lee más, pero el hilo de Gemini termina y libera el cupo
+            self.assertTrue(released.wait(timeout=5))
+            events.close()
+
+
+@ISOLATED
+class BackgroundWorkerTests(FakeGeminiMixin, TransactionTestCase):
+    """enqueue_analysis: encolar al hacer commit, cola llena y análisis abandonados"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='worker@example.com', password='x')
+        workers.get_executor()
+
+    def wait_for_status(self, analysis, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            analysis.refresh_from_db()
+            if analysis.status not in ('pending', 'processing'):
+                return analysis.status
+            time.sleep(0.02)
+        self.fail(f'El análisis {analysis.pk} sigue en {analysis.status}')
+
+    def test_enqueued_analysis_completes(self):
+        client = self.use_client(FakeGeminiClient())
+        analysis = self.create_analysis(status='pending')
+
+        self.assertTrue(workers.enqueue_analysis(analysis, jpeg_bytes()))
+
+        self.assertEqual(self.wait_for_status(analysis), 'completed')
+        self.assertEqual(client.calls, 1)
+
+    def test_rolled_back_transaction_does_not_enqueue(self):
+        client = self.use_client(FakeGeminiClient())
+        with mock.patch.object(workers, '_queue_slots', mock.Mock(wraps=workers._queue_slots)) as slots:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    analysis = self.create_analysis(status='pending')
+                    workers.enqueue_analysis(analysis, jpeg_bytes())
+                    raise RuntimeError('rollback')
+
+        slots.acquire.assert_not_called()
+        self.assertEqual(client.calls, 0)
+
+    def test_full_queue_marks_analysis_as_error_on_commit(self):
+        self.use_client(FakeGeminiClient())
+        full = mock.Mock()
+        full.acquire.return_value = False
+        with mock.patch.object(workers, '_queue_slots', full):
+            with transaction.atomic():
+                analysis = self.create_analysis(status='pending')
+                workers.enqueue_analysis(analysis, jpeg_bytes())
+
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.status, 'error')
+        self.assertEqual(analysis.error_message, 'Cola de análisis llena')
+
+    def test_fail_stale_analyses(self):
+        stale = self.create_analysis(status='processing')
+        fresh = self.create_analysis(status='pending')
+        ImageAnalysis.objects.filter(pk=stale.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+
+        call_command('fail_stale_analyses', older_than=600, stdout=io.StringIO())
+
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, 'error')
+        self.assertEqual(fresh.status, 'pending')
+
+
+class UsageStatsTests(TestCase):
+    """upsert_usage_stats y rebuild_usage_rollups: sumas y último análisis en cada rollup"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='uso@example.com', password='x')
+        self.day = timezone.now().date()
+
+    def rollups(self):
+        month = self.day.replace(day=1)
+        return [
+            GeminiUsageStats.objects.get(user=self.user, date=self.day),
+            GeminiUsageMonthlyStats.objects.get(user=self.user, month=month),
+            GeminiGlobalDailyStats.objects.get(date=self.day),
+            GeminiGlobalMonthlyStats.objects.get(month=month),
+        ]
+
+    def test_upsert_sums_counters_and_keeps_latest_analysis(self):
+        later = timezone.now()
+        earlier = later - timedelta(hours=1)
+
+        upsert_usage_stats(self.user.id, self.day, {'total_requests': 1, 'total_input_tokens': 100}, later)
+        upsert_usage_stats(self.user.id, self.day, {'total_requests': 2, 'failed_analyses': 1}, earlier)
+
+        for row in self.rollups():
+            self.assertEqual(row.total_requests, 3)
+            self.assertEqual(row.total_input_tokens, 100)
+            self.assertEqual(row.failed_analyses, 1)
+            self.assertEqual(row.last_analysis_at, later)
+
+    def test_upsert_without_counters_writes_nothing(self):
+        upsert_usage_stats(self.user.id, self.day, {'total_requests': 0})
+
+        self.assertFalse(GeminiUsageStats.objects.exists())
+
+    def test_rebuild_from_analyses(self):
+        created_at = timezone.now().replace(microsecond=0)
+        for status in ('completed', 'completed', 'error', 'processing'):
+            ImageAnalysis.objects.create(
+                user=self.user, image_size=1000, image_format='jpeg', status=status,
+                gemini_request_tokens=10
+            )
+        ImageAnalysis.objects.update(created_at=created_at)
+        # Un rollup desfasado que el comando debe reemplazar
+        upsert_usage_stats(self.user.id, self.day, {'total_requests': 99})
+
+        call_command('rebuild_usage_rollups', from_analyses=True, stdout=io.StringIO())
+
+        for row in self.rollups():
+            self.assertEqual(row.total_requests, 3)
+            self.assertEqual(row.total_input_tokens, 30)
+            self.assertEqual((row.successful_analyses, row.failed_analyses), (2, 1))
+            self.assertEqual(row.last_analysis_at, created_at)
+
+
+class ImageResultCacheTests(TestCase):
+    """Cache de resultados por huella de imagen: hit, miss, TTL y LRU"""
+
+    def fingerprint(self, digest, dhash=0, detail=20, colors=(100,) * 12):
+        return ImageFingerprint(dhash, digest, detail, colors)
+
+    def test_same_bytes_hit(self):
+        cache = ImageResultCache()
+        cache.set(self.fingerprint('a'), FOOD_DATA, '{}')
+
+        food_data, raw_response = cache.get(self.fingerprint('a', dhash=2 ** 63))
+
+        self.assertEqual(food_data, FOOD_DATA)
+        self.assertEqual(raw_response, '{}')
+
+    def test_near_duplicate_hit_and_distant_miss(self):
+        cache = ImageResultCache(max_distance=4)
+        cache.set(self.fingerprint('a', dhash=0b1111), FOOD_DATA, '{}')
+
+        self.assertIsNotNone(cache.get(self.fingerprint('b', dhash=0b0111)))
+        self.assertIsNone(cache.get(self.fingerprint('c', dhash=0b1111 << 20 | 0b11111)))
+
+    def test_low_detail_and_different_colors_miss(self):
+        cache = ImageResultCache(min_detail=6, max_color_distance=24)
+        cache.set(self.fingerprint('a'), FOOD_DATA, '{}')
+
+        self.assertIsNone(cache.get(self.fingerprint('b', detail=2)))
+        self.assertIsNone(cache.get(self.fingerprint('c', colors=(100,) * 11 + (200,))))
+
+    def test_entries_expire_after_ttl(self):
+        cache = ImageResultCache(ttl_seconds=60)
+        with mock.patch('ai_analysis.image_cache.time.time', return_value=1000):
+            cache.set(self.fingerprint('a'), FOOD_DATA, '{}')
+        with mock.patch('ai_analysis.image_cache.time.time', return_value=1059):
+            self.assertIsNotNone(cache.get(self.fingerprint('a')))
+        with mock.patch('ai_analysis.image_cache.time.time', return_value=1061):
+            self.assertIsNone(cache.get(self.fingerprint('a')))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ImageResultCache(max_entries=2)
+        cache.set(self.fingerprint('a', dhash=0), FOOD_DATA, '{}')
+        cache.set(self.fingerprint('b', dhash=2 ** 64 - 1), FOOD_DATA, '{}')
+        cache.get(self.fingerprint('a', dhash=0))
+        cache.set(self.fingerprint('c', dhash=0xFFFFFFFF), FOOD_DATA, '{}')
+
+        self.assertIsNotNone(cache.get(self.fingerprint('a', dhash=0)))
+        self.assertIsNone(cache.get(self.fingerprint('b', dhash=2 ** 64 - 1)))
+
+    def test_cached_data_is_a_copy(self):
+        cache = ImageResultCache()
+        cache.set(self.fingerprint('a'), FOOD_DATA, '{}')
+        cache.get(self.fingerprint('a'))[0]['food_name'] = 'Otra cosa'
+
+        self.assertEqual(cache.get(self.fingerprint('a'))[0]['food_name'], 'Manzana')
+
+
+@override_settings(AI_IMAGE_MAX_EDGE=256)
+class PrepareImageTests(TestCase):
+    """prepare_image: reducción, respaldo en el hilo del request e imágenes no decodificables"""
+
+    def pool_failing_with(self, error):
+        future = mock.Mock()
+        future.result.side_effect = error
+        pool = mock.Mock()
+        pool.submit.return_value = future
+        return pool
+
+    def png_bytes(self, size=(800, 400)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (10, 120, 30, 255)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    @override_settings(AI_IMAGE_PROCESS_WORKERS=0)
+    def test_resizes_and_reencodes_as_jpeg(self):
+        result = prepare_image(self.png_bytes(), 'png')
+
+        self.assertEqual(result['format'], 'jpeg')
+        self.assertEqual((result['width'], result['height']), (256, 128))
+        self.assertEqual(detect_image_format(result['data']), 'jpeg')
+        self.assertIsNotNone(result['image_fingerprint'])
+
+    @override_settings(AI_IMAGE_PROCESS_WORKERS=0)
+    def test_undecodable_image_is_sent_unchanged(self):
+        data = b'\xff\xd8\xff' + b'no es una imagen'
+
+        result = prepare_image(data, 'jpeg')
+
+        self.assertEqual(result['data'], data)
+        self.assertIsNone(result['image_fingerprint'])
+
+    def test_broken_pool_is_replaced_and_image_processed_in_thread(self):
+        pool = self.pool_failing_with(BrokenProcessPool())
+        with mock.patch.object(image_processing, 'get_process_pool', return_value=pool), \
+                mock.patch.object(image_processing, 'reset_process_pool') as reset:
+            result = prepare_image(self.png_bytes(), 'png')
+
+        reset.assert_called_once_with(pool)
+        self.assertEqual(result['format'], 'jpeg')
+        self.assertEqual(result['width'], 256)
+
+    def test_pool_timeout_processes_in_thread(self):
+        pool = self.pool_failing_with(FutureTimeoutError())
+        with mock.patch.object(image_processing, 'get_process_pool', return_value=pool), \
+                mock.patch.object(image_processing, 'reset_process_pool') as reset:
+            result = prepare_image(self.png_bytes(), 'png')
+
+        reset.assert_not_called()
+        self.assertEqual(result['format'], 'jpeg')
+
+    def test_reset_process_pool_only_drops_current_pool(self):
+        current, stale = mock.Mock(), mock.Mock()
+        with mock.patch.object(image_processing, '_pool', current):
+            image_processing.reset_process_pool(stale)
+            self.assertIs(image_processing._pool, current)
+            image_processing.reset_process_pool(current)
+            self.assertIsNone(image_processing._pool)
+        stale.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+
+class BackoffDelayTests(TestCase):
+    """Backoff exponencial con jitter completo"""
+
+    def test_delay_is_bounded_by_exponential_and_max(self):
+        for attempt in range(6):
+            for _ in range(50):
+                delay = backoff_delay(attempt, base_delay=0.5, max_delay=4)
+                self.assertGreaterEqual(delay, 0)
+                self.assertLessEqual(delay, min(4, 0.5 * 2 ** attempt))
+
+    def test_upper_bound_is_reached_with_full_jitter(self):
+        with mock.patch('ai_analysis.resilience.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(backoff_delay(2, base_delay=0.5, max_delay=4), 2)
+            self.assertEqual(backoff_delay(10, base_delay=0.5, max_delay=4), 4)
+
+
+class CircuitBreakerTests(TestCase):
+    """Transiciones closed -> open -> half_open del circuit breaker"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('ai_analysis.resilience.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+
+    def record_failures(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.record_failures(2)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.record_failures(1)
+
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()['total_rejected'], 1)
+        self.assertEqual(self.breaker.seconds_until_retry(), 30)
+
+    def test_success_resets_the_failure_count(self):
+        self.record_failures(2)
+        self.breaker.record_success()
+        self.record_failures(2)
+
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_half_open_allows_a_single_trial(self):
+        self.record_failures(3)
+        self.now += 30
+
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_trial_success_closes_and_failure_reopens(self):
+        self.record_failures(3)
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.snapshot()['times_opened'], 2)
+
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow_request())
+
+
+class AdmissionControllerTests(TestCase):
+    """Cupos de Gemini entre procesos: límite, cola, orden justo y leases vencidos"""
+
+    def controller(self, **options):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        options.setdefault('timeout', 0.2)
+        return AdmissionController(os.path.join(directory.name, 'admission.sqlite3'), **options)
+
+    def test_slot_is_released_on_exit(self):
+        controller = self.controller(max_in_flight=1)
+
+        with controller.slot(user_id=1) as info:
+            self.assertEqual(info['queue_depth'], 0)
+            self.assertEqual(controller.stats()['in_flight'], 1)
+
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+    def test_waiting_too_long_is_rejected(self):
+        controller = self.controller(max_in_flight=1)
+
+        with controller.slot(user_id=1):
+            with self.assertRaises(AdmissionRejected):
+                with controller.slot(user_id=2):
+                    pass
+
+        self.assertEqual(controller.stats()['waiting'], 0)
+
+    def test_full_queue_is_rejected(self):
+        controller = self.controller(max_in_flight=1, queue_size=1)
+        controller._enqueue(user_id=2)
+
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire(user_id=3)
+
+    def test_user_with_fewer_calls_goes_first(self):
+        controller = self.controller(max_in_flight=2)
+        controller.acquire(user_id=1)
+        heavy_waiter, _ = controller._enqueue(user_id=1)
+        light_waiter, _ = controller._enqueue(user_id=2)
+
+        self.assertIsNone(controller._try_acquire(heavy_waiter, user_id=1))
+        self.assertIsNotNone(controller._try_acquire(light_waiter, user_id=2))
+
+    def test_expired_leases_are_purged(self):
+        controller = self.controller(max_in_flight=1, lease_ttl=60)
+        controller.acquire(user_id=1)
+
+        with mock.patch('ai_analysis.admission.time.time', return_value=time.time() + 61):
+            lease_id, _ = controller.acquire(user_id=2)
+
+        self.assertIsNotNone(lease_id)
+
+    @override_settings(GEMINI_ANALYSIS_MAX_SECONDS=100, GEMINI_ADMISSION_ENABLED=True)
+    def test_lease_covers_a_fully_escalated_analysis(self):
+        with mock.patch.object(admission, '_controller', None):
+            self.assertEqual(admission.get_admission_controller().lease_ttl, 130)
+
+
+class SchemaValidatorTests(TestCase):
+    """Validadores compilados de los esquemas de respuesta"""
+
+    def test_valid_single_and_plate_responses(self):
+        VALIDATORS['single'](FOOD_DATA)
+        VALIDATORS['single']({'food_name': 'No identificado', 'confidence': 'bajo', 'error': 'x'})
+        VALIDATORS['plate']({'items': [dict(FOOD_DATA, portion_g=150)]})
+
+    def test_errors_report_the_path(self):
+        cases = (
+            ({'confidence': 'alto'}, '$: falta food_name'),
+            (dict(FOOD_DATA, confidence='muy alto'), "$.confidence: valor no permitido 'muy alto'"),
+            (dict(FOOD_DATA, nutrition_per_serving={**FOOD_DATA['nutrition_per_serving'], 'calories': '95'}),
+             '$.nutrition_per_serving.calories: se esperaba number'),
+            ([], '$: se esperaba object'),
+        )
+        for value, message in cases:
+            with self.subTest(message=message):
+                with self.assertRaisesMessage(SchemaValidationError, message):
+                    VALIDATORS['single'](value)
+
+    def test_plate_items_are_validated(self):
+        with self.assertRaisesMessage(SchemaValidationError, '$.items[]: falta nutrition_per_serving'):
+            VALIDATORS['plate']({'items': [{'food_name': 'Arroz', 'confidence': 'alto'}]})
+
+    def test_booleans_are_not_numbers_and_nullable_is_respected(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {'grams': {'type': 'number', 'nullable': True}},
+        })
+        validate({'grams': None})
+        validate({'extra': 'se ignora'})
+        with self.assertRaises(SchemaValidationError):
+            validate({'grams': True})
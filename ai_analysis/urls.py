@@ -8,8 +8,19 @@ urlpatterns = [
     path('analyses/', views.ImageAnalysisListView.as_view(), name='analysis-list'),
     path('analyses/<int:pk>/', views.ImageAnalysisDetailView.as_view(), name='analysis-detail'),
     path('analyze/', views.analyze_food_image, name='analyze-food-image'),
+    path('analyze/async/', views.analyze_food_image_async, name='analyze-food-image-async'),
+    path('analyze/stream/', views.analyze_food_image_stream, name='analyze-food-image-stream'),
+    path('analyze/upload/', views.analyze_food_image_upload, name='analyze-food-image-upload'),
+    path('analyze/batch/', views.analyze_food_image_batch, name='analyze-food-image-batch'),
+    path('analyze/plate/', views.analyze_plate_image, name='analyze-plate-image'),
     
     # Estadísticas
     path('stats/', views.user_stats, name='user-stats'),
     path('stats/by-date/', views.usage_stats_by_date, name='usage-stats-by-date'),
+    path('stats/by-month/', views.usage_stats_by_month, name='usage-stats-by-month'),
+    path('stats/global/', views.global_usage_stats, name='global-usage-stats'),
+    
+    # Monitoreo (staff)
+    path('gemini/status/', views.gemini_status, name='gemini-status'),
+    path('gemini/analytics/', views.gemini_analytics, name='gemini-analytics'),
 ]
\ No newline at end of file
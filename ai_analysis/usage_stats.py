@@ -0,0 +1,266 @@
+# ai_analysis/usage_stats.py
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from .latency import bucket_for
+from .models import (
+    AnalysisLatencyHistogram,
+    GeminiGlobalDailyStats,
+    GeminiGlobalMonthlyStats,
+    GeminiUsageMonthlyStats,
+    GeminiUsageStats,
+)
+
+logger = logging.getLogger(__name__)
+
+# Contadores de GeminiUsageStats que se suman en cada análisis
+COUNTER_FIELDS = (
+    'total_requests',
+    'total_input_tokens',
+    'total_output_tokens',
+    'total_cost_usd',
+    'successful_analyses',
+    'failed_analyses',
+    'parse_failures',
+)
+
+
+def record_usage(user_id, counters, day=None, analyzed_at=None):
+    """
+    Suma `counters` (campo -> delta) a las estadísticas del día del usuario.
+
+    `analyzed_at` es la hora del análisis (por defecto, ahora) y queda como
+    last_analysis_at si es posterior a la guardada. Con
+    AI_USAGE_STATS_BUFFER_ENABLED los deltas se acumulan en memoria y se
+    escriben en bloque; si no, se escriben en el momento con un upsert.
+    """
+    analyzed_at = analyzed_at or timezone.now()
+    day = day or timezone.now().date()
+    buffer = get_usage_buffer()
+    if buffer is not None:
+        buffer.add(user_id, day, counters, analyzed_at)
+    else:
+        upsert_usage_stats(user_id, day, counters, analyzed_at)
+
+
+def upsert_usage_stats(user_id, day, counters, analyzed_at=None):
+    """
+    Suma los contadores a las estadísticas del día y a sus rollups.
+
+    Actualiza en una transacción la fila diaria del usuario, su fila mensual
+    y las filas globales del día y del mes, cada una con una sola sentencia
+    INSERT … ON CONFLICT DO UPDATE. La suma la hace la base de datos, así que
+    dos procesos que actualizan la misma fila a la vez no pierden incrementos.
+    """
+    values = [counters.get(field, 0) for field in COUNTER_FIELDS]
+    if not any(values):
+        return
+
+    increments = dict(zip(COUNTER_FIELDS, values))
+    latest = {'last_analysis_at': analyzed_at} if analyzed_at else None
+    month = day.replace(day=1)
+    with transaction.atomic():
+        upsert_counters(GeminiUsageStats, {'user_id': user_id, 'date': day}, increments, latest)
+        upsert_counters(GeminiUsageMonthlyStats, {'user_id': user_id, 'month': month}, increments, latest)
+        upsert_counters(GeminiGlobalDailyStats, {'date': day}, increments, latest)
+        upsert_counters(GeminiGlobalMonthlyStats, {'month': month}, increments, latest)
+
+
+def upsert_counters(model, keys, increments, latest=None):
+    """
+    Suma `increments` a la fila de `model` identificada por `keys` (la crea si
+    no existe). Los campos de `latest` se quedan con el mayor entre el valor
+    guardado y el nuevo. En motores sin ON CONFLICT se usa get_or_create +
+    UPDATE con F().
+    """
+    latest = latest or {}
+    now = timezone.now()
+    # created_at/updated_at sólo si el modelo los tiene
+    field_names = {field.name for field in model._meta.concrete_fields}
+    timestamps = {name: now for name in ('created_at', 'updated_at') if name in field_names}
+
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        row, _ = model.objects.get_or_create(**keys)
+        model.objects.filter(pk=row.pk).update(
+            **{name: now for name in timestamps if name == 'updated_at'},
+            **{field: F(field) + value for field, value in increments.items()},
+            **{
+                field: Case(
+                    When(Q(**{f'{field}__isnull': True}) | Q(**{f'{field}__lt': value}), then=Value(value)),
+                    default=F(field)
+                )
+                for field, value in latest.items()
+            }
+        )
+        return
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    row = {**keys, **increments, **latest, **timestamps}
+    columns = ', '.join(row)
+    placeholders = ', '.join(['%s'] * len(row))
+    conflict = ', '.join(keys)
+    updates = [f'{field} = {table}.{field} + excluded.{field}' for field in increments]
+    # MAX() de SQLite devuelve NULL si algún argumento es NULL: CASE en los dos motores
+    updates += [
+        f'{field} = CASE WHEN {table}.{field} IS NULL OR excluded.{field} > {table}.{field} '
+        f'THEN excluded.{field} ELSE {table}.{field} END'
+        for field in latest
+    ]
+    if 'updated_at' in timestamps:
+        updates.append('updated_at = excluded.updated_at')
+    # Cada valor pasa por su campo para adaptarlo al backend (fechas, Decimal)
+    params = [
+        model._meta.get_field(name).get_db_prep_save(value, connection)
+        for name, value in row.items()
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) VALUES ({placeholders}) '
+            f'ON CONFLICT ({conflict}) DO UPDATE SET {", ".join(updates)}',
+            params
+        )
+
+
+def record_latency(analyses):
+    """
+    Suma análisis terminados al histograma de latencias de la hora actual.
+
+    Agrupa por estado, formato y bucket antes de escribir, así un lote de
+    análisis parecidos es una sola sentencia. Con
+    AI_USAGE_STATS_BUFFER_ENABLED los deltas van al mismo buffer que los
+    contadores de uso y se escriben junto con ellos.
+    """
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    grouped = defaultdict(lambda: {'count': 0, 'total_cost_usd': Decimal('0')})
+    for analysis in analyses:
+        key = (hour, analysis.status, analysis.image_format or '', bucket_for(analysis.processing_time_seconds))
+        grouped[key]['count'] += 1
+        grouped[key]['total_cost_usd'] += analysis.gemini_cost_usd or Decimal('0')
+
+    buffer = get_usage_buffer()
+    if buffer is not None:
+        buffer.add_latency(grouped)
+    else:
+        upsert_latency(grouped)
+
+
+def upsert_latency(grouped):
+    """Escribe los deltas del histograma, {(hora, estado, formato, bucket): incrementos}"""
+    for (hour, status, image_format, bucket), increments in grouped.items():
+        upsert_counters(
+            AnalysisLatencyHistogram,
+            {'hour': hour, 'status': status, 'image_format': image_format, 'bucket': bucket},
+            increments
+        )
+
+
+class UsageStatsBuffer:
+    """
+    Acumula deltas de estadísticas por (usuario, día), y los del histograma de
+    latencias por (hora, estado, formato, bucket), y los escribe en bloque.
+
+    Se vacía cuando junta `max_events` eventos o cuando pasaron
+    `flush_interval` segundos (un hilo en segundo plano revisa el plazo). Al
+    terminar el proceso se vacía lo pendiente; si el proceso muere de golpe se
+    pierden, como mucho, los deltas de un intervalo.
+    """
+
+    def __init__(self, flush_interval=5, max_events=100):
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._latency = defaultdict(lambda: defaultdict(int))
+        self._analyzed_at = {}
+        self._events = 0
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='usage-stats-flush', daemon=True
+        )
+        self._thread.start()
+
+    def add(self, user_id, day, counters, analyzed_at=None):
+        with self._lock:
+            pending = self._pending[(user_id, day)]
+            for field, value in counters.items():
+                pending[field] += value
+            if analyzed_at is not None:
+                previous = self._analyzed_at.get((user_id, day))
+                self._analyzed_at[(user_id, day)] = max(previous or analyzed_at, analyzed_at)
+            self._events += 1
+            should_flush = self._events >= self.max_events
+        if should_flush:
+            self.flush()
+
+    def add_latency(self, grouped):
+        """Acumula deltas del histograma; no cuenta como evento (va con los de uso)"""
+        with self._lock:
+            for key, increments in grouped.items():
+                pending = self._latency[key]
+                for field, value in increments.items():
+                    pending[field] += value
+
+    def flush(self):
+        """Escribe los deltas acumulados; devuelve cuántas filas se tocaron"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+                latency, self._latency = self._latency, defaultdict(lambda: defaultdict(int))
+                analyzed_at, self._analyzed_at = self._analyzed_at, {}
+                self._events = 0
+                self._last_flush = time.monotonic()
+
+            for (user_id, day), counters in pending.items():
+                try:
+                    upsert_usage_stats(user_id, day, counters, analyzed_at.get((user_id, day)))
+                except Exception:
+                    logger.exception('No se pudieron guardar estadísticas de uso del usuario %s', user_id)
+            if latency:
+                try:
+                    upsert_latency(latency)
+                except Exception:
+                    logger.exception('No se pudo guardar el histograma de latencias')
+            return len(pending) + len(latency)
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(min(1, self.flush_interval)):
+            if time.monotonic() - self._last_flush < self.flush_interval:
+                continue
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_usage_buffer():
+    """Buffer de estadísticas del proceso, o None si está deshabilitado"""
+    global _buffer
+    if not getattr(settings, 'AI_USAGE_STATS_BUFFER_ENABLED', False):
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = UsageStatsBuffer(
+                    flush_interval=getattr(settings, 'AI_USAGE_STATS_FLUSH_SECONDS', 5),
+                    max_events=getattr(settings, 'AI_USAGE_STATS_FLUSH_EVENTS', 100)
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
@@ -1,23 +1,54 @@
 # ai_analysis/views.py
-from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+import json
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, generics, status
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.db.models import Sum, Count, Avg
-from datetime import datetime, timedelta
-import time
-import base64
-from .models import ImageAnalysis, GeminiUsageStats
+from datetime import timedelta
+from .models import (
+    ImageAnalysis,
+    GeminiUsageStats,
+    GeminiUsageMonthlyStats,
+    GeminiGlobalDailyStats,
+    GeminiGlobalMonthlyStats,
+)
 from .serializers import (
     ImageAnalysisSerializer,
     ImageAnalysisCreateSerializer,
+    ImageUploadSerializer,
+    ImageAnalysisBatchSerializer,
+    PlateAnalysisSerializer,
     GeminiUsageStatsSerializer,
+    GeminiUsageMonthlyStatsSerializer,
+    GeminiGlobalDailyStatsSerializer,
+    GeminiGlobalMonthlyStatsSerializer,
     UserStatsSerializer
 )
-from foods.models import ScannedFood
-from foods.serializers import ScannedFoodCreateSerializer
-from .gemini_client import GeminiClient
+from core.idempotency import idempotent
+from foods.serializers import ScannedFoodSerializer
+from tracking.serializers import LoggedFoodItemSerializer
+from .admission import get_admission_controller
+from .gemini_client import get_gemini_client
+from .latency import latency_analytics
+from .parsers import ImageBodyUploadParser, RawImageUploadParser
+from .renderers import EventStreamRenderer, sse_event
+from .services import (
+    arun_analysis, compute_user_stats, run_analysis, run_batch_analysis, run_plate_analysis, stream_analysis,
+    user_stats_cache_key
+)
+from .workers import enqueue_analysis
 
 
 class ImageAnalysisListView(generics.ListAPIView):
@@ -26,7 +57,9 @@ class ImageAnalysisListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return ImageAnalysis.objects.filter(user=self.request.user).order_by('-created_at')
+        return ImageAnalysis.objects.filter(
+            user=self.request.user
+        ).prefetch_related('scanned_foods').order_by('-created_at')
 
 
 class ImageAnalysisDetailView(generics.RetrieveAPIView):
@@ -35,180 +68,321 @@ class ImageAnalysisDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return ImageAnalysis.objects.filter(user=self.request.user)
+        return ImageAnalysis.objects.filter(user=self.request.user).prefetch_related('scanned_foods')
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def analyze_food_image(request):
-    """Endpoint para analizar imagen de comida con IA"""
+    """Endpoint para analizar imagen de comida con IA (acepta Idempotency-Key)"""
     serializer = ImageAnalysisCreateSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    user = request.user
-    image_data = serializer.validated_data['image_data']
-    image_format = serializer.validated_data['image_format']
+    return start_analysis(request.user, serializer.validated_data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, RawImageUploadParser, ImageBodyUploadParser])
+def analyze_food_image_upload(request):
+    """
+    Endpoint para analizar una imagen subida como archivo, sin base64.
     
-    # Crear registro de análisis
+    Acepta multipart/form-data (campo 'image') o el cuerpo binario con
+    Content-Type application/octet-stream o image/*. En ese caso async_mode
+    se pasa como query param.
+    """
+    serializer = ImageUploadSerializer(data={
+        'image': request.data.get('image'),
+        'async_mode': request.data.get('async_mode', request.query_params.get('async_mode', False)),
+    })
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    return start_analysis(request.user, serializer.validated_data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def analyze_food_image_stream(request):
+    """
+    Endpoint para analizar una imagen con el avance enviado como Server-Sent Events.
+    
+    Recibe lo mismo que analyze/ (async_mode se ignora) y emite los eventos
+    received, preprocessed, model_started, food_name, food_data, scanned_food
+    y done. El evento done trae el mismo cuerpo que la respuesta de analyze/
+    y su 'status' HTTP equivalente.
+    """
+    serializer = ImageAnalysisCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
     analysis = ImageAnalysis.objects.create(
+        user=request.user,
+        image_size=len(data['image_data']),
+        image_format=data['image_format'],
+        status='pending'
+    )
+    
+    response = StreamingHttpResponse(
+        analysis_events(analysis, data['image_data']),
+        content_type='text/event-stream'
+    )
+    # Evitar que proxies (nginx) acumulen los eventos
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def analysis_events(analysis, image_bytes):
+    """Convierte los eventos de stream_analysis al formato SSE"""
+    for event, data in stream_analysis(analysis, image_bytes):
+        if event == 'scanned_food':
+            data = ScannedFoodSerializer(data).data
+        elif event == 'done':
+            data, response_status = analysis_payload(analysis, data)
+            data['status'] = response_status
+        yield sse_event(event, data)
+
+
+@csrf_exempt
+@require_POST
+async def analyze_food_image_async(request):
+    """
+    Endpoint async para analizar imagen de comida (mismo cuerpo y respuesta que analyze/).
+    
+    Es una vista async de Django, no de DRF: bajo un servidor ASGI (uvicorn
+    core.asgi:application) la espera a Gemini no ocupa un hilo, así que un
+    worker puede tener cientos de análisis en curso. async_mode se ignora.
+    Bajo WSGI también responde (cada request corre en un event loop nuevo
+    con su propio canal a Gemini), pero sin esa ventaja.
+    """
+    user = await sync_to_async(authenticate_request)(request)
+    if user is None:
+        return json_response(
+            {'detail': exceptions.NotAuthenticated.default_detail},
+            status.HTTP_401_UNAUTHORIZED
+        )
+    
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return json_response({'detail': 'JSON inválido'}, status.HTTP_400_BAD_REQUEST)
+    
+    # Decodificar el base64 es trabajo de CPU: fuera del event loop
+    serializer = ImageAnalysisCreateSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid, thread_sensitive=False)():
+        return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    
+    validated_data = serializer.validated_data
+    analysis = await ImageAnalysis.objects.acreate(
         user=user,
-        image_size=len(base64.b64decode(image_data)),
-        image_format=image_format,
+        image_size=len(validated_data['image_data']),
+        image_format=validated_data['image_format'],
         status='processing'
     )
     
+    result = await arun_analysis(analysis, validated_data['image_data'])
+    body, response_status = await sync_to_async(analysis_payload)(analysis, result)
+    return json_response(body, response_status)
+
+
+def authenticate_request(request):
+    """Usuario autenticado con las clases de autenticación de DRF, o None"""
+    drf_request = Request(request, authenticators=[
+        authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
     try:
-        start_time = time.time()
-        
-        # Usar Gemini real
-        gemini_client = GeminiClient()
-        ai_result = gemini_client.analyze_food_image(image_data, image_format)
-        
-        processing_time = time.time() - start_time
-        
-        if ai_result['success']:
-            # Actualizar análisis con resultados exitosos
-            analysis.status = 'completed'
-            analysis.processing_time_seconds = processing_time
-            analysis.raw_ai_response = ai_result.get('raw_response')
-            analysis.gemini_request_tokens = ai_result.get('input_tokens', 0)
-            analysis.gemini_response_tokens = ai_result.get('output_tokens', 0)
-            analysis.gemini_cost_usd = ai_result.get('cost_usd', 0)
-            analysis.save()
-            
-            food_data = ai_result['food_data']
-            
-            # Crear ScannedFood si se identificó el alimento
-            if (food_data.get('food_name') and 
-                food_data['food_name'] != 'No identificado' and 
-                food_data.get('confidence') != 'bajo'):
-                
-                # Preparar datos para ScannedFood
-                nutrition_serving = food_data.get('nutrition_per_serving', {})
-                nutrition_100g = food_data.get('nutrition_per_100g', {})
-                
-                scanned_food_data = {
-                    'ai_identified_name': food_data['food_name'],
-                    'serving_size': food_data.get('serving_size', ''),
-                    'calories_per_serving': nutrition_serving.get('calories'),
-                    'protein_per_serving': nutrition_serving.get('protein_g'),
-                    'carbs_per_serving': nutrition_serving.get('carbs_g'),
-                    'fat_per_serving': nutrition_serving.get('fat_g'),
-                    'calories_per_100g': nutrition_100g.get('calories'),
-                    'protein_per_100g': nutrition_100g.get('protein_g'),
-                    'carbs_per_100g': nutrition_100g.get('carbs_g'),
-                    'fat_per_100g': nutrition_100g.get('fat_g'),
-                    'raw_ai_response': ai_result
-                }
-                
-                scanned_serializer = ScannedFoodCreateSerializer(
-                    data=scanned_food_data,
-                    context={'request': request}
-                )
-                
-                if scanned_serializer.is_valid():
-                    scanned_food = scanned_serializer.save()
-                    
-                    # Actualizar estadísticas de uso
-                    update_usage_stats(user, analysis, success=True)
-                    
-                    return Response({
-                        'analysis': ImageAnalysisSerializer(analysis).data,
-                        'scanned_food': scanned_serializer.data,
-                        'message': 'Análisis completado exitosamente'
-                    }, status=status.HTTP_201_CREATED)
-                else:
-                    # Si hay error en el serializer, aún devolvemos el análisis
-                    update_usage_stats(user, analysis, success=True)
-                    return Response({
-                        'analysis': ImageAnalysisSerializer(analysis).data,
-                        'message': 'Alimento identificado pero con problemas en los datos nutricionales',
-                        'food_data': food_data
-                    }, status=status.HTTP_200_OK)
-            else:
-                # No se pudo identificar el alimento
-                analysis.status = 'failed'
-                analysis.error_message = food_data.get('error', 'No se pudo identificar el alimento')
-                analysis.save()
-                
-                update_usage_stats(user, analysis, success=False)
-                
-                return Response({
-                    'analysis': ImageAnalysisSerializer(analysis).data,
-                    'message': 'No se pudo identificar el alimento en la imagen'
-                }, status=status.HTTP_200_OK)
-        else:
-            # Error en el análisis de Gemini
+        user = drf_request.user
+    except exceptions.AuthenticationFailed:
+        return None
+    return user if user.is_authenticated else None
+
+
+def json_response(body, response_status):
+    """Respuesta JSON renderizada igual que en las vistas de DRF"""
+    return HttpResponse(
+        JSONRenderer().render(body),
+        content_type='application/json',
+        status=response_status
+    )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def analyze_plate_image(request):
+    """
+    Endpoint para analizar un plato con varios alimentos en una sola llamada.
+    
+    Crea un ScannedFood por alimento y, con log_meal=true, los registra
+    directamente en el DailyLog del día indicado.
+    """
+    serializer = PlateAnalysisSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    analysis = ImageAnalysis.objects.create(
+        user=request.user,
+        image_size=len(data['image_data']),
+        image_format=data['image_format'],
+        analysis_mode='plate',
+        status='processing'
+    )
+    
+    result = run_plate_analysis(
+        analysis,
+        data['image_data'],
+        log_date=data['date'] if data['log_meal'] else None,
+        meal_type=data['meal_type']
+    )
+    
+    if result['outcome'] == 'created':
+        return Response({
+            'analysis': ImageAnalysisSerializer(analysis).data,
+            'scanned_foods': ScannedFoodSerializer(result['scanned_foods'], many=True).data,
+            'logged_items': LoggedFoodItemSerializer(result['logged_items'], many=True).data,
+            'daily_log_id': result['daily_log'].id if result['daily_log'] else None,
+            'message': f"Se identificaron {len(result['scanned_foods'])} alimentos"
+        }, status=status.HTTP_201_CREATED)
+    
+    return analysis_response(analysis, result)
+
+
+def start_analysis(user, validated_data):
+    """Crea el ImageAnalysis y lo procesa en el request o lo encola (async_mode)"""
+    image_bytes = validated_data['image_data']
+    async_mode = validated_data['async_mode']
+    
+    # Crear registro de análisis
+    analysis = ImageAnalysis.objects.create(
+        user=user,
+        image_size=len(image_bytes),
+        image_format=validated_data['image_format'],
+        status='pending' if async_mode else 'processing'
+    )
+    
+    if async_mode:
+        # El worker lleva el análisis a processing/completed/failed; el cliente
+        # consulta el estado en analyses/<id>/
+        if not enqueue_analysis(analysis, image_bytes):
             analysis.status = 'error'
-            analysis.error_message = ai_result.get('error', 'Error en el análisis de IA')
-            analysis.processing_time_seconds = processing_time
+            analysis.error_message = 'Cola de análisis llena'
             analysis.save()
-            
-            update_usage_stats(user, analysis, success=False)
-            
             return Response({
                 'analysis': ImageAnalysisSerializer(analysis).data,
-                'error': 'Error en el análisis de la imagen'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-    except Exception as e:
-        # Manejar errores generales
-        analysis.status = 'error'
-        analysis.error_message = str(e)
-        analysis.processing_time_seconds = time.time() - start_time if 'start_time' in locals() else 0
-        analysis.save()
-        
-        update_usage_stats(user, analysis, success=False)
+                'error': 'Servicio de análisis saturado, intenta nuevamente en unos segundos'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         
         return Response({
+            'analysis_id': analysis.id,
             'analysis': ImageAnalysisSerializer(analysis).data,
-            'error': f'Error inesperado: {str(e)}'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            'message': 'Análisis en cola'
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    result = run_analysis(analysis, image_bytes)
+    return analysis_response(analysis, result)
 
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def user_stats(request):
-    """Endpoint para obtener estadísticas del usuario"""
-    user = request.user
+def analyze_food_image_batch(request):
+    """
+    Endpoint para analizar varias imágenes en un solo request.
+    
+    Las llamadas a Gemini se hacen en paralelo, así que el tiempo total se
+    acerca al de la imagen más lenta. Cada resultado trae su propio 'status'
+    HTTP equivalente al del endpoint individual.
+    """
+    serializer = ImageAnalysisBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    items = run_batch_analysis(request.user, serializer.validated_data['images'])
+    # Una sola consulta para los scanned_foods anidados de todos los análisis
+    prefetch_related_objects([analysis for analysis, _ in items], 'scanned_foods')
+    
+    results = []
+    for analysis, result in items:
+        if result.get('scanned_food') is not None:
+            result['scanned_food_data'] = ScannedFoodSerializer(result['scanned_food']).data
+        body, item_status = analysis_payload(analysis, result)
+        body['status'] = item_status
+        results.append(body)
+    
+    return Response({
+        'results': results,
+        'count': len(results),
+        'completed': sum(1 for item in results if item['analysis']['status'] == 'completed')
+    }, status=status.HTTP_200_OK)
+
+
+def analysis_response(analysis, result):
+    """Construye la respuesta HTTP a partir del resultado de run_analysis"""
+    body, response_status = analysis_payload(analysis, result)
+    return Response(body, status=response_status)
+
+
+def analysis_payload(analysis, result):
+    """Cuerpo y status HTTP para el resultado de un análisis"""
+    outcome = result['outcome']
     
-    # Estadísticas generales
-    analyses = ImageAnalysis.objects.filter(user=user)
-    total_analyses = analyses.count()
-    successful_analyses = analyses.filter(status='completed').count()
-    failed_analyses = analyses.filter(status__in=['failed', 'error']).count()
+    if outcome == 'created':
+        return {
+            'analysis': ImageAnalysisSerializer(analysis).data,
+            'scanned_food': result['scanned_food_data'],
+            'message': 'Análisis completado exitosamente'
+        }, status.HTTP_201_CREATED
     
-    success_rate = (successful_analyses / total_analyses * 100) if total_analyses > 0 else 0
+    if outcome == 'invalid_nutrition':
+        # Si hay error en el serializer, aún devolvemos el análisis
+        return {
+            'analysis': ImageAnalysisSerializer(analysis).data,
+            'message': 'Alimento identificado pero con problemas en los datos nutricionales',
+            'food_data': result['food_data']
+        }, status.HTTP_200_OK
     
-    # Costos
-    total_cost = analyses.aggregate(Sum('gemini_cost_usd'))['gemini_cost_usd__sum'] or 0
-    avg_cost = total_cost / total_analyses if total_analyses > 0 else 0
+    if outcome == 'not_identified':
+        return {
+            'analysis': ImageAnalysisSerializer(analysis).data,
+            'message': 'No se pudo identificar el alimento en la imagen'
+        }, status.HTTP_200_OK
     
-    # Estadísticas del mes actual
-    current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_analyses = analyses.filter(created_at__gte=current_month)
-    analyses_this_month = monthly_analyses.count()
-    cost_this_month = monthly_analyses.aggregate(Sum('gemini_cost_usd'))['gemini_cost_usd__sum'] or 0
+    if outcome == 'unavailable':
+        # Circuit breaker abierto o cola de admisión llena: no se llamó a Gemini
+        return {
+            'analysis': ImageAnalysisSerializer(analysis).data,
+            'error': result['error']
+        }, status.HTTP_503_SERVICE_UNAVAILABLE
     
-    # Última fecha de análisis
-    last_analysis = analyses.order_by('-created_at').first()
-    last_analysis_date = last_analysis.created_at if last_analysis else None
+    return {
+        'analysis': ImageAnalysisSerializer(analysis).data,
+        'error': result['error']
+    }, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def user_stats(request):
+    """
+    Endpoint para obtener estadísticas del usuario
     
-    stats_data = {
-        'total_analyses': total_analyses,
-        'successful_analyses': successful_analyses,
-        'failed_analyses': failed_analyses,
-        'success_rate': round(success_rate, 2),
-        'total_cost': total_cost,
-        'average_cost_per_analysis': round(avg_cost, 6),
-        'last_analysis_date': last_analysis_date,
-        'analyses_this_month': analyses_this_month,
-        'cost_this_month': cost_this_month,
-    }
+    Se calculan desde los rollups mensuales y diarios y se guardan en cache
+    por usuario (AI_USER_STATS_CACHE_SECONDS); la cache se invalida cuando
+    termina un análisis nuevo.
+    """
+    cache_key = user_stats_cache_key(request.user.id)
+    data = cache.get(cache_key)
+    if data is None:
+        serializer = UserStatsSerializer(compute_user_stats(request.user))
+        data = serializer.data
+        cache.set(cache_key, data, getattr(settings, 'AI_USER_STATS_CACHE_SECONDS', 60))
     
-    serializer = UserStatsSerializer(stats_data)
-    return Response(serializer.data)
+    return Response(data)
 
 
 @api_view(['GET'])
@@ -216,7 +390,7 @@ def user_stats(request):
 def usage_stats_by_date(request):
     """Endpoint para obtener estadísticas por fecha"""
     user = request.user
-    days = int(request.query_params.get('days', 30))
+    days = int_query_param(request, 'days', 30, MAX_STATS_DAYS)
     
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days-1)
@@ -233,32 +407,114 @@ def usage_stats_by_date(request):
     })
 
 
-def update_usage_stats(user, analysis, success=True):
-    """Actualizar estadísticas de uso diarias"""
-    today = timezone.now().date()
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def usage_stats_by_month(request):
+    """Endpoint para obtener estadísticas por mes (rollup mensual)"""
+    months = int_query_param(request, 'months', 12, MAX_STATS_MONTHS)
+    start_month = months_ago(timezone.now().date(), months - 1)
     
-    stats, created = GeminiUsageStats.objects.get_or_create(
-        user=user,
-        date=today,
-        defaults={
-            'total_requests': 0,
-            'total_input_tokens': 0,
-            'total_output_tokens': 0,
-            'total_cost_usd': 0,
-            'successful_analyses': 0,
-            'failed_analyses': 0,
-        }
-    )
+    stats = GeminiUsageMonthlyStats.objects.filter(
+        user=request.user,
+        month__gte=start_month
+    ).order_by('month')
     
-    # Actualizar estadísticas
-    stats.total_requests += 1
-    stats.total_input_tokens += analysis.gemini_request_tokens or 0
-    stats.total_output_tokens += analysis.gemini_response_tokens or 0
-    stats.total_cost_usd += analysis.gemini_cost_usd or 0
+    serializer = GeminiUsageMonthlyStatsSerializer(stats, many=True)
+    return Response({
+        'period': f'{start_month:%Y-%m} - {timezone.now():%Y-%m}',
+        'stats': serializer.data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def global_usage_stats(request):
+    """
+    Endpoint (staff) con el uso de Gemini de todos los usuarios.
     
-    if success:
-        stats.successful_analyses += 1
+    period=day (últimos `days` días, por defecto 30) o period=month (últimos
+    `months` meses, por defecto 12). Lee los rollups globales.
+    """
+    today = timezone.now().date()
+    if request.query_params.get('period', 'day') == 'month':
+        start = months_ago(today, int_query_param(request, 'months', 12, MAX_STATS_MONTHS) - 1)
+        stats = GeminiGlobalMonthlyStats.objects.filter(month__gte=start).order_by('month')
+        serializer = GeminiGlobalMonthlyStatsSerializer(stats, many=True)
     else:
-        stats.failed_analyses += 1
+        start = today - timedelta(days=int_query_param(request, 'days', 30, MAX_STATS_DAYS) - 1)
+        stats = GeminiGlobalDailyStats.objects.filter(date__gte=start).order_by('date')
+        serializer = GeminiGlobalDailyStatsSerializer(stats, many=True)
+    
+    return Response({
+        'period': f'{start} - {today}',
+        'stats': serializer.data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def gemini_analytics(request):
+    """
+    Endpoint (staff) con percentiles de latencia, tasa de fallos y costo.
     
-    stats.save()
\ No newline at end of file
+    granularity=hour (por defecto, últimas 24 horas) o granularity=day (por
+    defecto, últimos 30 días); `days` cambia el rango. Lee el histograma de
+    latencias que se actualiza al terminar cada análisis.
+    """
+    granularity = request.query_params.get('granularity', 'hour')
+    if granularity not in ('hour', 'day'):
+        return Response(
+            {'error': "granularity debe ser 'hour' o 'day'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if granularity == 'hour':
+        days = int_query_param(request, 'days', 1, MAX_HOURLY_ANALYTICS_DAYS)
+    else:
+        days = int_query_param(request, 'days', 30, MAX_STATS_DAYS)
+    until = timezone.now()
+    return Response(latency_analytics(until - timedelta(days=days), until, granularity))
+
+
+# Rangos máximos de las estadísticas; valores mayores se recortan
+MAX_STATS_DAYS = 366
+MAX_STATS_MONTHS = 60
+MAX_HOURLY_ANALYTICS_DAYS = 31
+
+
+def int_query_param(request, name, default, maximum):
+    """
+    Entero positivo del query param `name`, recortado a [1, maximum].
+
+    Si el valor no es un número entero responde 400 (ValidationError).
+    """
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise exceptions.ValidationError({name: 'Debe ser un número entero'})
+    return max(1, min(value, maximum))
+
+
+def months_ago(day, months):
+    """Primer día del mes que está `months` meses antes del de `day`"""
+    index = day.year * 12 + day.month - 1 - months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def gemini_status(request):
+    """Endpoint (staff) con el estado del circuit breaker, reintentos, cola de admisión y context caching"""
+    client = get_gemini_client()
+    controller = get_admission_controller()
+    return Response({
+        'model': client.model_name,
+        'timeout_seconds': client.timeout,
+        'max_retries': client.max_retries,
+        'breaker': client.breaker.snapshot(),
+        'context_cache': client.prompt_cache.stats() if client.prompt_cache else None,
+        'admission': controller.stats() if controller else None,
+    })
@@ -0,0 +1,108 @@
+# ai_analysis/workers.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .gemini_client import get_gemini_client
+from .models import ImageAnalysis
+from .services import run_analysis
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_queue_slots = None
+
+
+def get_executor():
+    """Pool de workers del proceso, creado la primera vez que se necesita"""
+    global _executor, _queue_slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'AI_ANALYSIS_WORKERS', 4)
+                queue_size = getattr(settings, 'AI_ANALYSIS_QUEUE_SIZE', 100)
+                _queue_slots = threading.BoundedSemaphore(workers + queue_size)
+                _executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='ai-analysis'
+                )
+    return _executor
+
+
+def enqueue_analysis(analysis, image_bytes):
+    """
+    Encola un ImageAnalysis en estado 'pending' para procesarlo en segundo plano.
+
+    La imagen sólo vive en memoria hasta que el worker la procesa (no se guarda).
+    Devuelve False si la cola está llena. Dentro de una transacción el
+    análisis se encola recién al hacer commit; si para entonces la cola se
+    llenó, queda en 'error' (el cliente lo ve al consultar el estado).
+    """
+    executor = get_executor()
+    accepted = []
+
+    def submit():
+        # El cupo se toma al encolar de verdad: si la transacción se revierte
+        # submit no corre y no queda ningún cupo tomado
+        if not _queue_slots.acquire(blocking=False):
+            ImageAnalysis.objects.filter(pk=analysis.pk, status='pending').update(
+                status='error', error_message='Cola de análisis llena'
+            )
+            accepted.append(False)
+            return
+        try:
+            executor.submit(_process_analysis, analysis.pk, image_bytes)
+        except Exception:
+            _queue_slots.release()
+            raise
+        accepted.append(True)
+
+    # Si hay una transacción abierta, esperar a que el registro sea visible;
+    # si no, submit corre acá mismo
+    transaction.on_commit(submit)
+    return accepted[0] if accepted else True
+
+
+def _process_analysis(analysis_id, image_bytes):
+    """Tarea del worker: lleva el análisis de pending a completed/failed/error"""
+    close_old_connections()
+    try:
+        # Reclamar el análisis de forma atómica para no procesarlo dos veces
+        claimed = ImageAnalysis.objects.filter(
+            pk=analysis_id, status='pending'
+        ).update(status='processing')
+        if not claimed:
+            return
+
+        analysis = ImageAnalysis.objects.select_related('user').get(pk=analysis_id)
+        _wait_for_gemini()
+        run_analysis(analysis, image_bytes)
+    except Exception:
+        logger.exception('Error procesando análisis %s en segundo plano', analysis_id)
+        ImageAnalysis.objects.filter(
+            pk=analysis_id, status__in=['pending', 'processing']
+        ).update(status='error', error_message='Error inesperado en el worker de análisis')
+    finally:
+        _queue_slots.release()
+        close_old_connections()
+
+
+def _wait_for_gemini():
+    """
+    Si el circuit breaker está abierto, espera (hasta AI_ANALYSIS_BREAKER_WAIT_SECONDS)
+    a que deje pasar llamadas en vez de fallar de inmediato: el cliente ya
+    recibió un 202 y puede esperar.
+    """
+    breaker = getattr(get_gemini_client(), 'breaker', None)
+    if breaker is None:
+        return
+
+    deadline = time.monotonic() + getattr(settings, 'AI_ANALYSIS_BREAKER_WAIT_SECONDS', 60)
+    while True:
+        delay = breaker.seconds_until_retry()
+        if delay <= 0 or time.monotonic() + delay > deadline:
+            return
+        time.sleep(delay)
@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import IdempotencyKey
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """Admin para IdempotencyKey"""
+    list_display = ('user', 'endpoint', 'key', 'state', 'response_status', 'created_at', 'expires_at')
+    list_filter = ('state', 'endpoint', 'created_at')
+    search_fields = ('user__email', 'key')
+    readonly_fields = ('fingerprint', 'response_body', 'created_at')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
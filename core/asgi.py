@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+El endpoint /api/ai/analyze/async/ es una vista async: servido con un
+servidor ASGI (por ejemplo `uvicorn core.asgi:application --workers 2`) cada
+worker puede tener cientos de análisis esperando a Gemini sin ocupar hilos.
+Para comparar con el camino WSGI (gunicorn core.wsgi:application sirviendo
+analyze/): `python manage.py benchmark_analysis`.
 """
 
 import os
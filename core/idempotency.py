@@ -0,0 +1,156 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+POLL_INTERVAL = 0.1
+
+
+def idempotent(view):
+    """
+    Hace idempotente una vista de DRF con el header Idempotency-Key.
+
+    Va debajo de @api_view/@permission_classes (la vista ya recibe el usuario
+    autenticado). Sin header la vista se ejecuta normal. Con header:
+
+    - la primera vez se ejecuta la vista y se guarda su respuesta por
+      IDEMPOTENCY_KEY_TTL_SECONDS;
+    - un reintento con la misma clave y los mismos datos recibe la respuesta
+      guardada (header Idempotent-Replayed: true);
+    - si el primer request todavía está en curso, el reintento espera hasta
+      IDEMPOTENCY_WAIT_SECONDS su resultado y, si no llega, recibe 409;
+    - la misma clave con otros datos recibe 422.
+
+    Las respuestas 5xx y las excepciones no se guardan para que el cliente
+    pueda reintentar.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} debe tener como máximo 255 caracteres'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        record = claim_key(request.user, request.path, key, fingerprint)
+
+        if record is None:
+            # Somos los primeros con esta clave: ejecutar la vista
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                release_key(request.user, request.path, key)
+                raise
+            save_response(request.user, request.path, key, response)
+            return response
+
+        if record.fingerprint != fingerprint:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} ya se usó con otros datos'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        record = wait_for_completion(record)
+        if record is None:
+            # El primer request falló y liberó la clave: reintentar de cero
+            return wrapper(request, *args, **kwargs)
+        if record.state != 'completed':
+            return Response(
+                {'error': 'Un request con la misma clave todavía está en curso'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response(
+            record.response_body,
+            status=record.response_status,
+            headers={'Idempotent-Replayed': 'true'}
+        )
+
+    return wrapper
+
+
+def request_fingerprint(request):
+    """Hash del método, la ruta y los datos ya parseados del request"""
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(payload.encode())
+    return digest.hexdigest()
+
+
+def claim_key(user, endpoint, key, fingerprint):
+    """
+    Intenta reservar la clave. Devuelve None si se reservó (hay que ejecutar
+    la vista) o el IdempotencyKey existente.
+    """
+    now = timezone.now()
+    ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', 86400)
+
+    # Una clave vencida, o que quedó 'processing' porque el proceso murió,
+    # se puede volver a usar
+    lock_seconds = getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 284)
+    IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).filter(
+        Q(expires_at__lt=now) |
+        Q(state='processing', created_at__lt=now - timedelta(seconds=lock_seconds))
+    ).delete()
+
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                user=user,
+                endpoint=endpoint,
+                key=key,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=ttl)
+            )
+        return None
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).first()
+        if record is None:
+            # Se liberó entre el create y la consulta
+            return claim_key(user, endpoint, key, fingerprint)
+        return record
+
+
+def wait_for_completion(record):
+    """Espera a que el request original termine; None si liberó la clave"""
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 35)
+    while record.state != 'completed' and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+    return record
+
+
+def save_response(user, endpoint, key, response):
+    """Guarda la respuesta para los reintentos, o libera la clave si no se puede repetir"""
+    data = getattr(response, 'data', None)
+    if response.status_code >= 500 or data is None:
+        release_key(user, endpoint, key)
+        return
+
+    IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).update(
+        state='completed',
+        response_status=response.status_code,
+        response_body=json.loads(json.dumps(data, cls=JSONEncoder))
+    )
+
+
+def release_key(user, endpoint, key):
+    IdempotencyKey.objects.filter(
+        user=user, endpoint=endpoint, key=key, state='processing'
+    ).delete()
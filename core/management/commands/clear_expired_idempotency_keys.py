@@ -0,0 +1,12 @@
+# core/management/commands/clear_expired_idempotency_keys.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Elimina las claves de idempotencia vencidas (para correr desde cron)'
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} claves eliminadas'))
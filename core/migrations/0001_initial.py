@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='Clave')),
+                ('endpoint', models.CharField(max_length=255, verbose_name='Endpoint')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Huella del request')),
+                ('state', models.CharField(choices=[('processing', 'Procesando'), ('completed', 'Completado')], default='processing', max_length=20, verbose_name='Estado')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Status HTTP')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='Respuesta')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(verbose_name='Expira')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Clave de Idempotencia',
+                'verbose_name_plural': 'Claves de Idempotencia',
+                'indexes': [models.Index(fields=['expires_at'], name='core_idempo_expires_6bf43d_idx')],
+                'unique_together': {('user', 'endpoint', 'key')},
+            },
+        ),
+    ]
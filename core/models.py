@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import models
+
+
+class IdempotencyKey(models.Model):
+    """
+    Respuesta guardada de un request con header Idempotency-Key.
+
+    Si el cliente reintenta con la misma clave se devuelve la respuesta
+    guardada sin volver a ejecutar la vista. `fingerprint` identifica el
+    request original para rechazar una clave reutilizada con otros datos.
+    """
+
+    STATE_CHOICES = [
+        ('processing', 'Procesando'),
+        ('completed', 'Completado'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Usuario'
+    )
+    key = models.CharField('Clave', max_length=255)
+    endpoint = models.CharField('Endpoint', max_length=255)
+    fingerprint = models.CharField('Huella del request', max_length=64)
+    state = models.CharField('Estado', max_length=20, choices=STATE_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField('Status HTTP', null=True, blank=True)
+    response_body = models.JSONField('Respuesta', null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField('Expira')
+
+    def __str__(self):
+        return f"{self.user.email} {self.endpoint} {self.key}"
+
+    class Meta:
+        verbose_name = 'Clave de Idempotencia'
+        verbose_name_plural = 'Claves de Idempotencia'
+        unique_together = ['user', 'endpoint', 'key']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
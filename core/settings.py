@@ -31,6 +31,7 @@ INSTALLED_APPS = [
     'dj_rest_auth',
     
     # Local apps
+    'core',
     'users',
     'nutrition',
     'foods',
@@ -104,6 +105,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -180,6 +182,106 @@ AUTH_USER_MODEL = 'users.User'
 
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL_NAME', 'gemini-1.5-flash')
+# Modelos de más barato a más capaz, separados por coma: se escala al siguiente
+# sólo si la respuesta viene con confianza 'bajo' o no se puede parsear
+GEMINI_MODEL_TIERS = [
+    name.strip() for name in
+    os.getenv('GEMINI_MODEL_TIERS', f'gemini-1.5-flash-8b,{GEMINI_MODEL_NAME}').split(',')
+    if name.strip()
+]
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT', 'grpc')  # grpc | rest
+GEMINI_TIMEOUT_SECONDS = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '30'))
+GEMINI_POOL_SIZE = int(os.getenv('GEMINI_POOL_SIZE', '10'))  # Llamadas simultáneas por proceso
+# Pedir JSON con response_schema en vez de texto libre
+GEMINI_STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED_OUTPUT', 'True').lower() == 'true'
+# Context caching del prompt fijo (CachedContent). Gemini exige un mínimo de
+# tokens por cache; si el prompt no llega se usa system_instruction
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv('GEMINI_CONTEXT_CACHE_ENABLED', 'False').lower() == 'true'
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL_SECONDS', '3600'))
+
+# Precios en USD por 1M tokens (actualizar según documentación de Google).
+# 'cached_input' se aplica a los tokens servidos desde context caching.
+GEMINI_PRICING = {
+    'gemini-1.5-flash-8b': {'input': '0.0375', 'output': '0.15', 'cached_input': '0.01'},
+    'gemini-1.5-flash': {'input': '0.15', 'output': '0.60', 'cached_input': '0.0375'},
+    'gemini-1.5-pro': {'input': '1.25', 'output': '5.00', 'cached_input': '0.3125'},
+    'gemini-2.0-flash': {'input': '0.10', 'output': '0.40', 'cached_input': '0.025'},
+}
+
+# Reintentos y circuit breaker para Gemini
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))  # Sólo errores transitorios (503, 429, timeouts)
+GEMINI_RETRY_BASE_DELAY = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '0.5'))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv('GEMINI_RETRY_MAX_DELAY', '4'))
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.getenv('GEMINI_BREAKER_FAILURE_THRESHOLD', '5'))  # Fallos seguidos para abrir
+GEMINI_BREAKER_RECOVERY_SECONDS = float(os.getenv('GEMINI_BREAKER_RECOVERY_SECONDS', '30'))
+# Peor caso de un análisis: escala por todos los GEMINI_MODEL_TIERS y cada
+# llamada agota sus reintentos (timeout más la espera máxima entre intentos)
+GEMINI_ANALYSIS_MAX_SECONDS = (
+    len(GEMINI_MODEL_TIERS) * (GEMINI_MAX_RETRIES + 1) * (GEMINI_TIMEOUT_SECONDS + GEMINI_RETRY_MAX_DELAY)
+)
+
+# Control de admisión: máximo de llamadas a Gemini en curso entre todos los procesos
+GEMINI_ADMISSION_ENABLED = os.getenv('GEMINI_ADMISSION_ENABLED', 'True').lower() == 'true'
+GEMINI_ADMISSION_DB_PATH = os.getenv('GEMINI_ADMISSION_DB_PATH', str(BASE_DIR / 'gemini_admission.sqlite3'))
+GEMINI_MAX_IN_FLIGHT = int(os.getenv('GEMINI_MAX_IN_FLIGHT', '8'))
+GEMINI_ADMISSION_QUEUE_SIZE = int(os.getenv('GEMINI_ADMISSION_QUEUE_SIZE', '50'))
+GEMINI_ADMISSION_TIMEOUT_SECONDS = float(os.getenv('GEMINI_ADMISSION_TIMEOUT_SECONDS', '20'))
+
+# Análisis asíncrono (/api/ai/analyze/ con async_mode=true)
+AI_ANALYSIS_WORKERS = int(os.getenv('AI_ANALYSIS_WORKERS', '4'))  # Hilos por proceso
+AI_ANALYSIS_QUEUE_SIZE = int(os.getenv('AI_ANALYSIS_QUEUE_SIZE', '100'))  # Análisis en espera por proceso
+AI_ANALYSIS_BREAKER_WAIT_SECONDS = float(os.getenv('AI_ANALYSIS_BREAKER_WAIT_SECONDS', '60'))  # Espera si Gemini está caído
+AI_ANALYSIS_STALE_SECONDS = int(os.getenv('AI_ANALYSIS_STALE_SECONDS', '1800'))  # fail_stale_analyses: pending/processing abandonados
+
+# Análisis en lote (/api/ai/analyze/batch/)
+AI_BATCH_MAX_IMAGES = int(os.getenv('AI_BATCH_MAX_IMAGES', '10'))
+AI_BATCH_MAX_CONCURRENCY = int(os.getenv('AI_BATCH_MAX_CONCURRENCY', '4'))  # Llamadas a Gemini en paralelo
+
+# Estadísticas de uso: acumular en memoria y escribir cada N segundos o N eventos
+AI_USAGE_STATS_BUFFER_ENABLED = os.getenv('AI_USAGE_STATS_BUFFER_ENABLED', 'False').lower() == 'true'
+AI_USAGE_STATS_FLUSH_SECONDS = float(os.getenv('AI_USAGE_STATS_FLUSH_SECONDS', '5'))
+AI_USAGE_STATS_FLUSH_EVENTS = int(os.getenv('AI_USAGE_STATS_FLUSH_EVENTS', '100'))
+AI_USER_STATS_CACHE_SECONDS = int(os.getenv('AI_USER_STATS_CACHE_SECONDS', '60'))  # Cache de /api/ai/stats/
+
+# Header Idempotency-Key (analyze y quick-log)
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_KEY_TTL_SECONDS', '86400'))  # Cuánto se guarda la respuesta
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '35'))  # Espera de un reintento concurrente
+# Tras esto se libera una clave 'processing'. Tiene que superar lo que puede
+# durar el análisis más lento (espera en la cola de admisión incluida); si no,
+# un reintento volvería a ejecutar un análisis que sigue en curso
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv(
+    'IDEMPOTENCY_LOCK_SECONDS',
+    str(int(GEMINI_ANALYSIS_MAX_SECONDS + GEMINI_ADMISSION_TIMEOUT_SECONDS + 60))
+))
+
+# Preprocesamiento de imágenes antes de Gemini (Pillow, en un pool de procesos)
+AI_IMAGE_MAX_EDGE = int(os.getenv('AI_IMAGE_MAX_EDGE', '1024'))  # Lado mayor en píxeles
+AI_IMAGE_JPEG_QUALITY = int(os.getenv('AI_IMAGE_JPEG_QUALITY', '85'))
+AI_IMAGE_PROCESS_WORKERS = int(os.getenv('AI_IMAGE_PROCESS_WORKERS', '2'))  # 0 = en el mismo hilo
+AI_IMAGE_PROCESS_TIMEOUT_SECONDS = float(os.getenv('AI_IMAGE_PROCESS_TIMEOUT_SECONDS', '10'))
+
+# Cache de resultados para imágenes repetidas (hash perceptual, por proceso)
+AI_IMAGE_CACHE_ENABLED = os.getenv('AI_IMAGE_CACHE_ENABLED', 'True').lower() == 'true'
+AI_IMAGE_CACHE_MAX_DISTANCE = int(os.getenv('AI_IMAGE_CACHE_MAX_DISTANCE', '4'))  # Bits de diferencia (de 64)
+# Fotos con menos textura que esto (plato liso, cuadro oscuro) sólo coinciden con bytes idénticos
+AI_IMAGE_CACHE_MIN_DETAIL = float(os.getenv('AI_IMAGE_CACHE_MIN_DETAIL', '6'))
+AI_IMAGE_CACHE_MAX_COLOR_DISTANCE = int(os.getenv('AI_IMAGE_CACHE_MAX_COLOR_DISTANCE', '24'))  # Por canal y cuadrante (0-255)
+AI_IMAGE_CACHE_TTL_SECONDS = int(os.getenv('AI_IMAGE_CACHE_TTL_SECONDS', '86400'))
+AI_IMAGE_CACHE_MAX_ENTRIES = int(os.getenv('AI_IMAGE_CACHE_MAX_ENTRIES', '1024'))
+
+# Autocompletado de alimentos (/api/foods/autocomplete/): índice en memoria por proceso
+FOOD_AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv('FOOD_AUTOCOMPLETE_MAX_ENTRIES', '500000'))  # Claves indexadas
+FOOD_AUTOCOMPLETE_REBUILD_SECONDS = int(os.getenv('FOOD_AUTOCOMPLETE_REBUILD_SECONDS', '600'))  # Ver cambios de otros workers
+FOOD_AUTOCOMPLETE_RANK_WINDOW = int(os.getenv('FOOD_AUTOCOMPLETE_RANK_WINDOW', '5000'))  # Entradas rankeadas por consulta
+
+# Búsqueda por código de barras (/api/foods/barcode/<code>/). Los tiempos
+# completos necesitan una cache compartida entre workers (CACHES con Redis o
+# memcached); con la LocMemCache por defecto se limitan a
+# FOOD_BARCODE_LOCAL_CACHE_SECONDS porque la invalidación no llega a los otros procesos
+FOOD_BARCODE_CACHE_SECONDS = int(os.getenv('FOOD_BARCODE_CACHE_SECONDS', '3600'))
+FOOD_BARCODE_NEGATIVE_CACHE_SECONDS = int(os.getenv('FOOD_BARCODE_NEGATIVE_CACHE_SECONDS', '300'))  # Códigos sin alimento
+FOOD_BARCODE_LOCAL_CACHE_SECONDS = int(os.getenv('FOOD_BARCODE_LOCAL_CACHE_SECONDS', '5'))
 
 # Logging
 LOGGING = {
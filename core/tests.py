@@ -0,0 +1,104 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import User
+from . import idempotency
+from .idempotency import idempotent
+from .models import IdempotencyKey
+
+
+class IdempotentViewTests(TestCase):
+    """@idempotent: respuesta repetida, espera al request en curso y claves liberadas"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='idempotencia@example.com', password='x')
+        self.factory = APIRequestFactory()
+        self.calls = 0
+        self.response_status = status.HTTP_201_CREATED
+        self.error = None
+
+        @api_view(['POST'])
+        @idempotent
+        def view(request):
+            self.calls += 1
+            if self.error is not None:
+                raise self.error
+            return Response({'call': self.calls}, status=self.response_status)
+
+        self.view = view
+
+    def post(self, data=None, key='clave-1'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        request = self.factory.post('/api/recurso/', data or {'name': 'manzana'}, format='json', **headers)
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def test_without_header_runs_every_time(self):
+        self.post(key=None)
+        self.post(key=None)
+
+        self.assertEqual(self.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_retry_replays_saved_response(self):
+        first = self.post()
+        retry = self.post()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_same_key_with_other_data_is_rejected(self):
+        self.post()
+
+        response = self.post({'name': 'pera'})
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(self.calls, 1)
+
+    def test_retry_waits_for_request_in_progress(self):
+        self.post()
+        IdempotencyKey.objects.update(state='processing')
+
+        def finish_original(seconds):
+            IdempotencyKey.objects.update(state='completed')
+
+        with mock.patch.object(idempotency.time, 'sleep', side_effect=finish_original) as sleep:
+            response = self.post()
+
+        sleep.assert_called_once()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_request_still_in_progress_is_conflict(self):
+        self.post()
+        IdempotencyKey.objects.update(state='processing')
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.calls, 1)
+
+    def test_server_error_releases_key(self):
+        self.response_status = status.HTTP_503_SERVICE_UNAVAILABLE
+        self.post()
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.response_status = status.HTTP_201_CREATED
+        response = self.post()
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_exception_releases_key(self):
+        self.error = RuntimeError('falló')
+        with self.assertRaises(RuntimeError):
+            self.post()
+
+        self.assertFalse(IdempotencyKey.objects.exists())
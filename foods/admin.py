@@ -9,11 +9,11 @@ class FoodAdmin(admin.ModelAdmin):
                    'is_verified', 'created_by', 'created_at')
     list_filter = ('is_verified', 'brand', 'created_at')
     search_fields = ('name', 'brand', 'barcode')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('barcode_normalized', 'created_at', 'updated_at')
     
     fieldsets = (
         ('Información Básica', {
-            'fields': ('name', 'brand', 'barcode')
+            'fields': ('name', 'brand', 'barcode', 'barcode_normalized')
         }),
         ('Información Nutricional (por 100g)', {
             'fields': ('calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g')
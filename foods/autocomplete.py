@@ -0,0 +1,232 @@
+# foods/autocomplete.py
+import bisect
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from .normalization import normalize_search_key
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """
+    Índice de prefijos en memoria para autocompletar nombres de alimentos.
+
+    Guarda un arreglo ordenado de claves normalizadas (nombre completo, marca
+    y el nombre desde cada palabra, para que "plat" encuentre "Chips de
+    plátano") y busca con bisect. Cada entrada es una tupla (clave, food_id);
+    los datos a mostrar se guardan una vez por alimento.
+
+    `max_entries` limita la memoria: al llegar al límite no se agregan más
+    alimentos hasta que se libere espacio. `rank_window` limita cuántas
+    entradas se rankean por consulta (ver complete()).
+    """
+
+    def __init__(self, max_entries=500000, rank_window=5000):
+        self.max_entries = max_entries
+        self.rank_window = rank_window
+        self._entries = []
+        self._foods = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._foods)
+
+    def build(self, rows):
+        """Reemplaza el contenido con `rows` (iterable de (id, name, brand))"""
+        entries = []
+        foods = {}
+        for food_id, name, brand in rows:
+            keys = self._keys(name, brand)
+            if len(entries) + len(keys) > self.max_entries:
+                logger.warning('Índice de autocompletado lleno (%s entradas)', self.max_entries)
+                break
+            foods[food_id] = (name, brand, keys)
+            entries.extend((key, food_id) for key in keys)
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._foods = foods
+
+    def add(self, food_id, name, brand):
+        """Agrega o actualiza un alimento"""
+        keys = self._keys(name, brand)
+        with self._lock:
+            self._remove(food_id)
+            if len(self._entries) + len(keys) > self.max_entries:
+                return
+            self._foods[food_id] = (name, brand, keys)
+            for key in keys:
+                bisect.insort(self._entries, (key, food_id))
+
+    def remove(self, food_id):
+        with self._lock:
+            self._remove(food_id)
+
+    def complete(self, prefix, limit=10):
+        """
+        Hasta `limit` alimentos cuyo nombre o marca empieza con `prefix`.
+
+        Primero los que empiezan así desde el comienzo del nombre, después
+        los que coinciden en otra palabra o en la marca; a igualdad, los
+        nombres más cortos.
+
+        Se rankean todas las entradas que empiezan con `prefix`, hasta
+        `rank_window`: con prefijos muy cortos ("a") en un catálogo grande
+        sólo entran las primeras `rank_window` en orden alfabético, así el
+        costo de una consulta no crece con el catálogo.
+        """
+        prefix = normalize_search_key(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            start = bisect.bisect_left(self._entries, (prefix,))
+            end = bisect.bisect_left(self._entries, (prefix + '\uffff',), start)
+            candidates = {}
+            for key, food_id in self._entries[start:min(end, start + self.rank_window)]:
+                name, brand, keys = self._foods[food_id]
+                rank = (key != keys[0], len(name))
+                if food_id not in candidates or rank < candidates[food_id][0]:
+                    candidates[food_id] = (rank, name, brand)
+
+        ranked = sorted(candidates.items(), key=lambda item: (item[1][0], item[1][1]))
+        return [
+            {'id': food_id, 'name': name, 'brand': brand}
+            for food_id, (_, name, brand) in ranked[:limit]
+        ]
+
+    def _remove(self, food_id):
+        food = self._foods.pop(food_id, None)
+        if food is None:
+            return
+        for key in food[2]:
+            index = bisect.bisect_left(self._entries, (key, food_id))
+            if index < len(self._entries) and self._entries[index] == (key, food_id):
+                del self._entries[index]
+
+    @staticmethod
+    def _keys(name, brand):
+        """Claves del alimento; la primera siempre es el nombre completo"""
+        name_key = normalize_search_key(name)
+        words = name_key.split(' ')
+        keys = [name_key]
+        keys.extend(' '.join(words[i:]) for i in range(1, len(words)))
+        brand_key = normalize_search_key(brand)
+        if brand_key:
+            keys.append(brand_key)
+        # Sin repetidas, conservando el nombre completo primero
+        return tuple(dict.fromkeys(key for key in keys if key))
+
+
+# Clave en la cache compartida que cambia cuando hay que reconstruir el
+# índice en todos los workers (por ejemplo, después de import_foods)
+INDEX_VERSION_KEY = 'foods:autocomplete:version'
+
+_index = None
+_index_built_at = 0
+_index_version = None
+_index_lock = threading.Lock()
+# Cambios de alimentos confirmados mientras se reconstruye el índice
+_changes_lock = threading.Lock()
+_pending_changes = None
+
+
+def get_autocomplete_index():
+    """
+    Índice del proceso, construido la primera vez que se usa.
+
+    Los cambios hechos en este proceso llegan por señales (ver signals.py);
+    para ver los de otros workers se reconstruye cada
+    FOOD_AUTOCOMPLETE_REBUILD_SECONDS, o cuando cambia INDEX_VERSION_KEY
+    (request_rebuild), en un hilo aparte, mientras se sigue respondiendo con
+    el índice anterior.
+    """
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _rebuild_index()
+    elif _is_stale() and _index_lock.acquire(blocking=False):
+        def rebuild():
+            try:
+                _rebuild_index()
+            except Exception:
+                logger.exception('No se pudo reconstruir el índice de autocompletado')
+            finally:
+                close_old_connections()
+                _index_lock.release()
+        threading.Thread(target=rebuild, name='food-autocomplete', daemon=True).start()
+    return _index
+
+
+def request_rebuild():
+    """
+    Pide que todos los workers reconstruyan su índice en la próxima consulta.
+
+    Para escrituras que no disparan señales (bulk_create/bulk_update). Llega
+    a los otros procesos sólo con una cache compartida (Redis, memcached);
+    con LocMemCache los demás lo ven en la reconstrucción periódica.
+    """
+    cache.set(INDEX_VERSION_KEY, time.time(), None)
+
+
+def apply_food_change(food_id, name='', brand='', verified=False):
+    """
+    Aplica al índice del proceso un alimento guardado (o borrado, con
+    verified=False).
+
+    Si hay una reconstrucción en curso el cambio también se anota, para
+    aplicarlo al índice nuevo: la lectura de la base pudo haber empezado
+    antes de que se confirmara.
+    """
+    with _changes_lock:
+        if _pending_changes is not None:
+            _pending_changes.append((food_id, name, brand, verified))
+        if _index is not None:
+            _apply_change(_index, food_id, name, brand, verified)
+
+
+def _apply_change(index, food_id, name, brand, verified):
+    if verified:
+        index.add(food_id, name, brand)
+    else:
+        index.remove(food_id)
+
+
+def _is_stale():
+    if time.monotonic() - _index_built_at > getattr(settings, 'FOOD_AUTOCOMPLETE_REBUILD_SECONDS', 600):
+        return True
+    return cache.get(INDEX_VERSION_KEY) != _index_version
+
+
+def _rebuild_index():
+    global _index, _index_built_at, _index_version, _pending_changes
+    # La versión se lee antes que la base: si cambia durante la lectura, la
+    # próxima consulta vuelve a reconstruir
+    version = cache.get(INDEX_VERSION_KEY)
+    with _changes_lock:
+        _pending_changes = []
+    try:
+        index = PrefixIndex(
+            max_entries=getattr(settings, 'FOOD_AUTOCOMPLETE_MAX_ENTRIES', 500000),
+            rank_window=getattr(settings, 'FOOD_AUTOCOMPLETE_RANK_WINDOW', 5000)
+        )
+        index.build(_verified_foods())
+    except BaseException:
+        with _changes_lock:
+            _pending_changes = None
+        raise
+    with _changes_lock:
+        for change in _pending_changes:
+            _apply_change(index, *change)
+        _pending_changes = None
+        _index, _index_built_at, _index_version = index, time.monotonic(), version
+
+
+def _verified_foods():
+    from .models import Food
+    return Food.objects.filter(is_verified=True).values_list('id', 'name', 'brand').iterator(chunk_size=5000)
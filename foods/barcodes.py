@@ -0,0 +1,67 @@
+# foods/barcodes.py
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from .models import Food
+from .normalization import normalize_barcode
+from .serializers import FoodSerializer
+
+# Marca en cache de "no existe ningún alimento con este código"
+MISSING = 'missing'
+
+
+def barcode_cache_key(barcode_normalized):
+    return f'foods:barcode:{barcode_normalized}'
+
+
+def cache_seconds(setting, default):
+    """
+    Duración en cache de un resultado.
+
+    La invalidación de signals.py sólo borra la cache del proceso que guardó
+    el alimento: con LocMemCache (sin CACHES configurado) los demás workers
+    seguirían respondiendo datos viejos, así que ahí se usa como máximo
+    FOOD_BARCODE_LOCAL_CACHE_SECONDS. Con un backend compartido (Redis,
+    memcached) se usa el valor configurado.
+    """
+    seconds = getattr(settings, setting, default)
+    if isinstance(caches['default'], LocMemCache):
+        seconds = min(seconds, getattr(settings, 'FOOD_BARCODE_LOCAL_CACHE_SECONDS', 5))
+    return seconds
+
+
+def lookup_barcode(code):
+    """
+    Busca un alimento verificado por código de barras.
+
+    Devuelve (código normalizado, datos serializados del alimento o None).
+    El código normalizado es None si `code` no es un EAN/UPC válido. Los
+    resultados se guardan en cache, también los que no existen (por menos
+    tiempo), así un mismo escaneo repetido no vuelve a la base de datos.
+    """
+    barcode_normalized = normalize_barcode(code)
+    if barcode_normalized is None:
+        return None, None
+
+    key = barcode_cache_key(barcode_normalized)
+    cached = cache.get(key)
+    if cached is not None:
+        return barcode_normalized, None if cached == MISSING else cached
+
+    food = Food.objects.select_related('created_by').filter(
+        barcode_normalized=barcode_normalized, is_verified=True
+    ).first()
+    if food is None:
+        cache.set(key, MISSING, cache_seconds('FOOD_BARCODE_NEGATIVE_CACHE_SECONDS', 300))
+        return barcode_normalized, None
+
+    data = FoodSerializer(food).data
+    cache.set(key, data, cache_seconds('FOOD_BARCODE_CACHE_SECONDS', 3600))
+    return barcode_normalized, data
+
+
+def invalidate_barcodes(*barcodes_normalized):
+    """Borra de la cache los códigos indicados (los None se ignoran)"""
+    keys = [barcode_cache_key(code) for code in set(barcodes_normalized) if code]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,47 @@
+# foods/management/commands/backfill_search_keys.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from foods.models import Food, ScannedFood
+from foods.normalization import normalize_search_key
+
+
+class Command(BaseCommand):
+    help = 'Calcula search_key de Food y ScannedFood para las filas existentes, en bloques'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recalcular todas las filas, no sólo las que tienen search_key vacío'
+        )
+
+    def handle(self, *args, **options):
+        for model, source in ((Food, 'name'), (ScannedFood, 'ai_identified_name')):
+            updated = self.backfill(model, source, options['batch_size'], options['all'])
+            self.stdout.write(f'{model.__name__}: {updated} filas actualizadas')
+
+    def backfill(self, model, source, batch_size, recompute_all):
+        queryset = model.objects.order_by('pk').only('pk', source, 'search_key')
+        if not recompute_all:
+            queryset = queryset.filter(search_key='')
+
+        updated = 0
+        last_pk = 0
+        while True:
+            # Avanzar por pk: cada bloque es una consulta por índice, sin OFFSET
+            rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not rows:
+                return updated
+            last_pk = rows[-1].pk
+
+            changed = []
+            for row in rows:
+                key = normalize_search_key(getattr(row, source))
+                if row.search_key != key:
+                    row.search_key = key
+                    changed.append(row)
+
+            with transaction.atomic():
+                model.objects.bulk_update(changed, ['search_key'], batch_size=batch_size)
+            updated += len(changed)
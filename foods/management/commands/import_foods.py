@@ -0,0 +1,240 @@
+# foods/management/commands/import_foods.py
+import csv
+import json
+import os
+import time
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from foods.autocomplete import request_rebuild
+from foods.barcodes import invalidate_barcodes
+from foods.models import Food
+from foods.normalization import normalize_search_key
+
+# Columnas aceptadas para cada campo de Food: las propias y las de Open Food Facts
+FIELD_ALIASES = {
+    'name': ('name', 'product_name'),
+    'brand': ('brand', 'brands'),
+    'barcode': ('barcode', 'code'),
+    'calories_per_100g': ('calories_per_100g', 'energy-kcal_100g', 'energy_kcal_100g'),
+    'protein_per_100g': ('protein_per_100g', 'proteins_100g'),
+    'carbs_per_100g': ('carbs_per_100g', 'carbohydrates_100g'),
+    'fat_per_100g': ('fat_per_100g', 'fat_100g'),
+}
+NUTRITION_FIELDS = ('calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g')
+IMPORTED_FIELDS = ('name', 'brand', 'barcode', 'barcode_normalized', 'search_key', *NUTRITION_FIELDS)
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa alimentos desde un CSV/TSV o JSONL grande: lee en streaming, valida y '
+        'hace upsert por código de barras o nombre normalizado en bloques transaccionales. '
+        'Guarda un checkpoint después de cada bloque para poder retomar con --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo .csv, .tsv o .jsonl')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Por defecto según la extensión')
+        parser.add_argument('--delimiter', help='Separador del CSV (por defecto , o tab para .tsv)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Filas por transacción')
+        parser.add_argument('--verified', action='store_true', help='Marcar los alimentos como verificados')
+        parser.add_argument('--checkpoint', help='Archivo de checkpoint (por defecto <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true', help='Continuar desde el último checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No existe el archivo {path}')
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        progress = {'rows': 0, 'created': 0, 'updated': 0, 'rejected': 0, 'conflicts': 0}
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as checkpoint_file:
+                progress.update(json.load(checkpoint_file))
+            self.stdout.write(f"Retomando desde la fila {progress['rows']}")
+
+        start = time.monotonic()
+        resumed_rows = progress['rows']
+        with open(path, newline='', encoding='utf-8') as input_file:
+            rows = islice(self.read_rows(input_file, path, options), resumed_rows, None)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+
+                created, updated, rejected, conflicts = self.import_batch(batch, options['verified'])
+                progress['rows'] += len(batch)
+                progress['created'] += created
+                progress['updated'] += updated
+                progress['rejected'] += rejected
+                progress['conflicts'] += len(conflicts)
+                for food in conflicts:
+                    self.stderr.write(f'Código {food.barcode} ya usado por otro alimento: se omite "{food.name}"')
+                # El bloque ya está confirmado: si el proceso muere se retoma desde aquí
+                self.save_checkpoint(checkpoint_path, progress)
+
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f"{progress['rows']} filas ({progress['created']} nuevas, {progress['updated']} "
+                    f"actualizadas, {progress['rejected']} rechazadas, {progress['conflicts']} en conflicto) - "
+                    f"{(progress['rows'] - resumed_rows) / elapsed:.0f} filas/s"
+                )
+
+        # bulk_create/bulk_update no disparan las señales que actualizan el autocompletado
+        request_rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {progress['created']} nuevas, {progress['updated']} actualizadas, "
+            f"{progress['rejected']} rechazadas, {progress['conflicts']} en conflicto "
+            f"en {time.monotonic() - start:.1f}s"
+        ))
+
+    def read_rows(self, input_file, path, options):
+        """Genera un dict por fila sin cargar el archivo en memoria"""
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if file_format == 'jsonl':
+            for line in input_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Se cuenta como fila para que el checkpoint siga alineado
+                    yield {}
+        else:
+            delimiter = options['delimiter'] or ('\t' if path.endswith('.tsv') else ',')
+            yield from csv.DictReader(input_file, delimiter=delimiter)
+
+    def import_batch(self, batch, verified):
+        """
+        Valida y guarda un bloque en una transacción; devuelve (creados,
+        actualizados, rechazados, alimentos en conflicto). Las filas que no
+        cambian nada no se escriben.
+        """
+        foods = {}
+        rejected = 0
+        for row in batch:
+            values = self.clean_row(row)
+            if values is None:
+                rejected += 1
+                continue
+            food = Food(is_verified=verified, **values)
+            food.set_normalized_fields()
+            # Dentro del bloque gana la última fila de cada código o nombre
+            foods[self.match_key(food)] = food
+
+        try:
+            with transaction.atomic():
+                to_create, to_update = self.plan_batch(foods, verified)
+                Food.objects.bulk_create(to_create)
+                self.upsert(to_update, verified)
+            conflicts = []
+        except IntegrityError:
+            # Otro proceso guardó uno de estos códigos mientras tanto: se
+            # repite el bloque fila por fila y se informan las que chocan
+            to_create, to_update, conflicts = self.import_rows(foods, verified)
+
+        # Códigos que podían estar en cache como "no existe" o con datos viejos
+        invalidate_barcodes(*(food.barcode_normalized for food in foods.values()))
+        return len(to_create), len(to_update), rejected, conflicts
+
+    def import_rows(self, foods, verified):
+        """Como el bloque, pero con un savepoint por fila para saltar los conflictos"""
+        created, updated, conflicts = [], [], []
+        with transaction.atomic():
+            to_create, to_update = self.plan_batch(foods, verified)
+            for food in to_create + to_update:
+                is_new = food.pk is None
+                try:
+                    with transaction.atomic():
+                        if is_new:
+                            Food.objects.bulk_create([food])
+                        else:
+                            self.upsert([food], verified)
+                except IntegrityError:
+                    conflicts.append(food)
+                else:
+                    (created if is_new else updated).append(food)
+        return created, updated, conflicts
+
+    def plan_batch(self, foods, verified):
+        """Separa el bloque en (nuevos, a actualizar) según lo que ya está guardado"""
+        existing = self.find_existing(foods)
+        to_update = []
+        to_create = []
+        for key, food in foods.items():
+            current = existing.get(key)
+            if current is None:
+                food.pk = None
+                to_create.append(food)
+                continue
+            unchanged = all(getattr(current, field) == getattr(food, field) for field in IMPORTED_FIELDS)
+            if unchanged and (current.is_verified or not verified):
+                # Sin cambios (por ejemplo al retomar un bloque ya importado)
+                continue
+            food.pk = current.pk
+            to_update.append(food)
+        return to_create, to_update
+
+    @staticmethod
+    def upsert(foods, verified):
+        # Las actualizaciones son un INSERT … ON CONFLICT (id) DO UPDATE por
+        # lote: mucho más rápido que bulk_update (un CASE por campo y fila).
+        # created_at y created_by no se tocan; updated_at lo pone auto_now
+        Food.objects.bulk_create(
+            foods,
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=[*IMPORTED_FIELDS, 'updated_at', *(('is_verified',) if verified else ())]
+        )
+
+    def clean_row(self, row):
+        """Valores de Food a partir de una fila, o None si la fila no es válida"""
+        if not isinstance(row, dict):
+            return None
+        values = {}
+        for field, aliases in FIELD_ALIASES.items():
+            values[field] = next((row[alias] for alias in aliases if row.get(alias) not in (None, '')), None)
+
+        name = str(values['name'] or '').strip()
+        if not name or len(name) > 200:
+            return None
+        values['name'] = name
+        # Open Food Facts lista varias marcas separadas por coma: se usa la primera
+        values['brand'] = str(values['brand'] or '').split(',')[0].strip()[:100]
+        values['barcode'] = str(values['barcode'] or '').strip()[:50]
+
+        for field in NUTRITION_FIELDS:
+            try:
+                values[field] = float(values[field])
+            except (TypeError, ValueError):
+                return None
+            if not 0 <= values[field] < 10000:
+                return None
+        return values
+
+    @staticmethod
+    def match_key(food):
+        """Clave de upsert: el código de barras si es válido, si no nombre y marca normalizados"""
+        if food.barcode_normalized:
+            return 'barcode', food.barcode_normalized
+        return 'name', food.search_key, normalize_search_key(food.brand)
+
+    def find_existing(self, foods):
+        """Alimentos ya guardados que coinciden con el bloque, por clave de upsert"""
+        barcodes = [key[1] for key in foods if key[0] == 'barcode']
+        search_keys = {key[1] for key in foods if key[0] == 'name'}
+
+        existing = {}
+        for food in Food.objects.filter(barcode_normalized__in=barcodes):
+            existing[('barcode', food.barcode_normalized)] = food
+        for food in Food.objects.filter(search_key__in=search_keys, barcode_normalized__isnull=True):
+            existing.setdefault(('name', food.search_key, normalize_search_key(food.brand)), food)
+        return existing
+
+    @staticmethod
+    def save_checkpoint(checkpoint_path, progress):
+        # Escribir aparte y renombrar: un corte a mitad no deja el checkpoint roto
+        temporary_path = f'{checkpoint_path}.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump(progress, checkpoint_file)
+        os.replace(temporary_path, checkpoint_path)
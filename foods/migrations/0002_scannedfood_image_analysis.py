@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analysis', '0001_initial'),
+        ('foods', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scannedfood',
+            name='image_analysis',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scanned_foods', to='ai_analysis.imageanalysis', verbose_name='Análisis de imagen'),
+        ),
+    ]
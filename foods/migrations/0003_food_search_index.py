@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# Copia fija del SQL de foods/search.py al momento de esta migración: si el
+# módulo cambia, la migración tiene que seguir creando lo mismo
+SQLITE_INDEX_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS foods_food_fts USING fts5("
+    "name, brand, content='foods_food', content_rowid='id', prefix='2 3', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ai AFTER INSERT ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ad AFTER DELETE ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_au AFTER UPDATE OF name, brand ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    # Indexar las filas que ya existían
+    "INSERT INTO foods_food_fts(foods_food_fts) VALUES ('rebuild')",
+)
+
+SQLITE_DROP_SQL = (
+    "DROP TRIGGER IF EXISTS foods_food_fts_ai",
+    "DROP TRIGGER IF EXISTS foods_food_fts_ad",
+    "DROP TRIGGER IF EXISTS foods_food_fts_au",
+    "DROP TABLE IF EXISTS foods_food_fts",
+)
+
+POSTGRES_INDEX_SQL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS foods_food_search_idx ON foods_food "
+    "USING GIN (to_tsvector('spanish', name || ' ' || brand))",
+    "CREATE INDEX IF NOT EXISTS foods_food_name_trgm_idx ON foods_food USING GIN (name gin_trgm_ops)",
+)
+
+POSTGRES_DROP_SQL = (
+    "DROP INDEX IF EXISTS foods_food_search_idx",
+    "DROP INDEX IF EXISTS foods_food_name_trgm_idx",
+)
+
+
+def run_statements(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def install_search_index(apps, schema_editor):
+    run_statements(schema_editor, {'sqlite': SQLITE_INDEX_SQL, 'postgresql': POSTGRES_INDEX_SQL})
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, {'sqlite': SQLITE_DROP_SQL, 'postgresql': POSTGRES_DROP_SQL})
+
+
+class Migration(migrations.Migration):
+    """Índice de texto completo de Food: FTS5 en SQLite, tsvector y trigramas en PostgreSQL"""
+
+    dependencies = [
+        ('foods', '0002_scannedfood_image_analysis'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, drop_search_index),
+    ]
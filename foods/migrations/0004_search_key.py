@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+# Copia fija de los triggers de FTS5 de la migración 0003
+SQLITE_INDEX_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS foods_food_fts USING fts5("
+    "name, brand, content='foods_food', content_rowid='id', prefix='2 3', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ai AFTER INSERT ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ad AFTER DELETE ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_au AFTER UPDATE OF name, brand ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "INSERT INTO foods_food_fts(foods_food_fts) VALUES ('rebuild')",
+)
+
+
+def reinstall_search_index(apps, schema_editor):
+    # En SQLite AddField reconstruye foods_food y se pierden los triggers de FTS5
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_INDEX_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0003_food_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='search_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200, verbose_name='Clave de búsqueda'),
+        ),
+        migrations.AddField(
+            model_name='scannedfood',
+            name='search_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200, verbose_name='Clave de búsqueda'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['search_key'], name='foods_food_search__972c5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scannedfood',
+            index=models.Index(fields=['user', 'search_key'], name='foods_scann_user_id_66590f_idx'),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:09
+
+from django.db import migrations, models
+
+# Copia fija de los triggers de FTS5 de la migración 0003
+SQLITE_INDEX_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS foods_food_fts USING fts5("
+    "name, brand, content='foods_food', content_rowid='id', prefix='2 3', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ai AFTER INSERT ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ad AFTER DELETE ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_au AFTER UPDATE OF name, brand ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "INSERT INTO foods_food_fts(foods_food_fts) VALUES ('rebuild')",
+)
+
+
+def gtin_check_digit(digits):
+    total = sum(int(digit) * (3 if index % 2 == 0 else 1) for index, digit in enumerate(reversed(digits)))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_barcode(value):
+    # Copia fija de foods.normalization.normalize_barcode al momento de esta migración
+    digits = ''.join(char for char in (value or '') if char not in ' -')
+    if not digits.isdigit() or len(digits) not in (8, 12, 13, 14):
+        return None
+    if gtin_check_digit(digits[:-1]) != digits[-1]:
+        return None
+    return digits.zfill(14)
+
+
+def fill_barcode_normalized(apps, schema_editor):
+    Food = apps.get_model('foods', 'Food')
+    seen = set()
+    changed = []
+    for food in Food.objects.exclude(barcode='').only('pk', 'barcode').order_by('pk').iterator():
+        normalized = normalize_barcode(food.barcode)
+        # Si hay códigos repetidos sólo el alimento más antiguo queda con la clave
+        if normalized is None or normalized in seen:
+            continue
+        seen.add(normalized)
+        food.barcode_normalized = normalized
+        changed.append(food)
+    Food.objects.bulk_update(changed, ['barcode_normalized'], batch_size=1000)
+
+
+def reinstall_search_index(apps, schema_editor):
+    # En SQLite AddField reconstruye foods_food y se pierden los triggers de FTS5
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_INDEX_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0004_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='barcode_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=14, null=True, unique=True, verbose_name='Código de barras normalizado'),
+        ),
+        migrations.RunPython(fill_barcode_normalized, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def gtin_check_digit(digits):
+    total = sum(int(digit) * (3 if index % 2 == 0 else 1) for index, digit in enumerate(reversed(digits)))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_barcode(value):
+    # Copia fija de foods.normalization.normalize_barcode: suma el UPC-A de 11 dígitos
+    digits = ''.join(char for char in (value or '') if char not in ' -')
+    if not digits.isdigit() or len(digits) not in (8, 11, 12, 13, 14) or not digits.strip('0'):
+        return None
+    if gtin_check_digit(digits[:-1]) != digits[-1]:
+        return None
+    return digits.zfill(14)
+
+
+def fill_short_barcodes(apps, schema_editor):
+    """UPC-A a los que les faltaba el cero inicial (antes quedaban sin normalizar)"""
+    Food = apps.get_model('foods', 'Food')
+    taken = set(Food.objects.exclude(barcode_normalized=None).values_list('barcode_normalized', flat=True))
+    changed = []
+    for food in (Food.objects.filter(barcode_normalized=None).exclude(barcode='')
+                 .only('pk', 'barcode').order_by('pk').iterator()):
+        normalized = normalize_barcode(food.barcode)
+        # Igual que en 0005: si el código ya está usado se deja sin clave
+        if normalized is None or normalized in taken:
+            continue
+        taken.add(normalized)
+        food.barcode_normalized = normalized
+        changed.append(food)
+    Food.objects.bulk_update(changed, ['barcode_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0005_food_barcode_normalized'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_short_barcodes, migrations.RunPython.noop),
+    ]
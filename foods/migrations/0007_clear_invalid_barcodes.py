@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# Largos de código GS1 que acepta normalize_barcode (copia fija)
+BARCODE_LENGTHS = (8, 11, 12, 13, 14)
+
+
+def clear_invalid_barcodes(apps, schema_editor):
+    """
+    Quita la clave a los códigos que una versión anterior de 0006 completaba
+    con ceros aunque no tuvieran un largo GS1 (por ejemplo "123").
+    """
+    Food = apps.get_model('foods', 'Food')
+    changed = []
+    for food in (Food.objects.exclude(barcode_normalized=None)
+                 .only('pk', 'barcode', 'barcode_normalized').order_by('pk').iterator()):
+        digits = ''.join(char for char in food.barcode if char not in ' -')
+        if len(digits) not in BARCODE_LENGTHS:
+            food.barcode_normalized = None
+            changed.append(food)
+    Food.objects.bulk_update(changed, ['barcode_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0006_fill_short_barcodes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_invalid_barcodes, migrations.RunPython.noop),
+    ]
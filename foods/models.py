@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from .normalization import normalize_barcode, normalize_search_key
 
 
 class Food(models.Model):
@@ -7,6 +9,12 @@ class Food(models.Model):
     name = models.CharField('Nombre', max_length=200)
     brand = models.CharField('Marca', max_length=100, blank=True)
     barcode = models.CharField('Código de barras', max_length=50, blank=True)
+    # barcode como GTIN-14; None si no hay código o no es un EAN/UPC válido
+    barcode_normalized = models.CharField(
+        'Código de barras normalizado', max_length=14, unique=True, null=True, blank=True, editable=False
+    )
+    # Nombre normalizado (sin tildes, minúsculas); se calcula en save()
+    search_key = models.CharField('Clave de búsqueda', max_length=200, blank=True, default='', editable=False)
     
     # Información nutricional por 100g
     calories_per_100g = models.FloatField('Calorías por 100g')
@@ -35,12 +43,45 @@ class Food(models.Model):
             return f"{self.name} ({self.brand})"
         return self.name
     
+    def save(self, *args, **kwargs):
+        # Para invalidar la cache del código anterior si cambió (ver signals.py)
+        self._previous_barcode_normalized = self.barcode_normalized
+        self.set_normalized_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'name' in update_fields:
+                update_fields.add('search_key')
+            if 'barcode' in update_fields:
+                update_fields.add('barcode_normalized')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+    
+    def clean(self):
+        """
+        Código de barras repetido. barcode_normalized se calcula recién en
+        save() y no está en los formularios, así que validate_unique no lo
+        revisa: "036000291452" y "0036000291452" son el mismo código.
+        """
+        super().clean()
+        barcode_normalized = normalize_barcode(self.barcode)
+        if barcode_normalized is not None:
+            duplicates = Food.objects.filter(barcode_normalized=barcode_normalized).exclude(pk=self.pk)
+            if duplicates.exists():
+                raise ValidationError({'barcode': 'Ya existe un alimento con este código de barras'})
+    
+    def set_normalized_fields(self):
+        """Recalcula search_key y barcode_normalized (bulk_create no pasa por save())"""
+        self.search_key = normalize_search_key(self.name)
+        self.barcode_normalized = normalize_barcode(self.barcode)
+    
     class Meta:
         db_table = 'foods_food'
         verbose_name = 'Alimento'
         verbose_name_plural = 'Alimentos'
         indexes = [
             models.Index(fields=['name']),
+            models.Index(fields=['search_key']),
             models.Index(fields=['barcode']),
             models.Index(fields=['created_at']),
         ]
@@ -56,6 +97,8 @@ class ScannedFood(models.Model):
     
     # Información extraída por IA
     ai_identified_name = models.CharField('Nombre identificado por IA', max_length=200)
+    # ai_identified_name normalizado; se calcula en save()
+    search_key = models.CharField('Clave de búsqueda', max_length=200, blank=True, default='', editable=False)
     serving_size = models.CharField('Tamaño de porción', max_length=100, blank=True)
     
     # Nutrición por porción (si disponible)
@@ -73,11 +116,32 @@ class ScannedFood(models.Model):
     # Respuesta cruda de IA (para debugging)
     raw_ai_response = models.JSONField('Respuesta cruda de IA', null=True, blank=True)
     
+    # Análisis que originó este alimento (si vino de /api/ai/analyze/)
+    image_analysis = models.ForeignKey(
+        'ai_analysis.ImageAnalysis',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scanned_foods',
+        verbose_name='Análisis de imagen'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.ai_identified_name} (escaneado por {self.user.email})"
     
+    def save(self, *args, **kwargs):
+        self.set_search_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'ai_identified_name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_key'}
+        super().save(*args, **kwargs)
+    
+    def set_search_key(self):
+        """Recalcula search_key (bulk_create no pasa por save())"""
+        self.search_key = normalize_search_key(self.ai_identified_name)
+    
     class Meta:
         db_table = 'foods_scanned'
         verbose_name = 'Alimento Escaneado'
@@ -85,4 +149,5 @@ class ScannedFood(models.Model):
         indexes = [
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['ai_identified_name']),
+            models.Index(fields=['user', 'search_key']),
         ]
\ No newline at end of file
@@ -0,0 +1,44 @@
+# foods/normalization.py
+import unicodedata
+
+
+def normalize_search_key(value):
+    """
+    Clave de búsqueda de un nombre: sin tildes, en minúsculas y con los
+    espacios colapsados ("  Plátano  MADURO" -> "platano maduro").
+
+    Se calcula una vez al guardar para que las búsquedas comparen contra una
+    columna indexada en vez de normalizar cada fila en la consulta.
+    """
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(folded.casefold().split())
+
+
+# EAN-8, UPC-A sin el cero inicial, UPC-A, EAN-13 y GTIN-14
+BARCODE_LENGTHS = (8, 11, 12, 13, 14)
+
+
+def gtin_check_digit(digits):
+    """Dígito verificador GS1 (EAN/UPC) de `digits` sin el dígito final"""
+    total = sum(int(digit) * (3 if index % 2 == 0 else 1) for index, digit in enumerate(reversed(digits)))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_barcode(value):
+    """
+    Código de barras EAN-8, UPC-A, EAN-13 o GTIN-14 como GTIN-14 (14 dígitos
+    con ceros a la izquierda), o None si no es un código válido.
+
+    Así el UPC-A "036000291452" y el EAN-13 "0036000291452" son la misma
+    clave. También se acepta un UPC-A de 11 dígitos al que un lector o una
+    planilla le sacó el cero inicial ("36000291452"); otros largos no son
+    códigos GS1. Se ignoran espacios y guiones; el dígito verificador tiene
+    que ser correcto.
+    """
+    digits = ''.join(char for char in (value or '') if char not in ' -')
+    if not digits.isdigit() or len(digits) not in BARCODE_LENGTHS or not digits.strip('0'):
+        return None
+    if gtin_check_digit(digits[:-1]) != digits[-1]:
+        return None
+    return digits.zfill(14)
@@ -0,0 +1,152 @@
+# foods/search.py
+"""
+Búsqueda de texto completo sobre el catálogo de alimentos.
+
+En SQLite se usa una tabla virtual FTS5 (foods_food_fts) con contenido
+externo en foods_food, mantenida por triggers; en PostgreSQL un índice GIN
+sobre to_tsvector('spanish', name || ' ' || brand) más un índice de
+trigramas sobre name para tolerar errores de tipeo. Los índices se crean en
+la migración 0003 y se actualizan solos en cada escritura de Food, incluso
+con bulk_create/update.
+"""
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Food
+from .normalization import normalize_search_key
+
+# Configuración de text search de PostgreSQL
+SEARCH_CONFIG = 'spanish'
+
+# Peso de cada columna en el ranking bm25 de FTS5 (name, brand)
+NAME_WEIGHT = 10.0
+BRAND_WEIGHT = 2.0
+
+TOKEN_RE = re.compile(r'\w+')
+
+SQLITE_INDEX_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS foods_food_fts USING fts5("
+    "name, brand, content='foods_food', content_rowid='id', prefix='2 3', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ai AFTER INSERT ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_ad AFTER DELETE ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_food_fts_au AFTER UPDATE OF name, brand ON foods_food BEGIN "
+    "INSERT INTO foods_food_fts(foods_food_fts, rowid, name, brand) "
+    "VALUES ('delete', old.id, old.name, old.brand); "
+    "INSERT INTO foods_food_fts(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    # Indexar las filas que ya existían
+    "INSERT INTO foods_food_fts(foods_food_fts) VALUES ('rebuild')",
+)
+
+SQLITE_DROP_SQL = (
+    "DROP TRIGGER IF EXISTS foods_food_fts_ai",
+    "DROP TRIGGER IF EXISTS foods_food_fts_ad",
+    "DROP TRIGGER IF EXISTS foods_food_fts_au",
+    "DROP TABLE IF EXISTS foods_food_fts",
+)
+
+POSTGRES_INDEX_SQL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS foods_food_search_idx ON foods_food "
+    f"USING GIN (to_tsvector('{SEARCH_CONFIG}', name || ' ' || brand))",
+    "CREATE INDEX IF NOT EXISTS foods_food_name_trgm_idx ON foods_food USING GIN (name gin_trgm_ops)",
+)
+
+POSTGRES_DROP_SQL = (
+    "DROP INDEX IF EXISTS foods_food_search_idx",
+    "DROP INDEX IF EXISTS foods_food_name_trgm_idx",
+)
+
+
+def install_search_index(schema_editor):
+    """Crea el índice de texto completo del motor en uso (idempotente)"""
+    statements = {
+        'sqlite': SQLITE_INDEX_SQL,
+        'postgresql': POSTGRES_INDEX_SQL,
+    }.get(schema_editor.connection.vendor, ())
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(schema_editor):
+    statements = {
+        'sqlite': SQLITE_DROP_SQL,
+        'postgresql': POSTGRES_DROP_SQL,
+    }.get(schema_editor.connection.vendor, ())
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def search_foods(query, limit=10, verified_only=True):
+    """
+    Alimentos que coinciden con `query`, ordenados por relevancia.
+
+    Cada palabra de dos o más letras se busca como prefijo ("plat" encuentra
+    "plátano"), todas deben aparecer en el nombre o la marca y las
+    coincidencias en el nombre pesan más. Los alimentos cuyo search_key es
+    igual a la búsqueda normalizada aparecen primero. En motores sin índice de
+    texto completo se busca search_key por substring.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return []
+
+    foods = Food.objects.select_related('created_by')
+    if verified_only:
+        foods = foods.filter(is_verified=True)
+
+    # Los nombres iguales a la búsqueda (sin tildes ni mayúsculas) van primero
+    key = normalize_search_key(query)
+    exact = list(foods.filter(search_key=key).order_by('name')[:limit])
+    if len(exact) >= limit:
+        return exact
+
+    if connection.vendor == 'sqlite':
+        ids = _search_sqlite(tokens, limit + len(exact), verified_only)
+    elif connection.vendor == 'postgresql':
+        ids = _search_postgres(query, tokens, limit + len(exact), verified_only)
+    else:
+        matches = foods.filter(Q(search_key__contains=key) | Q(brand__icontains=query))
+        return exact + list(matches.exclude(search_key=key).order_by('name')[:limit - len(exact)])
+
+    # Traer las filas de una vez y respetar el orden del ranking
+    exact_ids = {food.pk for food in exact}
+    ids = [food_id for food_id in ids if food_id not in exact_ids][:limit - len(exact)]
+    ranked = foods.in_bulk(ids)
+    return exact + [ranked[food_id] for food_id in ids if food_id in ranked]
+
+
+def _search_sqlite(tokens, limit, verified_only):
+    # Cada token entre comillas para que FTS5 no lo interprete como operador.
+    # Una sola letra como prefijo recorrería medio índice: se busca como palabra
+    match = ' '.join(f'"{token}"*' if len(token) > 1 else f'"{token}"' for token in tokens)
+    verified = 'AND f.is_verified' if verified_only else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT f.id FROM foods_food_fts '
+            'JOIN foods_food f ON f.id = foods_food_fts.rowid '
+            f'WHERE foods_food_fts MATCH %s {verified} '
+            'ORDER BY bm25(foods_food_fts, %s, %s), f.name '
+            'LIMIT %s',
+            [match, NAME_WEIGHT, BRAND_WEIGHT, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_postgres(query, tokens, limit, verified_only):
+    # La expresión tiene que ser idéntica a la del índice foods_food_search_idx
+    vector = f"to_tsvector('{SEARCH_CONFIG}', name || ' ' || brand)"
+    ts_query = ' & '.join(f'{token}:*' for token in tokens)
+    verified = 'is_verified AND' if verified_only else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT id FROM foods_food '
+            f'WHERE {verified} ({vector} @@ to_tsquery(%s, %s) OR name %% %s) '
+            f'ORDER BY ts_rank({vector}, to_tsquery(%s, %s)) + similarity(name, %s) DESC, name '
+            'LIMIT %s',
+            [SEARCH_CONFIG, ts_query, query, SEARCH_CONFIG, ts_query, query, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
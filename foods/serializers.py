@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.db import IntegrityError, transaction
 from .models import Food, ScannedFood
+from .normalization import normalize_barcode
 
 
 class FoodSerializer(serializers.ModelSerializer):
@@ -14,6 +16,9 @@ class FoodSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_by_email', 'created_at', 'updated_at')
 
 
+DUPLICATE_BARCODE_ERROR = 'Ya existe un alimento con este código de barras'
+
+
 class FoodCreateSerializer(serializers.ModelSerializer):
     """Serializer para crear alimentos"""
     class Meta:
@@ -21,9 +26,35 @@ class FoodCreateSerializer(serializers.ModelSerializer):
         fields = ('name', 'brand', 'barcode', 'calories_per_100g', 
                  'protein_per_100g', 'carbs_per_100g', 'fat_per_100g')
     
+    def validate_barcode(self, value):
+        """Un mismo EAN/UPC no puede estar en dos alimentos (aunque se escriba distinto)"""
+        barcode_normalized = normalize_barcode(value)
+        if barcode_normalized is not None:
+            duplicates = Food.objects.filter(barcode_normalized=barcode_normalized)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError(DUPLICATE_BARCODE_ERROR)
+        return value
+    
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data)
+        return self.save_unique(super().create, validated_data)
+    
+    def update(self, instance, validated_data):
+        return self.save_unique(super().update, instance, validated_data)
+    
+    def save_unique(self, save, *args):
+        """
+        Guarda con `save`; si el índice único de barcode_normalized rechaza la
+        fila (otro request guardó el mismo código después de validate_barcode)
+        responde 400 en vez de 500.
+        """
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError:
+            raise serializers.ValidationError({'barcode': [DUPLICATE_BARCODE_ERROR]})
 
 
 class ScannedFoodSerializer(serializers.ModelSerializer):
@@ -49,11 +80,19 @@ class ScannedFoodCreateSerializer(serializers.ModelSerializer):
                  'raw_ai_response')
     
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
+        # Los workers de análisis pasan el usuario en save() porque no tienen request
+        if 'user' not in validated_data:
+            validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
 
 class FoodSearchSerializer(serializers.Serializer):
     """Serializer para búsqueda de alimentos"""
     query = serializers.CharField(max_length=200)
-    limit = serializers.IntegerField(default=10, min_value=1, max_value=50)
\ No newline at end of file
+    limit = serializers.IntegerField(default=10, min_value=1, max_value=50)
+
+
+class FoodAutocompleteSerializer(serializers.Serializer):
+    """Parámetros de autocompletado (query params)"""
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(default=8, min_value=1, max_value=20)
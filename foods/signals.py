@@ -0,0 +1,34 @@
+# foods/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .autocomplete import apply_food_change
+from .barcodes import invalidate_barcodes
+from .models import Food
+
+
+@receiver(post_save, sender=Food)
+def update_autocomplete_on_save(sender, instance, **kwargs):
+    """Mantiene al día el índice de autocompletado del proceso (si ya existe)"""
+    food_id, name, brand, verified = instance.pk, instance.name, instance.brand, instance.is_verified
+    # Si la transacción se revierte el índice no cambia
+    transaction.on_commit(lambda: apply_food_change(food_id, name, brand, verified))
+
+
+@receiver(post_delete, sender=Food)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    food_id = instance.pk
+    transaction.on_commit(lambda: apply_food_change(food_id))
+
+
+@receiver(post_save, sender=Food)
+def invalidate_barcode_cache_on_save(sender, instance, **kwargs):
+    """El alimento cambió: borrar la cache de su código (y del anterior, si cambió)"""
+    codes = (instance.barcode_normalized, getattr(instance, '_previous_barcode_normalized', None))
+    transaction.on_commit(lambda: invalidate_barcodes(*codes))
+
+
+@receiver(post_delete, sender=Food)
+def invalidate_barcode_cache_on_delete(sender, instance, **kwargs):
+    code = instance.barcode_normalized
+    transaction.on_commit(lambda: invalidate_barcodes(code))
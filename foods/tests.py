@@ -1,3 +1,266 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from rest_framework import serializers
+from users.models import User
+from . import autocomplete
+from .autocomplete import PrefixIndex
+from .management.commands.import_foods import Command as ImportFoodsCommand
+from .models import Food
+from .normalization import normalize_barcode, normalize_search_key
+from .serializers import DUPLICATE_BARCODE_ERROR, FoodCreateSerializer
 
-# Create your tests here.
+
+class NormalizeSearchKeyTests(SimpleTestCase):
+    """normalize_search_key: tildes, mayúsculas y espacios"""
+
+    def test_folds_accents_case_and_spaces(self):
+        self.assertEqual(normalize_search_key('  Plátano  MADURO '), 'platano maduro')
+
+    def test_keeps_enye_as_n(self):
+        self.assertEqual(normalize_search_key('Piña Año'), 'pina ano')
+
+    def test_empty_values(self):
+        self.assertEqual(normalize_search_key(None), '')
+        self.assertEqual(normalize_search_key('   '), '')
+
+
+class NormalizeBarcodeTests(SimpleTestCase):
+    """normalize_barcode: largos GS1, dígito verificador y GTIN-14"""
+
+    def test_supported_lengths_become_gtin14(self):
+        cases = {
+            '96385074': '00000096385074',
+            '36000291452': '00036000291452',
+            '036000291452': '00036000291452',
+            '0036000291452': '00036000291452',
+            '4006-3813 33931': '04006381333931',
+            '10036000291459': '10036000291459',
+        }
+        for code, expected in cases.items():
+            with self.subTest(code=code):
+                self.assertEqual(normalize_barcode(code), expected)
+
+    def test_invalid_codes(self):
+        for code in ('123', '4006381333932', '400638133393a', '00000000', '', None):
+            with self.subTest(code=code):
+                self.assertIsNone(normalize_barcode(code))
+
+
+class FoodCreateSerializerBarcodeTests(TestCase):
+    """FoodCreateSerializer: códigos de barras repetidos responden 400, no 500"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='barcode@example.com', password='x')
+        self.existing = Food.objects.create(
+            name='Manzana', barcode='036000291452', calories_per_100g=52,
+            protein_per_100g=0.3, carbs_per_100g=14, fat_per_100g=0.2
+        )
+
+    def serializer(self, barcode, instance=None):
+        data = {
+            'name': 'Otro', 'barcode': barcode, 'calories_per_100g': 10,
+            'protein_per_100g': 1, 'carbs_per_100g': 1, 'fat_per_100g': 1,
+        }
+        return FoodCreateSerializer(
+            instance, data=data, context={'request': SimpleNamespace(user=self.user)}
+        )
+
+    def test_same_code_written_differently_is_rejected(self):
+        serializer = self.serializer('0036000291452')
+
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['barcode'], [DUPLICATE_BARCODE_ERROR])
+
+    def test_updating_the_same_food_keeps_its_code(self):
+        serializer = self.serializer('036000291452', instance=self.existing)
+
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def assert_concurrent_duplicate_rejected(self, instance=None):
+        # Otro request guardó el código entre validate_barcode y el INSERT/UPDATE
+        with mock.patch.object(FoodCreateSerializer, 'validate_barcode', lambda self, value: value):
+            serializer = self.serializer('0036000291452', instance=instance)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            with self.assertRaises(serializers.ValidationError) as raised:
+                serializer.save()
+        self.assertEqual(raised.exception.detail, {'barcode': [DUPLICATE_BARCODE_ERROR]})
+
+    def test_concurrent_duplicate_on_create(self):
+        self.assert_concurrent_duplicate_rejected()
+
+    def test_concurrent_duplicate_on_update(self):
+        other = Food.objects.create(
+            name='Pera', calories_per_100g=57, protein_per_100g=0.4,
+            carbs_per_100g=15, fat_per_100g=0.1
+        )
+        self.assert_concurrent_duplicate_rejected(other)
+
+
+class PrefixIndexTests(SimpleTestCase):
+    """PrefixIndex: orden de los resultados, altas y bajas, y límites"""
+
+    FOODS = [
+        (1, 'Plátano maduro', ''),
+        (2, 'Chips de plátano', 'Crujis'),
+        (3, 'Plátano', ''),
+        (4, 'Pera', 'Platanal'),
+    ]
+
+    def build(self, **kwargs):
+        index = PrefixIndex(**kwargs)
+        index.build(self.FOODS)
+        return index
+
+    def ids(self, results):
+        return [food['id'] for food in results]
+
+    def test_name_start_first_then_other_words_and_brand(self):
+        index = self.build()
+
+        self.assertEqual(self.ids(index.complete('PLAT')), [3, 1, 4, 2])
+        self.assertEqual(self.ids(index.complete('plat', limit=2)), [3, 1])
+        self.assertEqual(self.ids(index.complete('crujis')), [2])
+        self.assertEqual(index.complete('  '), [])
+
+    def test_add_and_remove(self):
+        index = self.build()
+
+        index.add(5, 'Platanito', '')
+        index.add(3, 'Banana', '')
+        index.remove(1)
+
+        self.assertEqual(self.ids(index.complete('plat')), [5, 4, 2])
+        self.assertEqual(self.ids(index.complete('banana')), [3])
+        self.assertEqual(len(index), 4)
+
+    def test_max_entries_stops_adding(self):
+        # Manzana tiene una clave; Plátano maduro, dos
+        index = PrefixIndex(max_entries=2)
+        index.build([(1, 'Manzana', ''), (2, 'Plátano maduro', '')])
+
+        self.assertEqual(len(index), 1)
+        index.add(3, 'Mango', '')
+        self.assertEqual(self.ids(index.complete('m')), [3, 1])
+        index.add(4, 'Melón', '')
+        self.assertEqual(self.ids(index.complete('m')), [3, 1])
+
+    def test_rank_window_limits_ranked_entries(self):
+        # "platanal" (marca de Pera) es la primera clave en orden alfabético:
+        # Plátano, que sin ventana saldría primero, queda afuera
+        index = self.build(rank_window=1)
+
+        self.assertEqual(self.ids(index.complete('pl')), [4])
+        self.assertEqual(self.ids(self.build().complete('pl'))[0], 3)
+
+
+class AutocompleteRebuildTests(SimpleTestCase):
+    """Reconstrucción del índice del proceso: cambios durante la lectura y versión"""
+
+    def setUp(self):
+        for name in ('_index', '_index_built_at', '_index_version', '_pending_changes'):
+            patcher = mock.patch.object(autocomplete, name, getattr(autocomplete, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_changes_committed_while_reading_are_replayed(self):
+        def verified_foods():
+            yield (1, 'Manzana', '')
+            yield (2, 'Mandarina', '')
+            # Guardados en otro hilo mientras se leía la base
+            autocomplete.apply_food_change(3, 'Mango', '', verified=True)
+            autocomplete.apply_food_change(1)
+
+        with mock.patch.object(autocomplete, '_verified_foods', verified_foods):
+            autocomplete._rebuild_index()
+
+        results = autocomplete._index.complete('man')
+        self.assertEqual([food['id'] for food in results], [3, 2])
+        self.assertIsNone(autocomplete._pending_changes)
+
+    def test_request_rebuild_marks_index_stale(self):
+        with mock.patch.object(autocomplete, '_verified_foods', lambda: iter([])):
+            autocomplete._rebuild_index()
+        self.assertFalse(autocomplete._is_stale())
+
+        autocomplete.request_rebuild()
+
+        self.assertTrue(autocomplete._is_stale())
+
+
+class ImportFoodsTests(TestCase):
+    """import_foods: upsert por código, checkpoint con --resume y conflictos"""
+
+    HEADER = 'product_name,brands,code,energy-kcal_100g,proteins_100g,carbohydrates_100g,fat_100g\n'
+    ROWS = [
+        'Manzana,Frutal,036000291452,52,0.3,14,0.2\n',
+        'Pera,,,57,0.4,15,0.1\n',
+        'Sin calorías,,,,1,1,1\n',
+        'Banana,"Frutal, Otra",4006381333931,89,1.1,23,0.3\n',
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'foods.csv')
+        self.checkpoint_path = f'{self.path}.checkpoint'
+        self.write_rows(self.ROWS)
+
+    def write_rows(self, rows):
+        with open(self.path, 'w', encoding='utf-8') as csv_file:
+            csv_file.write(self.HEADER + ''.join(rows))
+
+    def run_import(self, *args):
+        stderr = io.StringIO()
+        call_command('import_foods', self.path, '--batch-size', '2', *args,
+                     stdout=io.StringIO(), stderr=stderr)
+        with open(self.checkpoint_path) as checkpoint_file:
+            return json.load(checkpoint_file), stderr.getvalue()
+
+    def test_import_and_reimport(self):
+        progress, _ = self.run_import('--verified')
+
+        self.assertEqual(progress, {'rows': 4, 'created': 3, 'updated': 0, 'rejected': 1, 'conflicts': 0})
+        banana = Food.objects.get(barcode_normalized='04006381333931')
+        self.assertEqual((banana.name, banana.brand, banana.is_verified), ('Banana', 'Frutal', True))
+
+        # Mismo código escrito distinto y otras calorías: se actualiza, no se duplica
+        self.write_rows(['Manzana roja,Frutal,0036000291452,60,0.3,14,0.2\n', self.ROWS[1]])
+        progress, _ = self.run_import('--verified')
+
+        self.assertEqual((progress['created'], progress['updated']), (0, 1))
+        self.assertEqual(Food.objects.count(), 3)
+        apple = Food.objects.get(barcode_normalized='00036000291452')
+        self.assertEqual((apple.name, apple.calories_per_100g), ('Manzana roja', 60))
+
+    def test_resume_from_checkpoint(self):
+        with open(self.checkpoint_path, 'w') as checkpoint_file:
+            json.dump({'rows': 2, 'created': 2, 'updated': 0, 'rejected': 0, 'conflicts': 0}, checkpoint_file)
+
+        progress, _ = self.run_import('--resume')
+
+        self.assertEqual(progress, {'rows': 4, 'created': 3, 'updated': 0, 'rejected': 1, 'conflicts': 0})
+        self.assertEqual(list(Food.objects.values_list('name', flat=True)), ['Banana'])
+
+    def test_conflicting_barcode_skips_only_that_row(self):
+        Food.objects.create(
+            name='Manzana de otro proceso', barcode='036000291452', calories_per_100g=52,
+            protein_per_100g=0.3, carbs_per_100g=14, fat_per_100g=0.2
+        )
+        self.write_rows(self.ROWS[:2])
+
+        # Otro proceso guardó el código después de buscar los existentes
+        with mock.patch.object(ImportFoodsCommand, 'find_existing', return_value={}):
+            progress, stderr = self.run_import()
+
+        self.assertEqual((progress['created'], progress['conflicts']), (1, 1))
+        self.assertIn('Código 036000291452 ya usado por otro alimento', stderr)
+        self.assertEqual(
+            sorted(Food.objects.values_list('name', flat=True)),
+            ['Manzana de otro proceso', 'Pera']
+        )
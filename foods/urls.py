@@ -8,6 +8,8 @@ urlpatterns = [
     path('', views.FoodListCreateView.as_view(), name='food-list-create'),
     path('<int:pk>/', views.FoodDetailView.as_view(), name='food-detail'),
     path('search/', views.search_foods, name='search-foods'),
+    path('autocomplete/', views.autocomplete_foods, name='autocomplete-foods'),
+    path('barcode/<str:code>/', views.food_by_barcode, name='food-by-barcode'),
     
     # Alimentos escaneados
     path('scanned/', views.ScannedFoodListCreateView.as_view(), name='scanned-food-list-create'),
@@ -2,14 +2,18 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q
+from . import search
+from .autocomplete import get_autocomplete_index
+from .barcodes import lookup_barcode
 from .models import Food, ScannedFood
+from .normalization import normalize_search_key
 from .serializers import (
     FoodSerializer, 
     FoodCreateSerializer,
     ScannedFoodSerializer, 
     ScannedFoodCreateSerializer,
-    FoodSearchSerializer
+    FoodSearchSerializer,
+    FoodAutocompleteSerializer
 )
 
 
@@ -63,17 +67,14 @@ class ScannedFoodDetailView(generics.RetrieveDestroyAPIView):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def search_foods(request):
-    """Endpoint para buscar alimentos"""
+    """Endpoint para buscar alimentos (ordenados por relevancia)"""
     serializer = FoodSearchSerializer(data=request.data)
     if serializer.is_valid():
         query = serializer.validated_data['query']
         limit = serializer.validated_data['limit']
         
-        # Buscar en alimentos verificados
-        foods = Food.objects.filter(
-            Q(name__icontains=query) | Q(brand__icontains=query),
-            is_verified=True
-        ).order_by('name')[:limit]
+        # Buscar en alimentos verificados con el índice de texto completo
+        foods = search.search_foods(query, limit)
         
         food_serializer = FoodSerializer(foods, many=True)
         return Response({
@@ -84,19 +85,68 @@ def search_foods(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def autocomplete_foods(request):
+    """
+    Endpoint para autocompletar nombres de alimentos verificados mientras se escribe
+    
+    Responde desde un índice de prefijos en memoria, sin consultar la base
+    de datos. Devuelve sólo id, nombre y marca; el detalle se pide aparte.
+    """
+    serializer = FoodAutocompleteSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    suggestions = get_autocomplete_index().complete(
+        serializer.validated_data['q'], serializer.validated_data['limit']
+    )
+    return Response({
+        'suggestions': suggestions,
+        'count': len(suggestions)
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def food_by_barcode(request, code):
+    """
+    Endpoint para buscar un alimento verificado por código de barras EAN/UPC
+    
+    El código se normaliza (ceros a la izquierda, dígito verificador) antes
+    de buscar; las respuestas, incluso las de códigos sin alimento, se sirven
+    desde cache.
+    """
+    barcode_normalized, food = lookup_barcode(code)
+    if barcode_normalized is None:
+        return Response({'error': 'Código de barras inválido'}, status=status.HTTP_400_BAD_REQUEST)
+    if food is None:
+        return Response({'error': 'Alimento no encontrado', 'barcode': barcode_normalized},
+                       status=status.HTTP_404_NOT_FOUND)
+    return Response(food)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_scanned_foods(request):
-    """Endpoint para obtener alimentos escaneados del usuario"""
+    """
+    Endpoint para obtener alimentos escaneados del usuario
+    
+    Con ?q= filtra por nombres que empiezan con el texto, sin importar
+    tildes ni mayúsculas.
+    """
     limit = request.query_params.get('limit', 20)
     try:
         limit = int(limit)
     except (ValueError, TypeError):
         limit = 20
     
-    scanned_foods = ScannedFood.objects.filter(
-        user=request.user
-    ).order_by('-created_at')[:limit]
+    scanned_foods = ScannedFood.objects.filter(user=request.user)
+    key = normalize_search_key(request.query_params.get('q', ''))
+    if key:
+        # Rango en vez de LIKE 'x%' para que use el índice (user, search_key)
+        scanned_foods = scanned_foods.filter(search_key__gte=key, search_key__lt=key + '\uffff')
+    scanned_foods = scanned_foods.order_by('-created_at')[:limit]
     
     serializer = ScannedFoodSerializer(scanned_foods, many=True)
     return Response({
@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
+from core.idempotency import idempotent
 from .models import DailyLog, LoggedFoodItem
 from .serializers import (
     DailyLogSerializer,
@@ -93,8 +94,9 @@ def today_log(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def quick_log_food(request):
-    """Endpoint para registrar comida rápidamente"""
+    """Endpoint para registrar comida rápidamente (acepta Idempotency-Key)"""
     serializer = QuickLogFoodSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         logged_item = serializer.save()